@@ -0,0 +1,124 @@
+# Virtual wearables for the load generator (benchmarks/loadgen.py). Unlike the
+# Node simulator, every device has its own patient, counters, emit schedule and
+# vitals condition.
+import heapq
+import random
+from benchmarks.streams import daily_payload
+
+# Vitals ranges per condition, matching the curl overrides in test_api/api.md
+CONDITIONS = {
+    "normal": {"heart_rate": (60, 100), "spo2": (95, 100), "stress_level": (1, 5)},
+    "smallAlert": {"heart_rate": (101, 110), "spo2": (95, 100), "stress_level": (1, 5)},
+    "heartAttack": {"heart_rate": (160, 200), "spo2": (82, 89), "stress_level": (5, 15)},
+    "stress": {"heart_rate": (75, 95), "spo2": (95, 100), "stress_level": (70, 95)},
+}
+
+
+class VirtualDevice:
+    __slots__ = ("index", "patient_id", "steps", "calories", "condition", "override",
+                 "realtime_ms", "daily_ms", "next_realtime", "next_daily")
+
+    def __init__(self, index, patient_id, realtime_ms, daily_ms, condition="normal"):
+        self.index = index
+        self.patient_id = patient_id
+        self.steps = 0
+        self.calories = 0
+        self.condition = condition
+        self.override = None
+        self.realtime_ms = realtime_ms
+        self.daily_ms = daily_ms
+        self.next_realtime = None
+        self.next_daily = None
+
+    def realtime(self, timestamp, rng):
+        self.steps += rng.randint(5, 20)
+        self.calories += rng.randint(1, 5)
+        vitals = self.override
+        if vitals is None:
+            ranges = CONDITIONS[self.condition]
+            vitals = {vital: rng.randint(*bounds) for vital, bounds in ranges.items()}
+        return {
+            "patient_id": self.patient_id,
+            **vitals,
+            "steps": self.steps,
+            "calories_burned": self.calories,
+            "timestamp": timestamp,
+        }
+
+    def daily(self, timestamp, rng):
+        return daily_payload(self.patient_id, timestamp, rng)
+
+
+class Fleet:
+    """Devices and their emit schedule.
+
+    Due emits sit in a heap of (due ms, device index, event), so a tick only
+    touches the devices that are due. A rate change pushes a new entry; the
+    old one no longer matches the device's schedule and is skipped.
+    """
+
+    def __init__(self, groups, seed=1, prefix="patient-", now_ms=0):
+        self.rng = random.Random(seed)
+        self.devices = []
+        self.by_patient = {}
+        self._due = []
+        for group in groups:
+            for _ in range(group["count"]):
+                index = len(self.devices)
+                device = VirtualDevice(index, f"{prefix}{index + 1}", group["realtime_interval_ms"], group["daily_interval_ms"], group["condition"])
+                self.devices.append(device)
+                self.by_patient[device.patient_id] = device
+        self.start(now_ms)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def start(self, now_ms):
+        """(Re)start every schedule at ``now_ms``, staggered so devices don't all emit in the same tick"""
+        self._due = []
+        for device in self.devices:
+            device.next_realtime = now_ms + self.rng.randrange(device.realtime_ms)
+            device.next_daily = now_ms + self.rng.randrange(device.daily_ms)
+            self._due.append((device.next_realtime, device.index, "realtimeData"))
+            self._due.append((device.next_daily, device.index, "dailyData"))
+        heapq.heapify(self._due)
+
+    def set_rate(self, device, realtime_ms, now_ms):
+        device.realtime_ms = realtime_ms
+        if now_ms + realtime_ms < device.next_realtime:
+            device.next_realtime = now_ms + realtime_ms
+            heapq.heappush(self._due, (device.next_realtime, device.index, "realtimeData"))
+
+    def select(self, spec="all"):
+        """Devices for "all", a count (>= 1), a fraction (< 1) or a list of patient ids"""
+        if spec == "all":
+            return list(self.devices)
+        if isinstance(spec, list):
+            missing = [patient_id for patient_id in spec if patient_id not in self.by_patient]
+            if missing:
+                raise ValueError(f"unknown patient {', '.join(missing)}")
+            return [self.by_patient[patient_id] for patient_id in spec]
+        if isinstance(spec, bool) or not isinstance(spec, (int, float)) or spec <= 0:
+            raise ValueError(f"invalid device selection {spec!r}")
+        count = max(1, round(spec * len(self))) if spec < 1 else int(spec)
+        return self.rng.sample(self.devices, min(len(self), count))
+
+    def due(self, now_ms):
+        """(event, payload, device) for every emit due by ``now_ms``, oldest first. A device
+        that fell behind catches up with one reading per missed interval, stamped with its slot."""
+        due = self._due
+        while due and due[0][0] <= now_ms:
+            at, index, event = heapq.heappop(due)
+            device = self.devices[index]
+            if event == "realtimeData":
+                if at != device.next_realtime:
+                    continue
+                device.next_realtime = at + device.realtime_ms
+                heapq.heappush(due, (device.next_realtime, index, event))
+                yield event, device.realtime(at, self.rng), device
+            else:
+                if at != device.next_daily:
+                    continue
+                device.next_daily = at + device.daily_ms
+                heapq.heappush(due, (device.next_daily, index, event))
+                yield event, device.daily(at, self.rng), device
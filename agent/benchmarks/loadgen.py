@@ -0,0 +1,275 @@
+"""Load generator: serves the simulator's Socket.IO protocol (realtimeData,
+dailyData, overrideSet, overrideCleared) for a fleet of independent virtual
+devices (benchmarks/devices.py), driven by a scenario file (benchmarks/scenario.py).
+
+Run from agent/, then point the agent's SIMULATOR_URL at it:
+
+    python -m benchmarks.loadgen benchmarks/scenarios/heart-attack-burst.json
+    python -m benchmarks.loadgen benchmarks/scenarios/production.json --devices 5000 --port 3000
+
+Every connected agent gets a fixed share of the devices (device index modulo
+the number of agents), so several agents can split the fleet. Readings
+produced while no agent is connected are buffered, up to --max-buffered, and
+flushed on reconnect, as devices catching up after an outage would.
+
+HTTP, same override API as simulator/src/index.js:
+
+    POST /override   {"patient_id"?, "heart_rate"?, "spo2"?, "stress_level"?}; one device, or all of them
+    POST /reset      {"patient_id"?}
+    GET  /stats      counters, connected agents, buffered readings
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import deque
+import socketio
+from aiohttp import web
+from benchmarks.devices import Fleet
+from benchmarks.scenario import load_scenario
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic wearable streams to the agent")
+    parser.add_argument("scenario", nargs="?", help="scenario JSON (defaults: one normal device)")
+    parser.add_argument("--devices", type=int, help="scale the scenario's fleet to this many devices")
+    parser.add_argument("--seed", type=int, help="override the scenario's seed")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--tick", type=float, default=0.05, help="seconds between schedule polls")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--max-buffered", type=int, default=100000, help="readings kept while no agent is connected")
+    return parser.parse_args(argv)
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class LoadGenerator:
+    def __init__(self, scenario, tick=0.05, stats_interval=10.0, max_buffered=100000):
+        self.scenario = scenario
+        self.fleet = Fleet(scenario["fleet"], seed=scenario["seed"])
+        self.tick = tick
+        self.stats_interval = stats_interval
+        self.buffered = deque()
+        self.max_buffered = max_buffered
+        self.agents = []  # sids, in connection order
+        self.stats = {"realtimeData": 0, "dailyData": 0, "buffered": 0, "dropped": 0, "connects": 0, "disconnects": 0}
+        self.window_emitted = 0
+        self.started_at = None
+        self.done = asyncio.Event()
+        self._timers = set()
+
+        self.sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*")
+        self.app = web.Application()
+        self.sio.attach(self.app)
+        self.sio.on("connect", self.on_connect)
+        self.sio.on("disconnect", self.on_disconnect)
+        self.app.router.add_post("/override", self.override)
+        self.app.router.add_post("/reset", self.reset)
+        self.app.router.add_get("/stats", self.stats_handler)
+
+    # ---- DELIVERY ----
+    async def deliver(self, event, payload, device):
+        if not self.agents:
+            if len(self.buffered) >= self.max_buffered:
+                self.buffered.popleft()
+                self.stats["dropped"] += 1
+            self.buffered.append((event, payload, device))
+            self.stats["buffered"] += 1
+            return
+        await self.sio.emit(event, payload, to=self.agents[device.index % len(self.agents)])
+        self.stats[event] += 1
+        self.window_emitted += 1
+
+    async def flush_buffered(self):
+        pending, self.buffered = self.buffered, deque()
+        for event, payload, device in pending:
+            await self.deliver(event, payload, device)
+        if pending:
+            log(f"📤 Flushed {len(pending)} buffered readings")
+
+    # ---- SCENARIO ----
+    def later(self, seconds, fn, *args):
+        async def run():
+            await asyncio.sleep(seconds)
+            await fn(*args)
+        task = asyncio.create_task(run())
+        self._timers.add(task)
+        task.add_done_callback(self._timers.discard)
+
+    async def run_step(self, step):
+        if step["action"] == "condition":
+            devices = self.fleet.select(step.get("devices", "all"))
+            for device in devices:
+                device.condition = step["condition"]
+            log(f"🎬 {step['condition']} on {len(devices)} devices")
+            if step.get("duration_s"):
+                self.later(step["duration_s"], self.end_condition, step, devices)
+        elif step["action"] == "rate":
+            devices = self.fleet.select(step.get("devices", "all"))
+            previous = [device.realtime_ms for device in devices]
+            for device in devices:
+                self.fleet.set_rate(device, step["realtime_interval_ms"], now_ms())
+            log(f"🎬 {len(devices)} devices now emit every {step['realtime_interval_ms']}ms")
+            if step.get("duration_s"):
+                self.later(step["duration_s"], self.restore_rate, devices, previous)
+        elif step["action"] == "reconnectStorm":
+            for wave in range(step["waves"]):
+                self.later(wave * step.get("every_ms", 1000) / 1000, self.disconnect_all, wave + 1, step["waves"])
+
+    async def end_condition(self, step, devices):
+        for device in devices:
+            device.condition = "normal"
+        log(f"🎬 {step['condition']} over for {len(devices)} devices")
+
+    async def restore_rate(self, devices, previous):
+        for device, realtime_ms in zip(devices, previous):
+            self.fleet.set_rate(device, realtime_ms, now_ms())
+        log(f"🎬 Emit rate restored for {len(devices)} devices")
+
+    async def disconnect_all(self, wave, waves):
+        log(f"🌩️ Reconnect storm: disconnecting {len(self.agents)} agents (wave {wave}/{waves})")
+        for sid in list(self.agents):
+            await self.drop(sid)
+
+    async def drop(self, sid):
+        """Cut an agent's connection the way a network failure would. A Socket.IO
+        disconnect is final for the client; a lost transport makes it reconnect."""
+        socket = self.sio.eio.sockets.get(self.sio.manager.eio_sid_from_sid(sid, "/"))
+        if socket is None:
+            return
+        await socket.close(wait=False, abort=True)
+        # Wakes the transport's writer, which closes the connection without a CLOSE packet
+        socket.queue.put_nowait(None)
+
+    async def finish(self):
+        stats = self.stats
+        log(f"🏁 Scenario finished: {stats['realtimeData']} realtime, {stats['dailyData']} daily, "
+            f"{len(self.buffered)} still buffered, {stats['dropped']} dropped, {stats['connects']} connects")
+        self.done.set()
+
+    def start_scenario(self):
+        self.started_at = time.time()
+        # Devices start emitting once the scenario starts
+        self.fleet.start(now_ms())
+        log(f"🎬 Scenario started: {len(self.fleet)} devices, {len(self.scenario['steps'])} steps")
+        for step in self.scenario["steps"]:
+            self.later(step["at_s"], self.run_step, step)
+        if self.scenario["duration_s"]:
+            self.later(self.scenario["duration_s"], self.finish)
+
+    # ---- SOCKETS ----
+    async def on_connect(self, sid, environ):
+        self.agents.append(sid)
+        self.stats["connects"] += 1
+        log(f"📡 Agent connected: {sid} ({len(self.agents)} connected)")
+        if self.started_at is None:
+            self.start_scenario()
+        # After the handshake completes, so the agent's handlers see the backlog
+        self.later(0, self.flush_buffered)
+
+    async def on_disconnect(self, sid, *reason):
+        if sid in self.agents:
+            self.agents.remove(sid)
+        self.stats["disconnects"] += 1
+        log(f"❌ Agent disconnected: {sid} ({len(self.agents)} connected)")
+
+    async def poll(self):
+        while not self.done.is_set():
+            if self.started_at is not None:
+                for event, payload, device in self.fleet.due(now_ms()):
+                    await self.deliver(event, payload, device)
+            await asyncio.sleep(self.tick)
+
+    async def report(self):
+        while not self.done.is_set():
+            await asyncio.sleep(self.stats_interval)
+            if self.started_at is None:
+                continue
+            rate = self.window_emitted / self.stats_interval
+            self.window_emitted = 0
+            stats = self.stats
+            log(f"📈 {rate:.0f} events/s, {stats['realtimeData']} realtime, {stats['dailyData']} daily, "
+                f"{len(self.buffered)} buffered, {stats['dropped']} dropped, {len(self.agents)} agents")
+
+    # ---- HTTP ----
+    async def override(self, request):
+        body = await request.json() if request.can_read_body else {}
+        try:
+            devices = self.fleet.select([body["patient_id"]]) if body.get("patient_id") else self.fleet.devices
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=404)
+
+        rng = self.fleet.rng
+        for device in devices:
+            previous = device.override or {}
+            device.override = {
+                "heart_rate": body.get("heart_rate", previous.get("heart_rate", rng.randint(60, 100))),
+                "spo2": body.get("spo2", previous.get("spo2", rng.randint(95, 100))),
+                "stress_level": body.get("stress_level", previous.get("stress_level", rng.randint(1, 5))),
+            }
+
+        first = devices[0]
+        data = {"patient_id": first.patient_id, **first.override, "steps": first.steps, "calories_burned": first.calories, "timestamp": now_ms()}
+        await self.sio.emit("overrideSet", data)
+        return web.json_response({"status": "override set", "devices": len(devices), "data": data})
+
+    async def reset(self, request):
+        body = await request.json() if request.can_read_body else {}
+        patient_id = body.get("patient_id")
+        devices = self.fleet.devices
+        if patient_id:
+            devices = [device for device in devices if device.patient_id == patient_id]
+        for device in devices:
+            device.override = None
+        await self.sio.emit("overrideCleared")
+        return web.json_response({"status": "override cleared", "devices": len(devices)})
+
+    async def stats_handler(self, request):
+        return web.json_response({
+            "devices": len(self.fleet),
+            "agents": len(self.agents),
+            "elapsed_s": None if self.started_at is None else time.time() - self.started_at,
+            "pending": len(self.buffered),
+            **self.stats,
+        })
+
+    async def serve(self, host, port, scenario_path=None):
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        log(f"🚀 Load generator on http://{host}:{port} ({len(self.fleet)} devices, scenario: {scenario_path or 'defaults'})")
+        tasks = [asyncio.create_task(self.poll()), asyncio.create_task(self.report())]
+        try:
+            await self.done.wait()
+        finally:
+            for task in [*tasks, *self._timers]:
+                task.cancel()
+            for sid in list(self.agents):
+                await self.sio.disconnect(sid)
+            await runner.cleanup()
+        return dict(self.stats)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenario = load_scenario(args.scenario, args.devices, args.seed)
+
+    async def run():
+        generator = LoadGenerator(scenario, args.tick, args.stats_interval, args.max_buffered)
+        return await generator.serve(args.host, args.port, args.scenario)
+
+    try:
+        return asyncio.run(run())
+    except KeyboardInterrupt:
+        log("🏁 Interrupted")
+
+
+if __name__ == "__main__":
+    main()
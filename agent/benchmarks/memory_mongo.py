@@ -0,0 +1,116 @@
+# In-memory stand-in for the MongoDB collections the socket handlers and the
+# emergency workflow write to. Writes are counted and timed, not stored, so the
+# benchmark measures the agent rather than a database.
+from bson import ObjectId
+
+COLLECTIONS = ("realtime_data", "daily_data", "call_sms_history", "realtime_rollups", "scheduler_runs", "patient_baselines")
+
+
+class _Result:
+    def __init__(self, inserted_ids=()):
+        self.inserted_ids = list(inserted_ids)
+        self.inserted_id = self.inserted_ids[0] if self.inserted_ids else None
+
+
+class _Cursor:
+    def __init__(self, docs=()):
+        self._docs = list(docs)
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+    async def to_list(self, length=None):
+        return list(self._docs)
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        for doc in self._docs:
+            yield doc
+
+
+class MemoryCollection:
+    """Counts writes per collection; reads return nothing (as for a fresh database)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.writes = 0
+        self.batches = 0
+
+    def _write(self, docs):
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        self.writes += len(docs)
+        self.batches += 1
+        return _Result(doc["_id"] for doc in docs)
+
+    def insert_one(self, doc):
+        return self._write([doc])
+
+    def insert_many(self, docs, ordered=True):
+        return self._write(list(docs))
+
+    def bulk_write(self, ops, ordered=True):
+        self.writes += len(ops)
+        self.batches += 1
+
+    def update_one(self, *args, **kwargs):
+        self.writes += 1
+
+    def find_one_and_update(self, *args, **kwargs):
+        self.writes += 1
+
+    def find_one(self, *args, **kwargs):
+        return None
+
+    def find(self, *args, **kwargs):
+        return _Cursor()
+
+    def aggregate(self, pipeline, **kwargs):
+        return _Cursor()
+
+    def distinct(self, *args, **kwargs):
+        return []
+
+
+class AsyncMemoryCollection(MemoryCollection):
+    async def insert_one(self, doc):
+        return self._write([doc])
+
+    async def insert_many(self, docs, ordered=True):
+        return self._write(list(docs))
+
+    async def bulk_write(self, ops, ordered=True):
+        MemoryCollection.bulk_write(self, ops)
+
+    async def update_one(self, *args, **kwargs):
+        self.writes += 1
+
+    async def find_one(self, *args, **kwargs):
+        return None
+
+    async def aggregate(self, pipeline, **kwargs):
+        return _Cursor()
+
+    async def distinct(self, *args, **kwargs):
+        return []
+
+
+def install():
+    """Swap the collections in config.db and config.async_db before the agent modules import them.
+    Returns {name: (sync stand-in, async stand-in)}."""
+    from config import db, async_db
+
+    collections = {}
+    for name in COLLECTIONS:
+        collections[name] = (MemoryCollection(name), AsyncMemoryCollection(name))
+        setattr(db, f"{name}_collection", collections[name][0])
+        setattr(async_db, f"{name}_collection", collections[name][1])
+    return collections
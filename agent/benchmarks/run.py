@@ -0,0 +1,330 @@
+"""Benchmark the agent's socket handlers with synthetic streams.
+
+Run from agent/:
+
+    python -m benchmarks.run --readings 20000 --patients 50 --rate 0 \\
+        --mix normal=0.9,small=0.06,high=0.03,stress=0.01 --llm-latency 0.8 --output bench.json
+
+The registered ``realtimeData``/``dailyData`` handlers are called directly.
+MongoDB is replaced by an in-memory stand-in and the chat model by a stub with
+the given latency, so the numbers cover the agent's own work. Stages:
+
+    ingest            whole realtime handler call
+    validation        realtime_data model
+    db_write          save_to_db (write-behind buffer)
+    hardcoded_checks  fast-path triage deciding whether the graph runs
+    workflow          emergency graph run
+    llm               bounded model call (slots, deadline, stub latency)
+    alert             notify step of sms_alert / emergency_call / family_call / therapist_call
+
+Abnormal readings come in per-patient episodes (--episode-seconds), so the
+sustained-condition rules confirm them and alerts reach the llm and alert
+stages. The JSON report (stdout, or --output) has throughput, p50/p95/p99 per
+stage, peak memory and the agent's own counters, for tracking regressions.
+The run fails if any stage above recorded no samples.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent's socket handlers")
+    parser.add_argument("--runtime", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--readings", type=int, default=10000, help="realtime readings to send")
+    parser.add_argument("--patients", type=int, default=20, help="simulated devices, round-robin")
+    parser.add_argument("--rate", type=float, default=0, help="readings per second; 0 sends as fast as possible")
+    parser.add_argument("--mix", default="normal=0.9,small=0.06,high=0.03,stress=0.01", help="reading kinds and weights")
+    parser.add_argument("--episode-seconds", type=float, default=60, help="length of a patient's run of abnormal readings")
+    parser.add_argument("--daily-every", type=int, default=1000, help="send a daily payload every N readings; 0 disables")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub model latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="uniform +/- jitter on the stub latency")
+    parser.add_argument("--cooldown-minutes", type=float, default=0, help="alert cooldown; 0 lets every alert through")
+    parser.add_argument("--no-llm-cache", action="store_true", help="disable the SMS response cache")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the Python heap peak (tracemalloc; slower)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def configure(args):
+    """Settings are read at import time, so this runs before any agent module is imported"""
+    os.environ["COOLDOWN_MINUTES"] = str(args.cooldown_minutes)
+    if args.no_llm_cache:
+        os.environ["LLM_CACHE_SIZE"] = "0"
+
+
+STAGES = ("ingest", "validation", "db_write", "hardcoded_checks", "workflow", "llm", "alert")
+
+
+# ---- TIMING ----
+def percentile(values, q):
+    """Nearest-rank percentile of sorted ``values``"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class StageTimer:
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return timed
+
+    def awrap(self, stage, fn):
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return timed
+
+    def summary(self):
+        report = {}
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        for stage, values in samples.items():
+            report[stage] = {
+                "count": len(values),
+                "mean_ms": sum(values) / len(values) * 1000,
+                **{f"p{q}_ms": percentile(values, q) * 1000 for q in (50, 95, 99)},
+                "max_ms": values[-1] * 1000,
+            }
+        return report
+
+
+def stub_model(latency, jitter, seed):
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    rng = random.Random(seed)
+    reply = AIMessage(content=json.dumps({"message": "Your heart rate is a little high. Rest for a few minutes and drink some water."}))
+
+    def delay():
+        return max(0.0, latency + rng.uniform(-jitter, jitter))
+
+    def invoke(_):
+        time.sleep(delay())
+        return reply
+
+    async def ainvoke(_):
+        await asyncio.sleep(delay())
+        return reply
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+# ---- INSTRUMENTATION ----
+def instrument_workflow(timer):
+    from workflow import llm
+    import workflow.emergency_monitoring as emergency
+
+    llm.call = timer.wrap("llm", llm.call)
+    llm.acall = timer.awrap("llm", llm.acall)
+    for name in ("notify_sms", "notify_emergency_contact", "notify_family", "notify_therapist"):
+        setattr(emergency, name, timer.wrap("alert", getattr(emergency, name)))
+
+
+def instrument_threads(timer):
+    from sockets import client
+
+    client.realtime_data = timer.wrap("validation", client.realtime_data)
+    client.save_to_db = timer.wrap("db_write", client.save_to_db)
+    client.triage_reading = timer.wrap("hardcoded_checks", client.triage_reading)
+    client.run_emergency_workflow = timer.wrap("workflow", client.run_emergency_workflow)
+    client.register_handlers()
+    return client
+
+
+class _TimedWorkflow:
+    def __init__(self, workflow, timer):
+        self.ainvoke = timer.awrap("workflow", workflow.ainvoke)
+
+
+def instrument_asyncio(timer):
+    from sockets import async_client
+
+    load_workflow = async_client.load_workflow
+    async_client.realtime_data = timer.wrap("validation", async_client.realtime_data)
+    async_client.save_to_db = timer.awrap("db_write", async_client.save_to_db)
+    async_client.triage_reading = timer.wrap("hardcoded_checks", async_client.triage_reading)
+    async_client.load_workflow = lambda name: _TimedWorkflow(load_workflow(name), timer)
+    async_client.register_handlers()
+    return async_client
+
+
+# ---- DRIVERS ----
+def _payloads(args, stream, kinds):
+    from benchmarks.streams import daily_payload
+
+    rng = random.Random(args.seed)
+    for i in range(args.readings):
+        kind, payload = stream.reading(i)
+        kinds[kind] += 1
+        daily = None
+        if args.daily_every and i % args.daily_every == 0:
+            daily = daily_payload(payload["patient_id"], payload["timestamp"], rng)
+        yield i, payload, daily
+
+
+def drive_threads(args, stream, timer, kinds):
+    client = instrument_threads(timer)
+    handlers = client.sio.handlers["/"]
+    realtime, on_daily = handlers["realtimeData"], handlers["dailyData"]
+    client.rollups.start()
+
+    started = time.perf_counter()
+    for i, payload, daily in _payloads(args, stream, kinds):
+        if args.rate:
+            time.sleep(max(0.0, started + i / args.rate - time.perf_counter()))
+        call_started = time.perf_counter()
+        realtime(payload)
+        timer.record("ingest", time.perf_counter() - call_started)
+        if daily is not None:
+            on_daily(daily)
+    ingested = time.perf_counter()
+
+    # Drain queued workflows and flush the write-behind buffers
+    client.shutdown()
+    return ingested - started, time.perf_counter() - started, {"workflow_pool": client.workflow_pool.stats()}
+
+
+async def drive_asyncio(args, stream, timer, kinds):
+    client = instrument_asyncio(timer)
+    handlers = client.sio.handlers["/"]
+    realtime, on_daily = handlers["realtimeData"], handlers["dailyData"]
+    for buffer in client.write_buffers.values():
+        buffer.start()
+    client.rollups.astart()
+
+    started = time.perf_counter()
+    for i, payload, daily in _payloads(args, stream, kinds):
+        if args.rate:
+            await asyncio.sleep(max(0.0, started + i / args.rate - time.perf_counter()))
+        call_started = time.perf_counter()
+        await realtime(payload)
+        timer.record("ingest", time.perf_counter() - call_started)
+        if daily is not None:
+            await on_daily(daily)
+    ingested = time.perf_counter()
+
+    await client.shutdown()
+    return ingested - started, time.perf_counter() - started, {}
+
+
+# ---- REPORT ----
+def _samples(metric):
+    return {",".join(f"{k}={v}" for k, v in key) or "total": value for key, value in metric.samples().items()}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure(args)
+
+    from benchmarks import memory_mongo
+    from benchmarks.streams import RealtimeStream, parse_mix
+
+    collections = memory_mongo.install()
+
+    from sockets.ingest import fast_path_readings
+    from utils.llm_cache import cache_requests
+    from utils.log import records_dropped, setup_logging, stop_logging
+    from workflow import llm
+
+    llm.set_model(stub_model(args.llm_latency, args.llm_jitter, args.seed))
+    timer = StageTimer()
+    instrument_workflow(timer)
+
+    # Readings end "now", so the vitals window's last-5-minute averages see them
+    interval = 5.0
+    span_ms = int(args.readings / max(1, args.patients) * interval * 1000)
+    episode = max(1, math.ceil(args.episode_seconds / interval))
+    stream = RealtimeStream(args.patients, parse_mix(args.mix), int(time.time() * 1000) - span_ms, interval, args.seed, episode)
+    kinds = Counter()
+
+    if args.trace_memory:
+        tracemalloc.start()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # Real queue handler and formatting, written to /dev/null
+        setup_logging(stream=devnull)
+        if args.runtime == "asyncio":
+            ingest_seconds, total_seconds, extra = asyncio.run(drive_asyncio(args, stream, timer, kinds))
+        else:
+            ingest_seconds, total_seconds, extra = drive_threads(args, stream, timer, kinds)
+        stop_logging()
+    python_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if args.trace_memory else None
+
+    report = {
+        "benchmark": "socket_handlers",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "readings": args.readings,
+        "reading_kinds": dict(kinds),
+        "elapsed_seconds": {"ingest": ingest_seconds, "total": total_seconds},
+        "throughput_per_second": {
+            "ingest": args.readings / ingest_seconds if ingest_seconds else None,
+            "end_to_end": args.readings / total_seconds if total_seconds else None,
+        },
+        "stages": timer.summary(),
+        "memory": {"peak_rss_mb": peak_rss_mb(), "python_peak_mb": python_peak},
+        "agent": {
+            "fast_path": _samples(fast_path_readings),
+            "llm_cache": _samples(cache_requests),
+            "llm_unavailable": _samples(llm.unavailable),
+            "log_records_dropped": _samples(records_dropped),
+            "writes": {name: sync.writes + async_.writes for name, (sync, async_) in collections.items()},
+            **extra,
+        },
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    print(f"{args.readings} readings in {total_seconds:.2f}s ({report['throughput_per_second']['end_to_end']:.0f}/s end to end)", file=sys.stderr)
+    for stage, summary in report["stages"].items():
+        print(f"  {stage:<17} n={summary['count']:<7} p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms", file=sys.stderr)
+
+    missing = [stage for stage in STAGES if stage not in report["stages"]]
+    if missing:
+        raise SystemExit(f"❌ No samples for {', '.join(missing)}; check --mix, --episode-seconds and SUSTAINED_RULES")
+    return report
+
+
+if __name__ == "__main__":
+    main()
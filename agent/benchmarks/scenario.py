@@ -0,0 +1,98 @@
+# Scenario files for the load generator (benchmarks/loadgen.py). A scenario
+# describes the fleet and a timeline of steps, e.g.
+#
+#   {
+#     "seed": 7,
+#     "duration_s": 600,
+#     "fleet": [{"count": 2000, "realtime_interval_ms": 5000, "daily_interval_ms": 60000}],
+#     "steps": [
+#       {"at_s": 30, "action": "condition", "condition": "heartAttack", "devices": 0.01, "duration_s": 60},
+#       {"at_s": 60, "action": "rate", "devices": 100, "realtime_interval_ms": 1000, "duration_s": 120},
+#       {"at_s": 90, "action": "reconnectStorm", "waves": 3, "every_ms": 2000}
+#     ]
+#   }
+#
+# Step times are relative to the first agent connection.
+import json
+from benchmarks.devices import CONDITIONS
+
+DEFAULTS = {
+    "seed": 1,
+    "duration_s": 0,  # 0 runs until interrupted
+    "fleet": [{"count": 1}],
+    "realtime_interval_ms": 5000,
+    "daily_interval_ms": 60000,
+    "steps": [],
+}
+
+
+def _positive(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def _check_condition(step):
+    if step.get("condition") not in CONDITIONS:
+        raise ValueError(f"unknown condition {step.get('condition')!r}; expected one of {', '.join(CONDITIONS)}")
+
+
+def _check_rate(step):
+    if not _positive(step.get("realtime_interval_ms")):
+        raise ValueError("rate step needs realtime_interval_ms > 0")
+
+
+def _check_reconnect_storm(step):
+    if not isinstance(step.get("waves"), int) or step["waves"] < 1:
+        raise ValueError("reconnectStorm step needs waves >= 1")
+
+
+ACTIONS = {
+    "condition": _check_condition,
+    "rate": _check_rate,
+    "reconnectStorm": _check_reconnect_storm,
+}
+
+
+def parse_scenario(raw, devices=None, seed=None):
+    """Validated scenario with defaults filled in. ``devices`` scales the fleet to that total."""
+    scenario = {**DEFAULTS, **raw}
+    if seed is not None:
+        scenario["seed"] = seed
+    scenario["fleet"] = [
+        {
+            "condition": "normal",
+            "realtime_interval_ms": scenario["realtime_interval_ms"],
+            "daily_interval_ms": scenario["daily_interval_ms"],
+            **group,
+        }
+        for group in scenario["fleet"]
+    ]
+
+    for group in scenario["fleet"]:
+        if not isinstance(group.get("count"), int) or group["count"] < 1:
+            raise ValueError("every fleet group needs count >= 1")
+        if not _positive(group["realtime_interval_ms"]) or not _positive(group["daily_interval_ms"]):
+            raise ValueError("emit intervals must be > 0")
+        if group["condition"] not in CONDITIONS:
+            raise ValueError(f"unknown condition {group['condition']!r}")
+    if devices:
+        total = sum(group["count"] for group in scenario["fleet"])
+        for group in scenario["fleet"]:
+            group["count"] = max(1, round(group["count"] * devices / total))
+
+    for step in scenario["steps"]:
+        check = ACTIONS.get(step.get("action"))
+        if check is None:
+            raise ValueError(f"unknown action {step.get('action')!r}; expected one of {', '.join(ACTIONS)}")
+        if not isinstance(step.get("at_s"), (int, float)) or step["at_s"] < 0:
+            raise ValueError(f"{step['action']} step needs at_s >= 0")
+        check(step)
+    scenario["steps"] = sorted(scenario["steps"], key=lambda step: step["at_s"])
+    return scenario
+
+
+def load_scenario(path=None, devices=None, seed=None):
+    raw = {}
+    if path:
+        with open(path) as f:
+            raw = json.load(f)
+    return parse_scenario(raw, devices, seed)
@@ -0,0 +1,198 @@
+"""Compare realtime_data storage layouts on a real MongoDB: a plain collection
+against a time-series collection (config/storage.py).
+
+Run from agent/ against a scratch server (MONGODB_URI):
+
+    python -m benchmarks.storage --readings 500000 --patients 20 --repeat 50 --output storage.json
+
+Both layouts get the same synthetic readings, stored exactly as the agent
+stores them (realtime_data model, write-behind batch size) and the indexes
+init_db would create. Reported per layout:
+
+    storage   documents, data size, on-disk size, index size, bytes per reading
+    load      insert throughput
+    queries   p50/p95 of the agent's window queries (last 5 minutes and 3 hours
+              for one patient, the all-patient warm-up and the 90-day trend)
+
+The benchmark database is dropped afterwards unless --keep is given.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+LAYOUTS = ("collection", "timeseries")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare realtime_data storage layouts")
+    parser.add_argument("--readings", type=int, default=500000, help="readings per layout")
+    parser.add_argument("--patients", type=int, default=20, help="simulated devices, round-robin")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between a device's readings")
+    parser.add_argument("--granularity", default="seconds", help="time-series granularity, or a bucket span in seconds")
+    parser.add_argument("--batch-size", type=int, default=500, help="documents per insert_many")
+    parser.add_argument("--repeat", type=int, default=50, help="runs of each query")
+    parser.add_argument("--database", default="storage_bench")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark database")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def create(db, layout, granularity):
+    """Empty collection for ``layout`` with the indexes init_db would create"""
+    from config.indexes import required_indexes
+    from config.storage import create_options
+
+    name = f"realtime_{layout}"
+    db.drop_collection(name)
+    if layout == "timeseries":
+        db.create_collection(name, **create_options(granularity))
+    else:
+        db.create_collection(name)
+    timeseries = {"realtime_data"} if layout == "timeseries" else set()
+    db[name].create_indexes(required_indexes(timeseries)["realtime_data"])
+    return db[name]
+
+
+def load(collection, stream, readings, batch_size):
+    """Insert ``readings`` as the agent stores them; returns seconds spent in insert_many"""
+    from models.realtime_data import realtime_data
+
+    spent = 0.0
+    batch = []
+    for i in range(readings):
+        batch.append(realtime_data(**stream.reading(i)[1]).model_dump())
+        if len(batch) == batch_size or i == readings - 1:
+            started = time.perf_counter()
+            collection.insert_many(batch, ordered=False)
+            spent += time.perf_counter() - started
+            batch = []
+    return spent
+
+
+def storage_stats(collection, readings):
+    stats = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    report = {
+        "documents": collection.count_documents({}),
+        "data_bytes": stats["size"],
+        "storage_bytes": stats["storageSize"],
+        "index_bytes": stats["totalIndexSize"],
+        "disk_bytes_per_reading": (stats["storageSize"] + stats["totalIndexSize"]) / readings,
+    }
+    if "timeseries" in stats:
+        report["buckets"] = stats["timeseries"].get("bucketCount")
+    return report
+
+
+def window_queries(end, patients):
+    """(name, run(collection, patient_id)) for the agent's realtime queries"""
+    from utils.patients import patient_filter
+    from utils.trends import realtime_trends_pipeline
+
+    def window(seconds):
+        def run(collection, patient_id):
+            query = {**patient_filter(patient_id), "timestamp": {"$gte": end - timedelta(seconds=seconds)}}
+            return list(collection.find(query).sort("timestamp", -1))
+        return run
+
+    def warm_up(collection, patient_id):
+        # utils/vitals_window.warm_up: every patient's last 3 hours, oldest first
+        return list(collection.find({"timestamp": {"$gte": end - timedelta(hours=3)}}).sort("timestamp", 1))
+
+    def trend(collection, patient_id):
+        match = {**patient_filter(patient_id), "timestamp": {"$gte": end - timedelta(days=90)}}
+        return list(collection.aggregate(realtime_trends_pipeline(match)))
+
+    return [("window_5m", window(5 * 60)), ("window_3h", window(3 * 60 * 60)), ("warm_up_3h", warm_up), ("trend_90d", trend)]
+
+
+def time_queries(collection, queries, patients, repeat, seed):
+    from benchmarks.run import percentile
+
+    rng = random.Random(seed)
+    report = {}
+    for name, run in queries:
+        run(collection, patients[0])  # warm the cache
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = run(collection, rng.choice(patients))
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        report[name] = {
+            "rows": len(rows),
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p95_ms": percentile(samples, 95) * 1000,
+        }
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from pymongo import MongoClient
+    from config.db import MONGODB_URI
+    from benchmarks.streams import RealtimeStream, parse_mix
+
+    client = MongoClient(MONGODB_URI)
+    db = client[args.database]
+
+    # Readings end now, so the window queries have data to find
+    span_ms = int(args.readings / max(1, args.patients) * args.interval * 1000)
+    start_ms = int(time.time() * 1000) - span_ms
+    end = datetime.fromtimestamp(time.time())
+
+    layouts = {}
+    try:
+        for layout in LAYOUTS:
+            stream = RealtimeStream(args.patients, parse_mix("normal=0.9,small=0.06,high=0.03,stress=0.01"), start_ms, args.interval, args.seed)
+            collection = create(db, layout, args.granularity)
+            seconds = load(collection, stream, args.readings, args.batch_size)
+            # Checkpoint so storageSize reflects what was written
+            client.admin.command("fsync")
+            layouts[layout] = {
+                "load": {"seconds": seconds, "readings_per_second": args.readings / seconds},
+                "storage": storage_stats(collection, args.readings),
+                "queries": time_queries(collection, window_queries(end, stream.patients), stream.patients, args.repeat, args.seed),
+            }
+            print(f"{layout}: loaded {args.readings} readings in {seconds:.1f}s", file=sys.stderr)
+    finally:
+        if not args.keep:
+            client.drop_database(args.database)
+
+    plain, timeseries = layouts["collection"], layouts["timeseries"]
+    report = {
+        "benchmark": "realtime_storage",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "server": client.server_info()["version"],
+        "config": vars(args),
+        "layouts": layouts,
+        "timeseries_vs_collection": {
+            "disk_bytes": timeseries["storage"]["disk_bytes_per_reading"] / plain["storage"]["disk_bytes_per_reading"],
+            **{f"{name}_p50": timeseries["queries"][name]["p50_ms"] / plain["queries"][name]["p50_ms"] for name in plain["queries"]},
+        },
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for layout, result in layouts.items():
+        storage = result["storage"]
+        print(f"  {layout:<11} disk={storage['storage_bytes'] / 2**20:.1f}MB index={storage['index_bytes'] / 2**20:.1f}MB "
+              f"({storage['disk_bytes_per_reading']:.1f} B/reading)", file=sys.stderr)
+        for name, query in result["queries"].items():
+            print(f"    {name:<11} rows={query['rows']:<7} p50={query['p50_ms']:.2f}ms p95={query['p95_ms']:.2f}ms", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    main()
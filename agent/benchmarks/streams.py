@@ -0,0 +1,89 @@
+# Synthetic realtime and daily payloads, shaped like the simulator's socket events
+import random
+
+# Value ranges per reading kind, chosen against the thresholds in utils/vitals_checks.py
+KINDS = {
+    "normal": {"heart_rate": (60, 100), "spo2": (95, 100), "stress_level": (0, 40)},
+    "small": {"heart_rate": (101, 110), "spo2": (95, 100), "stress_level": (0, 40)},
+    "high": {"heart_rate": (120, 160), "spo2": (85, 92), "stress_level": (0, 40)},
+    "stress": {"heart_rate": (60, 100), "spo2": (95, 100), "stress_level": (61, 95)},
+}
+
+
+def parse_mix(spec):
+    """'normal=0.9,small=0.07,high=0.02,stress=0.01' -> {kind: weight}"""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in KINDS:
+            raise ValueError(f"unknown reading kind {kind!r}; expected one of {', '.join(KINDS)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+class RealtimeStream:
+    """Readings for ``patients`` devices, round-robin, every ``interval`` seconds of device time.
+
+    Abnormal kinds come in per-patient episodes of ``episode`` consecutive
+    readings, long enough for the sustained-condition rules (utils/sustained.py)
+    to confirm them; normal readings are drawn one at a time. Episode starts are
+    weighted so each kind still makes up its share of the mix.
+    """
+
+    def __init__(self, patients, mix, start_ms, interval=5.0, seed=0, episode=12):
+        self.patients = [f"patient-{i + 1}" for i in range(patients)]
+        self.kinds = list(mix)
+        self.lengths = {k: 1 if k == "normal" else episode for k in self.kinds}
+        self.weights = [mix[k] / self.lengths[k] for k in self.kinds]
+        self.start_ms = start_ms
+        self.interval_ms = int(interval * 1000)
+        self.random = random.Random(seed)
+        self.steps = {p: 0 for p in self.patients}
+        self.calories = {p: 0 for p in self.patients}
+        self.episodes = {p: ("normal", 0) for p in self.patients}  # kind, readings left
+
+    def next_kind(self, patient_id):
+        kind, left = self.episodes[patient_id]
+        if left == 0:
+            kind = self.random.choices(self.kinds, self.weights)[0]
+            left = self.lengths[kind]
+        self.episodes[patient_id] = (kind, left - 1)
+        return kind
+
+    def reading(self, i):
+        patient_id = self.patients[i % len(self.patients)]
+        kind = self.next_kind(patient_id)
+        ranges = KINDS[kind]
+        self.steps[patient_id] += self.random.randint(0, 12)
+        self.calories[patient_id] += self.random.randint(0, 1)
+        return kind, {
+            "patient_id": patient_id,
+            "heart_rate": self.random.randint(*ranges["heart_rate"]),
+            "spo2": self.random.randint(*ranges["spo2"]),
+            "stress_level": self.random.randint(*ranges["stress_level"]),
+            "steps": self.steps[patient_id],
+            "calories_burned": self.calories[patient_id],
+            "timestamp": self.start_ms + (i // len(self.patients)) * self.interval_ms,
+        }
+
+
+def daily_payload(patient_id, timestamp_ms, rng=random):
+    sleep_start = timestamp_ms - 9 * 60 * 60 * 1000
+    return {
+        "patient_id": patient_id,
+        "sleep": {
+            "duration": rng.randint(300, 540),
+            "quality": rng.choice(["good", "average", "poor"]),
+            "start": sleep_start,
+            "end": sleep_start + 8 * 60 * 60 * 1000,
+        },
+        "nutrition": {
+            "calories": rng.randint(1500, 2800),
+            "protein": rng.randint(40, 120),
+            "carbs": rng.randint(150, 350),
+            "fat": rng.randint(40, 100),
+        },
+        "water_intake": round(rng.uniform(0.8, 3.0), 2),
+        "energy_score": rng.randint(40, 95),
+        "timestamp": timestamp_ms,
+    }
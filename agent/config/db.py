@@ -1,11 +1,18 @@
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+from config.storage import ensure_realtime_storage, REALTIME
+from config import settings
+from config.indexes import ensure_indexes, unindexed_queries
+from utils.telemetry import mongo_commands
+from utils.log import get_logger
 
 load_dotenv()
 
+log = get_logger(__name__)
+
 MONGODB_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGODB_URI)
+client = MongoClient(MONGODB_URI, event_listeners=[mongo_commands])
 
 health_data_db = client.health_data_db
 my_db = client.mydatabase
@@ -14,7 +21,22 @@ realtime_data_collection = health_data_db["realtime_data"]
 daily_data_collection = health_data_db["daily_data"]
 user_collection = my_db["users"]
 call_sms_history_collection = health_data_db["call_sms_history"]
+realtime_rollups_collection = health_data_db["realtime_rollups"]
+patient_baselines_collection = health_data_db["patient_baselines"]
+scheduler_runs_collection = health_data_db["scheduler_runs"]
 
 def init_db():
+    """Create the configured realtime_data layout, reconcile the required indexes and report queries that still lack index support"""
+    action = ensure_realtime_storage(health_data_db)
+    if action == ("create",):
+        log.info("🗂️ Created time-series collection %s", REALTIME)
+    elif action is not None and action[0] == "retention":
+        log.info("🗂️ Set %s expiry to %s seconds", REALTIME, action[1])
+    elif action is not None:
+        log.warning("⚠️ %s uses the %s layout but REALTIME_STORAGE=%s; convert it with python -m config.migrate_realtime", REALTIME, action[1], settings.REALTIME_STORAGE)
+    for collection_name, action, name in ensure_indexes(health_data_db):
+        log.info("🗂️ %s index %s.%s", action, collection_name, name)
+    for entry in unindexed_queries(health_data_db):
+        log.warning("⚠️ Query without index support: %s on %s (%s)", entry["query"], entry["collection"], " > ".join(entry["stages"]))
     return health_data_db
 
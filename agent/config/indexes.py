@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from config import settings
+from config.storage import retention_seconds, timeseries_collections, atimeseries_collections
+
+
+# ---- REQUIRED INDEXES ----
+def required_indexes(timeseries=()):
+    """Index models per collection name; ``timeseries`` names the time-series collections.
+
+    Every workload query is per patient and ordered by time, hence the
+    (patient_id, timestamp) compounds. TTL indexes must be single-field, so
+    retention rides on the plain realtime timestamp index. A time-series
+    realtime_data expires through its collection options instead (config/storage.py).
+    """
+    realtime_ttl = {}
+    if retention_seconds() is not None and "realtime_data" not in timeseries:
+        realtime_ttl = {"expireAfterSeconds": retention_seconds()}
+
+    return {
+        "realtime_data": [
+            IndexModel([("patient_id", ASCENDING), ("timestamp", DESCENDING)], name="patient_timestamp"),
+            IndexModel([("timestamp", DESCENDING)], name="timestamp_desc", **realtime_ttl),
+        ],
+        "daily_data": [
+            IndexModel([("patient_id", ASCENDING), ("timestamp", DESCENDING)], name="patient_timestamp"),
+        ],
+        "realtime_rollups": [
+            IndexModel([("patient_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)], name="patient_granularity_bucket", unique=True),
+        ],
+        "call_sms_history": [
+            IndexModel([("patient_id", ASCENDING), ("type", ASCENDING), ("timestamp", DESCENDING)], name="patient_type_timestamp"),
+        ],
+    }
+
+
+def reconcile_plan(existing, models):
+    """Actions that bring ``existing`` (index_information()) in line with ``models``.
+
+    Returns a list of ("create", model), ("drop", name) and ("ttl", name, seconds).
+    Indexes are matched by name; indexes we did not declare are left alone.
+    """
+    actions = []
+    for model in models:
+        spec = model.document
+        name = spec["name"]
+        current = existing.get(name)
+        if current is None:
+            actions.append(("create", model))
+            continue
+
+        wanted_ttl = spec.get("expireAfterSeconds")
+        current_ttl = current.get("expireAfterSeconds")
+        if list(current["key"]) != list(spec["key"].items()) or (wanted_ttl is None) != (current_ttl is None):
+            actions.append(("drop", name))
+            actions.append(("create", model))
+        elif wanted_ttl != current_ttl:
+            actions.append(("ttl", name, wanted_ttl))
+    return actions
+
+
+def ensure_indexes(db):
+    """Idempotently create or update the required indexes. Returns the actions taken."""
+    applied = []
+    for collection_name, models in required_indexes(timeseries_collections(db)).items():
+        collection = db[collection_name]
+        for action in reconcile_plan(collection.index_information(), models):
+            if action[0] == "create":
+                collection.create_indexes([action[1]])
+            elif action[0] == "drop":
+                collection.drop_index(action[1])
+            else:
+                db.command("collMod", collection_name, index={"name": action[1], "expireAfterSeconds": action[2]})
+            applied.append((collection_name,) + _describe(action))
+    return applied
+
+
+async def aensure_indexes(db):
+    applied = []
+    for collection_name, models in required_indexes(await atimeseries_collections(db)).items():
+        collection = db[collection_name]
+        for action in reconcile_plan(await collection.index_information(), models):
+            if action[0] == "create":
+                await collection.create_indexes([action[1]])
+            elif action[0] == "drop":
+                await collection.drop_index(action[1])
+            else:
+                await db.command("collMod", collection_name, index={"name": action[1], "expireAfterSeconds": action[2]})
+            applied.append((collection_name,) + _describe(action))
+    return applied
+
+
+def _describe(action):
+    if action[0] == "create":
+        return ("create", action[1].document["name"])
+    return action[:2]
+
+
+# ---- QUERY COVERAGE ----
+def workload_queries():
+    """The queries the agent actually runs, as (label, collection, filter, sort, limit)"""
+    window_start = datetime.now() - timedelta(hours=3)
+    since = datetime.now() - timedelta(days=90)
+    patient = {"patient_id": settings.DEFAULT_PATIENT_ID}
+    return [
+        ("realtime window", "realtime_data", {**patient, "timestamp": {"$gte": window_start}}, [("timestamp", DESCENDING)], 0),
+        ("realtime 90-day trend", "realtime_data", {**patient, "timestamp": {"$gte": since}}, [("timestamp", DESCENDING)], 0),
+        ("minute rollups", "realtime_rollups", {**patient, "granularity": "minute", "bucket": {"$gte": window_start}}, [("bucket", ASCENDING)], 0),
+        ("day rollups", "realtime_rollups", {**patient, "granularity": "day", "bucket": {"$gte": since}}, [("bucket", ASCENDING)], 0),
+        ("daily latest", "daily_data", patient, [("timestamp", DESCENDING)], 1),
+        ("daily 90-day trend", "daily_data", {**patient, "timestamp": {"$gte": since}}, [("timestamp", DESCENDING)], 0),
+        ("cooldown latest by type", "call_sms_history", {**patient, "type": "emergency_call"}, [("timestamp", DESCENDING)], 1),
+    ]
+
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("inputStage", "queryPlan", "winningPlan"):
+            stages += plan_stages(plan.get(key))
+        for child in plan.get("inputStages", []):
+            stages += plan_stages(child)
+    return stages
+
+
+def _query_planner(explain):
+    # Queries on a time-series collection explain as a pipeline over its buckets
+    if "queryPlanner" not in explain and explain.get("stages"):
+        return explain["stages"][0].get("$cursor", {}).get("queryPlanner", {})
+    return explain.get("queryPlanner", {})
+
+
+def _unindexed(label, collection_name, explain):
+    stages = plan_stages(_query_planner(explain).get("winningPlan", {}))
+    if "COLLSCAN" in stages or "SORT" in stages:
+        return {"query": label, "collection": collection_name, "stages": stages}
+    return None
+
+
+def unindexed_queries(db):
+    """Workload queries whose winning plan scans the collection or sorts in memory"""
+    report = []
+    for label, collection_name, query, sort, limit in workload_queries():
+        explain = db[collection_name].find(query).sort(sort).limit(limit).explain()
+        entry = _unindexed(label, collection_name, explain)
+        if entry:
+            report.append(entry)
+    return report
+
+
+async def aunindexed_queries(db):
+    report = []
+    for label, collection_name, query, sort, limit in workload_queries():
+        explain = await db[collection_name].find(query).sort(sort).limit(limit).explain()
+        entry = _unindexed(label, collection_name, explain)
+        if entry:
+            report.append(entry)
+    return report
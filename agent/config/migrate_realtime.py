@@ -0,0 +1,142 @@
+"""Convert realtime_data to the layout in REALTIME_STORAGE (usually "timeseries").
+
+Run from agent/:
+
+    python -m config.migrate_realtime [--chunk-size 5000] [--drop-source]
+
+1. realtime_data is renamed to realtime_data_legacy and recreated with the
+   new layout, so the agent can keep writing while history is copied. Readers
+   see the older history arrive as the copy runs.
+2. Legacy documents are copied in _id order, ``--chunk-size`` at a time. The
+   last copied _id is checkpointed in the migrations collection after every
+   chunk, so an interrupted run resumes where it stopped; the chunk that was in
+   flight is checked against the target so nothing is copied twice.
+3. When the copy is complete the checkpoint is marked done. ``--drop-source``
+   then drops realtime_data_legacy, once the new layout has been checked.
+
+Running it again after a completed migration does nothing.
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from pymongo import ASCENDING
+from config import settings
+from config.storage import REALTIME, create_options, layout_of, written_filter
+from utils.log import get_logger, setup_logging
+
+log = get_logger(__name__)
+
+LEGACY = f"{REALTIME}_legacy"
+MIGRATION_ID = "realtime_data_layout"
+
+
+def collection_info(db, name):
+    return next(db.list_collections(filter={"name": name}), None)
+
+
+def prepare(db, layout):
+    """Move the current collection aside and create the target layout; idempotent.
+    Returns the checkpoint document."""
+    checkpoints = db["migrations"]
+    checkpoint = checkpoints.find_one({"_id": MIGRATION_ID})
+    if checkpoint is not None and checkpoint["layout"] == layout:
+        return checkpoint
+
+    info = collection_info(db, REALTIME)
+    if info is not None and layout_of(info) == layout:
+        raise SystemExit(f"{REALTIME} already uses the {layout} layout")
+    if collection_info(db, LEGACY) is not None:
+        raise SystemExit(f"{LEGACY} exists without a matching checkpoint; move it away before migrating")
+
+    if info is not None:
+        db[REALTIME].rename(LEGACY)
+    if layout == "timeseries":
+        db.create_collection(REALTIME, **create_options())
+    else:
+        db.create_collection(REALTIME)
+
+    checkpoint = {
+        "_id": MIGRATION_ID,
+        "layout": layout,
+        "last_id": None,
+        "copied": 0,
+        "started": datetime.now(timezone.utc),
+        "finished": None,
+    }
+    checkpoints.replace_one({"_id": MIGRATION_ID}, checkpoint, upsert=True)
+    log.info("🗂️ Moved %s to %s and created the %s layout", REALTIME, LEGACY, layout)
+    return checkpoint
+
+
+def already_copied(target, docs):
+    """_ids of ``docs`` already in ``target``"""
+    return {doc["_id"] for doc in target.find(written_filter(docs), {"_id": 1})}
+
+
+def copy_chunks(db, checkpoint, chunk_size):
+    """Copy legacy documents after the checkpoint, chunk by chunk. Yields the running total after each chunk."""
+    source, target, checkpoints = db[LEGACY], db[REALTIME], db["migrations"]
+    # The first chunk may have been inserted before the last run stopped, without its checkpoint
+    resumed = True
+    while True:
+        query = {} if checkpoint["last_id"] is None else {"_id": {"$gt": checkpoint["last_id"]}}
+        docs = list(source.find(query).sort("_id", ASCENDING).limit(chunk_size))
+        if not docs:
+            return
+        if resumed:
+            copied = already_copied(target, docs)
+            docs_to_insert = [doc for doc in docs if doc["_id"] not in copied]
+            resumed = False
+        else:
+            docs_to_insert = docs
+        if docs_to_insert:
+            target.insert_many(docs_to_insert, ordered=False)
+
+        checkpoint["last_id"] = docs[-1]["_id"]
+        checkpoint["copied"] += len(docs)
+        checkpoints.update_one({"_id": MIGRATION_ID}, {"$set": {"last_id": checkpoint["last_id"], "copied": checkpoint["copied"]}})
+        yield checkpoint["copied"]
+
+
+def migrate(db, layout=None, chunk_size=None, drop_source=False):
+    """Run (or resume) the migration. Returns the checkpoint document."""
+    layout = layout or settings.REALTIME_STORAGE
+    chunk_size = chunk_size or settings.MIGRATION_CHUNK_SIZE
+    checkpoint = prepare(db, layout)
+
+    if checkpoint["finished"] is None:
+        total = db[LEGACY].estimated_document_count() if collection_info(db, LEGACY) else 0
+        started = time.monotonic()
+        for copied in copy_chunks(db, checkpoint, chunk_size):
+            rate = copied / max(time.monotonic() - started, 1e-9)
+            log.info("📦 Copied %d of ~%d readings (%.0f/s)", copied, total, rate, extra={"collection": REALTIME})
+        checkpoint["finished"] = datetime.now(timezone.utc)
+        db["migrations"].update_one({"_id": MIGRATION_ID}, {"$set": {"finished": checkpoint["finished"]}})
+        log.info("✅ Copied %d readings into the %s layout", checkpoint["copied"], layout, extra={"collection": REALTIME})
+
+    if drop_source and collection_info(db, LEGACY) is not None:
+        db[LEGACY].drop()
+        log.info("🗑️ Dropped %s", LEGACY)
+    return checkpoint
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert realtime_data to the REALTIME_STORAGE layout")
+    parser.add_argument("--layout", choices=("collection", "timeseries"), help="target layout; defaults to REALTIME_STORAGE")
+    parser.add_argument("--chunk-size", type=int, help="documents per chunk and checkpoint; defaults to MIGRATION_CHUNK_SIZE")
+    parser.add_argument("--drop-source", action="store_true", help=f"drop {LEGACY} once the copy is complete")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    from config.db import health_data_db, init_db
+
+    migrate(health_data_db, args.layout, args.chunk_size, args.drop_source)
+    # Indexes for the new layout
+    init_db()
+
+
+if __name__ == "__main__":
+    main()
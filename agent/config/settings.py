@@ -0,0 +1,157 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---- PATIENTS ----
+# Readings without a patient_id (older simulators, legacy documents) belong to this patient
+DEFAULT_PATIENT_ID = os.getenv("DEFAULT_PATIENT_ID", "default")
+
+# ---- WORKER POOLS ----
+# Overflow policies when a queue is full: "block", "drop_oldest" or "coalesce" (replace the patient's
+# queued task). Neither discards a queued alert more severe than the new one.
+WORKFLOW_WORKERS = int(os.getenv("WORKFLOW_WORKERS", "4"))
+WORKFLOW_QUEUE_SIZE = int(os.getenv("WORKFLOW_QUEUE_SIZE", "100"))
+WORKFLOW_OVERFLOW_POLICY = os.getenv("WORKFLOW_OVERFLOW_POLICY", "block")
+
+# ---- WRITE-BEHIND ----
+# Readings are inserted in unordered insert_many batches, flushed by size or age
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "5"))
+WRITE_MAX_BUFFERED = int(os.getenv("WRITE_MAX_BUFFERED", "50000"))
+
+# ---- ASYNCIO RUNTIME ----
+# AGENT_RUNTIME=asyncio runs the agent on a single event loop (AsyncClient, async pymongo, ainvoke)
+AGENT_RUNTIME = os.getenv("AGENT_RUNTIME", "threads")
+ASYNC_MAX_INFLIGHT_WORKFLOWS = int(os.getenv("ASYNC_MAX_INFLIGHT_WORKFLOWS", "500"))
+
+# ---- ROLLING VITALS WINDOW ----
+# In-memory ring buffer of recent readings; 4096 slots hold ~5.7h at the simulator's 5s cadence.
+# Rings start at VITALS_WINDOW_INITIAL_CAPACITY slots and double as they fill, up to the capacity.
+VITALS_WINDOW_CAPACITY = int(os.getenv("VITALS_WINDOW_CAPACITY", "4096"))
+VITALS_WINDOW_INITIAL_CAPACITY = int(os.getenv("VITALS_WINDOW_INITIAL_CAPACITY", "64"))
+VITALS_WINDOW_SECONDS = int(os.getenv("VITALS_WINDOW_SECONDS", str(3 * 60 * 60)))
+
+# ---- IDLE PATIENTS ----
+# Seconds without a reading after which a patient's vitals window, sustained-rule windows and in-memory
+# baseline are dropped (the baseline is reloaded from its snapshot when they return). Keep it at least
+# VITALS_WINDOW_SECONDS, the longest window; 0 keeps every patient.
+PATIENT_IDLE_SECONDS = float(os.getenv("PATIENT_IDLE_SECONDS", str(VITALS_WINDOW_SECONDS)))
+
+# ---- ALERT COOLDOWNS ----
+# Minutes before the same action type may fire again, overridable per type
+DEFAULT_COOLDOWN_MINUTES = float(os.getenv("COOLDOWN_MINUTES", "30"))
+COOLDOWN_MINUTES = {
+    type: float(os.getenv(f"COOLDOWN_{type.upper()}_MINUTES", DEFAULT_COOLDOWN_MINUTES))
+    for type in ("emergency_call", "emergency_sms", "therapist_call", "family_call", "baseline_sms")
+}
+
+# ---- PERSONAL BASELINES ----
+# EWMA weight of the newest reading, Welford count after which old readings are forgotten,
+# readings needed before a baseline is trusted, and the |z| of the EWMA that counts as a deviation
+BASELINE_ALPHA = float(os.getenv("BASELINE_ALPHA", "0.1"))
+BASELINE_MAX_COUNT = int(os.getenv("BASELINE_MAX_COUNT", "10000"))
+BASELINE_MIN_SAMPLES = int(os.getenv("BASELINE_MIN_SAMPLES", "120"))
+BASELINE_Z_THRESHOLD = float(os.getenv("BASELINE_Z_THRESHOLD", "3"))
+BASELINE_SNAPSHOT_INTERVAL = float(os.getenv("BASELINE_SNAPSHOT_INTERVAL", "60"))
+
+# ---- SUSTAINED CONDITIONS ----
+# An alert level escalates only while one of its rules holds: "<level>: <vital> <op> <threshold> for <n>s|m|h"
+# (every reading over that long) or "... in k/n" (k of the last n readings), separated by ';'.
+# Levels without rules escalate on a single reading; "off" disables every rule.
+SUSTAINED_RULES = os.getenv("SUSTAINED_RULES", "; ".join((
+    "high_alert: heart_rate > 110 for 30s",
+    "high_alert: heart_rate < 50 for 30s",
+    "high_alert: spo2 < 93 in 4/6",
+    "small_alert: heart_rate > 100 for 30s",
+    "small_alert: heart_rate < 60 for 30s",
+    "small_alert: spo2 < 95 in 4/6",
+    "small_alert: stress_level > 40 in 4/6",
+)))
+# A rule's window restarts after a gap of more than this many seconds between a patient's readings, so a
+# condition is never confirmed across missing data; 0 turns the check off
+SUSTAINED_MAX_GAP_SECONDS = float(os.getenv("SUSTAINED_MAX_GAP_SECONDS", "15"))
+
+# ---- REALTIME STORAGE ----
+# "collection" stores one document per reading; "timeseries" has init_db create realtime_data as a
+# MongoDB time-series collection (timeField timestamp, metaField patient_id). Granularity is
+# seconds/minutes/hours, or a bucket span in seconds. Convert an existing collection with
+# `python -m config.migrate_realtime`, which copies MIGRATION_CHUNK_SIZE readings per checkpoint.
+REALTIME_STORAGE = os.getenv("REALTIME_STORAGE", "collection")
+REALTIME_TIMESERIES_GRANULARITY = os.getenv("REALTIME_TIMESERIES_GRANULARITY", "seconds")
+MIGRATION_CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", "5000"))
+
+# ---- RETENTION ----
+# Days of raw realtime readings to keep (TTL index on timestamp, or the time-series expireAfterSeconds); 0 keeps everything
+REALTIME_RETENTION_DAYS = float(os.getenv("REALTIME_RETENTION_DAYS", "0"))
+
+# ---- COLD ARCHIVE ----
+# Days older than ARCHIVE_AFTER_DAYS move from realtime_data/daily_data to Arrow IPC files under
+# ARCHIVE_DIR (one per collection, patient and day) and are pruned from MongoDB.
+# Compression is zstd, lz4 or uncompressed (uncompressed files are read in place from the mapping).
+# Pruned days exist only in the archive, so ARCHIVE_DIR has no default: the archive job (SCHEDULE_ARCHIVE)
+# is only scheduled with an absolute path on storage every agent reads, and is off unless scheduled.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "7"))
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+
+# ---- ROLLUPS ----
+# Seconds between upserts of the minute/hour/day/week realtime rollups, and how many buckets of
+# failed upserts are held for retry before the oldest are dropped
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "10"))
+ROLLUP_MAX_PENDING = int(os.getenv("ROLLUP_MAX_PENDING", "100000"))
+
+# ---- LLM RESPONSE CACHE ----
+# Generated SMS are reused for inputs that quantize to the same buckets; size 0 disables caching
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 60)))
+
+# ---- LLM EXECUTION ----
+# Model calls share a global concurrency limit plus one per workflow, and each call has a
+# hard deadline (seconds, including time spent waiting for a slot). SMS nodes fall back to
+# a template message when the deadline is missed, so alerts keep their latency SLA.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_WORKFLOWS = ("emergency_monitoring", "periodic_wellness_check", "daily_wellness_check", "diagnose")
+LLM_CONCURRENCY = {
+    workflow: int(os.getenv(f"LLM_{workflow.upper()}_CONCURRENCY", "4"))
+    for workflow in LLM_WORKFLOWS
+}
+DEFAULT_LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "8"))
+LLM_DEADLINE_SECONDS = {
+    workflow: float(os.getenv(f"LLM_{workflow.upper()}_DEADLINE_SECONDS", DEFAULT_LLM_DEADLINE_SECONDS))
+    for workflow in LLM_WORKFLOWS
+}
+# Trend analysis is a large prompt and not latency-bound
+LLM_DEADLINE_SECONDS["diagnose"] = float(os.getenv("LLM_DIAGNOSE_DEADLINE_SECONDS", "120"))
+
+# ---- SCHEDULER ----
+# Triggers are "every <n>s|m|h|d" (aligned to the epoch) or 5-field cron in local time; "off" disables a job
+SCHEDULE_PERIODIC = os.getenv("SCHEDULE_PERIODIC", "every 3h")
+SCHEDULE_DAILY = os.getenv("SCHEDULE_DAILY", "0 8 * * *")
+SCHEDULE_DIAGNOSE = os.getenv("SCHEDULE_DIAGNOSE", "30 3 * * 1")
+SCHEDULE_ARCHIVE = os.getenv("SCHEDULE_ARCHIVE", "off")
+SCHEDULER_JITTER_SECONDS = float(os.getenv("SCHEDULER_JITTER_SECONDS", "120"))
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+SCHEDULER_FANOUT_WORKERS = int(os.getenv("SCHEDULER_FANOUT_WORKERS", "4"))
+
+# ---- TREND ANALYSIS ----
+# Token budget for the 3-month trend context; older detail is coarsened to fit
+DIAGNOSE_TOKEN_BUDGET = int(os.getenv("DIAGNOSE_TOKEN_BUDGET", "800"))
+
+# ---- METRICS ----
+# Prometheus text endpoint at http://METRICS_HOST:METRICS_PORT/metrics; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# ---- LOGGING ----
+# JSON lines (or "text") written by a background thread; the queue drops records when full
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Payload dumps per Socket.IO event: share of payloads logged (LOG_<EVENT>_SAMPLE_RATE), then a per-second cap
+LOG_PAYLOAD_SAMPLE_RATE = {
+    "realtimeData": float(os.getenv("LOG_REALTIMEDATA_SAMPLE_RATE", "0.01")),
+    "dailyData": float(os.getenv("LOG_DAILYDATA_SAMPLE_RATE", "1")),
+}
+LOG_PAYLOAD_MAX_PER_SECOND = float(os.getenv("LOG_PAYLOAD_MAX_PER_SECOND", "5"))
@@ -0,0 +1,108 @@
+# Layout of the realtime_data collection. "collection" stores one document per
+# reading; "timeseries" is a MongoDB time-series collection, which packs each
+# patient's readings into compressed buckets keyed by the metaField instead of
+# repeating field names and an _id index entry per reading. init_db creates the
+# configured layout when realtime_data does not exist yet; an existing plain
+# collection is converted with `python -m config.migrate_realtime`.
+from datetime import datetime
+from config import settings
+
+REALTIME = "realtime_data"
+TIME_FIELD = "timestamp"
+META_FIELD = "patient_id"
+LAYOUTS = ("collection", "timeseries")
+
+
+def timeseries_options(granularity=None):
+    """``timeseries`` option for create_collection. A number is a custom bucket span in seconds (MongoDB 6.3+)."""
+    granularity = str(granularity or settings.REALTIME_TIMESERIES_GRANULARITY)
+    options = {"timeField": TIME_FIELD, "metaField": META_FIELD}
+    if granularity.isdigit():
+        options["bucketMaxSpanSeconds"] = options["bucketRoundingSeconds"] = int(granularity)
+    else:
+        options["granularity"] = granularity
+    return options
+
+
+def retention_seconds():
+    """Raw reading retention in seconds, None to keep everything"""
+    if settings.REALTIME_RETENTION_DAYS > 0:
+        return int(settings.REALTIME_RETENTION_DAYS * 24 * 60 * 60)
+    return None
+
+
+def create_options(granularity=None):
+    """create_collection keyword arguments for a time-series realtime_data.
+    Time-series collections expire by collection option rather than TTL index."""
+    options = {"timeseries": timeseries_options(granularity)}
+    if retention_seconds() is not None:
+        options["expireAfterSeconds"] = retention_seconds()
+    return options
+
+
+def written_filter(docs):
+    """Filter for ``docs`` by _id. A time-series collection has no _id index; the timestamp
+    bounds let it skip unrelated buckets."""
+    stamps = [doc[TIME_FIELD] for doc in docs if isinstance(doc.get(TIME_FIELD), datetime)]
+    query = {"_id": {"$in": [doc["_id"] for doc in docs]}}
+    if len(stamps) == len(docs):
+        query[TIME_FIELD] = {"$gte": min(stamps), "$lte": max(stamps)}
+    return query
+
+
+def layout_of(info):
+    """Layout of a listCollections entry"""
+    return "timeseries" if info.get("type") == "timeseries" else "collection"
+
+
+def storage_plan(info, layout):
+    """Action that brings realtime_data (its listCollections entry, None if missing) to ``layout``.
+
+    Returns None, ("create",), ("retention", seconds) or ("mismatch", current layout).
+    A plain collection needs no creating, and switching layouts is left to the migration tool.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown realtime storage {layout!r}, expected one of {LAYOUTS}")
+    if info is None:
+        return ("create",) if layout == "timeseries" else None
+    current = layout_of(info)
+    if current != layout:
+        return ("mismatch", current)
+    if current == "timeseries" and info.get("options", {}).get("expireAfterSeconds") != retention_seconds():
+        return ("retention", retention_seconds())
+    return None
+
+
+def _retention_command(seconds):
+    return {"collMod": REALTIME, "expireAfterSeconds": "off" if seconds is None else seconds}
+
+
+def ensure_realtime_storage(db, layout=None):
+    """Create or adjust realtime_data for the configured layout. Returns the action taken, or None."""
+    info = next(db.list_collections(filter={"name": REALTIME}), None)
+    action = storage_plan(info, layout or settings.REALTIME_STORAGE)
+    if action == ("create",):
+        db.create_collection(REALTIME, **create_options())
+    elif action is not None and action[0] == "retention":
+        db.command(_retention_command(action[1]))
+    return action
+
+
+async def aensure_realtime_storage(db, layout=None):
+    cursor = await db.list_collections(filter={"name": REALTIME})
+    info = next(iter(await cursor.to_list()), None)
+    action = storage_plan(info, layout or settings.REALTIME_STORAGE)
+    if action == ("create",):
+        await db.create_collection(REALTIME, **create_options())
+    elif action is not None and action[0] == "retention":
+        await db.command(_retention_command(action[1]))
+    return action
+
+
+def timeseries_collections(db):
+    return {info["name"] for info in db.list_collections(filter={"type": "timeseries"})}
+
+
+async def atimeseries_collections(db):
+    cursor = await db.list_collections(filter={"type": "timeseries"})
+    return {info["name"] for info in await cursor.to_list()}
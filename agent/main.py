@@ -1,12 +1,46 @@
-from sockets.client import connect_to_server
-from config.db import init_db
+import time
 
-if __name__ == "__main__":
-    print("🚀 Starting app...")
+STARTED = time.monotonic()
+
+import asyncio
+from config import settings
+from sockets.ingest import mark_started
+from utils import metrics
+from utils.log import get_logger, setup_logging
+
+log = get_logger(__name__)
+
+async def main_async():
+    from sockets.async_client import connect_to_server
+    from config.async_db import init_db
 
     # Initialize DB
-    db = init_db()
-    print("📦 Connected to MongoDB:", db.name)
+    db = await init_db()
+    log.info("📦 Connected to MongoDB: %s", db.name)
 
     # Connect to Socket.IO server
-    connect_to_server()
+    await connect_to_server()
+
+if __name__ == "__main__":
+    setup_logging()
+    log.info("🚀 Starting app...")
+    mark_started(STARTED)
+    if settings.METRICS_PORT:
+        metrics.serve(settings.METRICS_PORT, settings.METRICS_HOST)
+        log.info("📊 Metrics on http://%s:%d/metrics", settings.METRICS_HOST, settings.METRICS_PORT)
+
+    if settings.AGENT_RUNTIME == "asyncio":
+        try:
+            asyncio.run(main_async())
+        except KeyboardInterrupt:
+            pass
+    else:
+        from sockets.client import connect_to_server
+        from config.db import init_db
+
+        # Initialize DB
+        db = init_db()
+        log.info("📦 Connected to MongoDB: %s", db.name)
+
+        # Connect to Socket.IO server
+        connect_to_server()
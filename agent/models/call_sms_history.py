@@ -1,6 +1,8 @@
 from pydantic import BaseModel, field_validator
 from datetime import datetime
+from config.settings import DEFAULT_PATIENT_ID
 
 class call_sms_history(BaseModel):
+    patient_id: str = DEFAULT_PATIENT_ID
     type: str
     timestamp: datetime
\ No newline at end of file
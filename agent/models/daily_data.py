@@ -1,5 +1,6 @@
 from pydantic import BaseModel, field_validator
 from datetime import datetime
+from config.settings import DEFAULT_PATIENT_ID
 from typing import Literal
 
 
@@ -23,6 +24,7 @@ class NutritionData(BaseModel):
 
 
 class daily_data(BaseModel):
+    patient_id: str = DEFAULT_PATIENT_ID
     sleep: SleepData
     nutrition: NutritionData
     water_intake: float
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, field_validator
 from datetime import datetime
+from config.settings import DEFAULT_PATIENT_ID
 
 class realtime_data(BaseModel):
+    patient_id: str = DEFAULT_PATIENT_ID
     heart_rate: int
     spo2: int
     stress_level: int
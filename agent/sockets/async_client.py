@@ -0,0 +1,177 @@
+import asyncio
+import socketio
+from collections import Counter, defaultdict
+from config.async_db import realtime_data_collection, daily_data_collection, realtime_rollups_collection
+from models.realtime_data import realtime_data
+from models.daily_data import daily_data
+from sockets.ingest import emergency_state, triage_reading, load_workflow, preload, first_connect
+from utils.vitals_window import vitals_windows, awarm_up
+from utils.spam_avoidance import cooldowns
+from utils.baselines import baselines
+from utils.sustained import sustained
+from utils.write_behind import AsyncWriteBehindBuffer
+from utils.rollups import RollupAggregator
+from utils.telemetry import events_received, validation_failures, workflows_inflight
+from utils.log import get_logger, log_payload
+from workflow.jobs import scheduler, register_jobs
+from config import settings
+from config.storage import REALTIME
+
+log = get_logger(__name__)
+
+sio = socketio.AsyncClient()
+
+write_buffers = {
+    collection.name: AsyncWriteBehindBuffer(
+        collection,
+        batch_size=settings.WRITE_BATCH_SIZE,
+        flush_interval=settings.WRITE_FLUSH_INTERVAL,
+        max_retries=settings.WRITE_MAX_RETRIES,
+        max_buffered=settings.WRITE_MAX_BUFFERED,
+        # Time-series realtime_data does not reject duplicate _ids
+        dedupe=collection.name == REALTIME and settings.REALTIME_STORAGE == "timeseries",
+    )
+    for collection in (realtime_data_collection, daily_data_collection)
+}
+
+rollups = RollupAggregator(
+    realtime_rollups_collection,
+    flush_interval=settings.ROLLUP_FLUSH_INTERVAL,
+    max_pending=settings.ROLLUP_MAX_PENDING,
+)
+
+# Bounds in-flight workflows; per-patient locks keep each patient's readings in order.
+# A lock is dropped once no run of that patient holds or waits for it.
+workflow_slots = asyncio.Semaphore(settings.ASYNC_MAX_INFLIGHT_WORKFLOWS)
+patient_locks = defaultdict(asyncio.Lock)
+patient_runs = Counter()
+inflight = set()
+
+async def save_to_db(collection, validated_data):
+    """Queue for a batched insert into MongoDB"""
+    await write_buffers[collection.name].add(validated_data.model_dump())
+
+async def run_workflow(name, state, key):
+    """Start a workflow run without blocking the event handler beyond the in-flight limit"""
+    await workflow_slots.acquire()
+    patient_runs[key] += 1
+
+    async def task():
+        try:
+            # Tasks start in creation order and the lock queues them FIFO, so the lock is taken
+            # before anything else awaits; first use then imports the graph off the event loop
+            async with patient_locks[key]:
+                workflow = await asyncio.to_thread(load_workflow, name)
+                workflows_inflight.inc()
+                try:
+                    await workflow.ainvoke(state)
+                finally:
+                    workflows_inflight.dec()
+        except Exception as e:
+            log.exception("❌ Workflow failed: %s", e, extra={"patient_id": key})
+        finally:
+            patient_runs[key] -= 1
+            if not patient_runs[key]:
+                del patient_runs[key]
+                patient_locks.pop(key, None)
+            workflow_slots.release()
+
+    t = asyncio.create_task(task())
+    inflight.add(t)
+    t.add_done_callback(inflight.discard)
+
+async def shutdown():
+    """Stop scheduling, finish in-flight workflows, then flush buffered readings"""
+    await asyncio.to_thread(scheduler.close)
+    if inflight:
+        await asyncio.gather(*inflight, return_exceptions=True)
+    for buffer in write_buffers.values():
+        await buffer.close()
+    await rollups.aclose()
+    await baselines.aclose()
+
+def register_handlers():
+
+    @sio.on("connect")
+    async def on_connect():
+        log.info("✅ Connected to server")
+        elapsed = first_connect()
+        if elapsed is not None:
+            log.info("⏱️ Time to first connect: %.2fs", elapsed)
+            preloading = asyncio.create_task(asyncio.to_thread(preload))
+            inflight.add(preloading)
+            preloading.add_done_callback(inflight.discard)
+
+
+    @sio.on("realtimeData")
+    async def on_realtime_data_handler(data):
+        log_payload(log, "realtimeData", data)
+        events_received.inc(event="realtimeData")
+        try:
+            validated = realtime_data(**data)
+        except Exception as e:
+            log.warning("❌ Validation failed for realtime data: %s", e, extra={"stream": "realtimeData", "payload": data})
+            validation_failures.inc(event="realtimeData")
+            return
+
+        await save_to_db(realtime_data_collection, validated)
+        vitals_windows.append_reading(validated)
+        rollups.add(validated)
+        if not baselines.known(validated.patient_id):
+            await baselines.areload(validated.patient_id)
+        baselines.update(validated.patient_id, validated)
+        sustained.update(validated.patient_id, validated)
+
+        state = emergency_state(data, validated.patient_id)
+        if triage_reading(state):
+            await run_workflow("async_emergency_workflow", state, key=validated.patient_id)
+
+
+    @sio.on("dailyData")
+    async def on_daily_data_handler(data):
+        log_payload(log, "dailyData", data)
+        events_received.inc(event="dailyData")
+        try:
+            validated = daily_data(**data)
+            await save_to_db(daily_data_collection, validated)
+        except Exception as e:
+            log.warning("❌ Validation failed for daily data: %s", e, extra={"stream": "dailyData", "payload": data})
+            validation_failures.inc(event="dailyData")
+
+
+    @sio.on("overrideSet")
+    async def on_override(data):
+        log.info("🚨 Override triggered", extra={"stream": "overrideSet", "payload": data})
+
+
+    @sio.on("overrideCleared")
+    async def on_reset():
+        log.info("✅ Override cleared", extra={"stream": "overrideCleared"})
+
+
+    @sio.on("disconnect")
+    async def on_disconnect():
+        log.warning("❌ Disconnected from server")
+
+
+async def connect_to_server(url="http://localhost:3000"):
+    register_handlers()
+    for buffer in write_buffers.values():
+        buffer.start()
+    rollups.astart()
+    loaded = await awarm_up(realtime_data_collection)
+    log.info("🪟 Vitals window warmed up with %d readings", loaded)
+    await cooldowns.aload()
+    log.info("📈 Personal baselines restored for %d patients", await baselines.aload())
+    baselines.astart()
+    # Scheduled sweeps run here with the async workflows; the scheduler's threads keep the leases
+    register_jobs(loop=asyncio.get_running_loop())
+    scheduler.start()
+    await sio.connect(url)
+    try:
+        await sio.wait()
+    except asyncio.CancelledError:
+        log.info("Shutting down gracefully...")
+        await sio.disconnect()
+    finally:
+        await shutdown()
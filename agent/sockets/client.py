@@ -1,82 +1,164 @@
 import socketio
+import atexit
 import threading
-from config.db import realtime_data_collection, daily_data_collection
+from config.db import realtime_data_collection, daily_data_collection, realtime_rollups_collection
 from models.realtime_data import realtime_data
 from models.daily_data import daily_data
-from workflow.emergency_monitoring import emergency_workflow
-from workflow.periodic_wellness_check import periodic_workflow
+from sockets.ingest import emergency_state, triage_reading, load_workflow, preload, first_connect
+from utils.vitals_window import vitals_windows, warm_up
+from utils.spam_avoidance import cooldowns
+from utils.baselines import baselines
+from utils.sustained import sustained
+from utils.vitals_checks import SEVERITY
+from utils.worker_pool import BoundedExecutor
+from utils.write_behind import WriteBehindBuffer
+from utils.rollups import RollupAggregator
+from utils.telemetry import events_received, validation_failures, workflows_inflight
+from utils.log import get_logger, log_payload
+from workflow.jobs import scheduler, register_jobs
+from config import settings
+from config.storage import REALTIME
+
+log = get_logger(__name__)
 
 sio = socketio.Client()
 
+workflow_pool = BoundedExecutor(
+    "workflow",
+    workers=settings.WORKFLOW_WORKERS,
+    max_queue=settings.WORKFLOW_QUEUE_SIZE,
+    policy=settings.WORKFLOW_OVERFLOW_POLICY,
+)
+
+write_buffers = {
+    collection.name: WriteBehindBuffer(
+        collection,
+        batch_size=settings.WRITE_BATCH_SIZE,
+        flush_interval=settings.WRITE_FLUSH_INTERVAL,
+        max_retries=settings.WRITE_MAX_RETRIES,
+        max_buffered=settings.WRITE_MAX_BUFFERED,
+        # Time-series realtime_data does not reject duplicate _ids
+        dedupe=collection.name == REALTIME and settings.REALTIME_STORAGE == "timeseries",
+    )
+    for collection in (realtime_data_collection, daily_data_collection)
+}
+
+rollups = RollupAggregator(
+    realtime_rollups_collection,
+    flush_interval=settings.ROLLUP_FLUSH_INTERVAL,
+    max_pending=settings.ROLLUP_MAX_PENDING,
+)
+
 def save_to_db(collection, validated_data):
-    """Insert into MongoDB in a separate thread"""
-    def task():
-        try:
-            collection.insert_one(validated_data.model_dump())
-        except Exception as e:
-            print(f"❌ DB insert failed: {e}")
-    threading.Thread(target=task, daemon=True).start()
+    """Queue for a batched insert into MongoDB"""
+    write_buffers[collection.name].add(validated_data.model_dump())
+
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+def shutdown():
+    """Stop scheduling, finish queued workflows, then flush buffered readings.
+    Runs once, from connect_to_server or at exit if that never got there."""
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+    scheduler.close()
+    workflow_pool.shutdown()
+    for buffer in write_buffers.values():
+        buffer.close()
+    rollups.close()
+    baselines.close()
+
+atexit.register(shutdown)
+
+def run_emergency_workflow(state):
+    workflows_inflight.inc()
+    try:
+        load_workflow("emergency_workflow").invoke(state)
+    finally:
+        workflows_inflight.dec()
 
 def register_handlers():
 
     @sio.on("connect")
     def on_connect():
-        print("✅ Connected to server")
+        log.info("✅ Connected to server")
+        elapsed = first_connect()
+        if elapsed is not None:
+            log.info("⏱️ Time to first connect: %.2fs", elapsed)
+            threading.Thread(target=preload, name="workflow-preload", daemon=True).start()
 
 
     @sio.on("realtimeData")
     def on_realtime_data_handler(data):
-        print("📡 Received Realtime Data:", data)
+        log_payload(log, "realtimeData", data)
+        events_received.inc(event="realtimeData")
         try:
             validated = realtime_data(**data)
-            save_to_db(realtime_data_collection, validated)
         except Exception as e:
-            print(f"❌ Validation failed for realtime data: {e}")
-        
+            log.warning("❌ Validation failed for realtime data: %s", e, extra={"stream": "realtimeData", "payload": data})
+            validation_failures.inc(event="realtimeData")
+            return
 
-        excluded_keys = {"steps", "calories_burned"} 
-        filtered_data = {k: v for k, v in data.items() if k not in excluded_keys}
+        save_to_db(realtime_data_collection, validated)
+        vitals_windows.append_reading(validated)
+        rollups.add(validated)
+        if not baselines.known(validated.patient_id):
+            baselines.reload(validated.patient_id)
+        baselines.update(validated.patient_id, validated)
+        sustained.update(validated.patient_id, validated)
 
-        initial_state = {
-            "data": filtered_data,
-            "alert_sent": False,
-        }
-        def task():
-            emergency_workflow.invoke(initial_state)
-        threading.Thread(target=task, daemon=True).start()
+        state = emergency_state(data, validated.patient_id)
+        decision = triage_reading(state)
+        if decision:
+            workflow_pool.submit(run_emergency_workflow, state, key=validated.patient_id, priority=SEVERITY[decision])
 
 
 
     @sio.on("dailyData")
     def on_daily_data_handler(data):
-        print("📡 Received Daily Data:", data)
+        log_payload(log, "dailyData", data)
+        events_received.inc(event="dailyData")
         try:
             validated = daily_data(**data)
             save_to_db(daily_data_collection, validated)
         except Exception as e:
-            print(f"❌ Validation failed for daily data: {e}")
+            log.warning("❌ Validation failed for daily data: %s", e, extra={"stream": "dailyData", "payload": data})
+            validation_failures.inc(event="dailyData")
 
 
     @sio.on("overrideSet")
     def on_override(data):
-        print("🚨 Override triggered:", data)
+        log.info("🚨 Override triggered", extra={"stream": "overrideSet", "payload": data})
 
 
     @sio.on("overrideCleared")
     def on_reset():
-        print("✅ Override cleared")
+        log.info("✅ Override cleared", extra={"stream": "overrideCleared"})
 
 
     @sio.on("disconnect")
     def on_disconnect():
-        print("❌ Disconnected from server")
+        log.warning("❌ Disconnected from server")
         
 
 def connect_to_server(url="http://localhost:3000"):
     register_handlers()
+    rollups.start()
+    loaded = warm_up(realtime_data_collection)
+    log.info("🪟 Vitals window warmed up with %d readings", loaded)
+    cooldowns.load()
+    log.info("📈 Personal baselines restored for %d patients", baselines.load())
+    baselines.start()
+    register_jobs()
+    scheduler.start()
     sio.connect(url)
     try:
         sio.wait()
     except KeyboardInterrupt:
-        print("Shutting down gracefully...")
+        log.info("Shutting down gracefully...")
         sio.disconnect()
+    finally:
+        shutdown()
@@ -0,0 +1,100 @@
+# Event handling shared by the threaded and asyncio socket clients
+import importlib
+import time
+from utils.vitals_checks import classify_vitals, sustained_status, triage
+from utils.spam_avoidance import cooldowns
+from utils.baselines import baselines
+from utils.sustained import sustained, gated_readings
+from utils.metrics import counter, gauge
+from utils.telemetry import record_decision
+
+fast_path_readings = counter("agent_fast_path_readings_total", "Realtime readings by whether they entered the emergency graph")
+first_connect_seconds = gauge("agent_time_to_first_connect_seconds", "Seconds from process start to the first Socket.IO connect")
+
+_started = time.monotonic()
+_connected = False
+
+
+def mark_started(started):
+    """Measure time-to-first-connect from ``started`` (time.monotonic() at process start)"""
+    global _started
+    _started = started
+
+
+def first_connect():
+    """Seconds since start on the first connect, None on reconnects"""
+    global _connected
+    if _connected:
+        return None
+    _connected = True
+    elapsed = time.monotonic() - _started
+    first_connect_seconds.set(elapsed)
+    return elapsed
+
+
+def load_workflow(name):
+    """Compiled workflow from workflow.emergency_monitoring, imported on first use.
+
+    langgraph/langchain and the model client stay off the connect path;
+    preload() pulls them in once the socket is up.
+    """
+    return getattr(importlib.import_module("workflow.emergency_monitoring"), name)
+
+
+def preload():
+    """Import the emergency workflow and create the model client ahead of the first alert"""
+    load_workflow("emergency_workflow")
+    from workflow import llm
+    llm.get_model()
+
+
+def emergency_state(data, patient_id):
+    """Initial emergency workflow state for one realtime reading.
+
+    ``confirmed`` holds the alert levels the sustained-condition rules confirm as of
+    this reading. The graph triages with it rather than with the live windows, which
+    later readings may have moved by the time a worker runs it.
+    """
+    excluded_keys = {"steps", "calories_burned"} 
+    filtered_data = {k: v for k, v in data.items() if k not in excluded_keys}
+
+    return {
+        "patient_id": patient_id,
+        "data": filtered_data,
+        "confirmed": sustained.confirmed(patient_id),
+        "alert_sent": False,
+    }
+
+
+def needs_workflow(data, patient_id, confirmed=None):
+    """Fast path: the triage decision if hardcoded_checks would route this reading somewhere
+    other than END, else None.
+
+    Uses the same triage rules, the patient's in-memory cooldowns, baseline deviations and
+    sustained-condition windows, so normal readings never pay for a graph invocation.
+    ``confirmed`` defaults to what the windows confirm right now.
+    """
+    if confirmed is None:
+        confirmed = sustained.confirmed(patient_id)
+    decision = triage(data, cooldowns.for_patient(patient_id), baselines.deviating(patient_id), confirmed)
+    escalate = decision != "normal"
+    fast_path_readings.inc(route="workflow" if escalate else "skipped")
+    status = classify_vitals(data)
+    confirmed_status = sustained_status(status, confirmed)
+    if confirmed_status != status:
+        gated_readings.inc(status=status)
+    if not escalate:
+        # Escalated readings get their decision recorded by the graph's hardcoded_checks
+        record_decision(data, confirmed_status, decision, path="fast")
+        return None
+    return decision
+
+
+def triage_reading(state):
+    """needs_workflow for an emergency_state. On escalation the state also gets the decision
+    and the evidence of the sustained rules behind it, taken together with ``confirmed``."""
+    decision = needs_workflow(state["data"], state["patient_id"], state["confirmed"])
+    if decision:
+        state["decision"] = decision
+        state["evidence"] = sustained.evidence(state["patient_id"], decision)
+    return decision
@@ -0,0 +1,113 @@
+# Cold archive (utils/archive.py): what gets pruned from MongoDB, what reads it
+# back, and when the archive job may be scheduled.
+from datetime import datetime, timedelta
+from bson import ObjectId
+from config import settings
+from utils import archive
+
+DAY = datetime(2026, 1, 5)
+
+
+def reading(patient_id, timestamp, heart_rate=80):
+    return {"_id": ObjectId(), "patient_id": patient_id, "timestamp": timestamp, "heart_rate": heart_rate,
+            "spo2": 97, "stress_level": 10, "steps": 5, "calories_burned": 1}
+
+
+class Result:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class Cursor(list):
+    def sort(self, field, direction):
+        return Cursor(sorted(self, key=lambda doc: doc[field], reverse=direction < 0))
+
+
+class Collection:
+    """The find/aggregate/delete_many subset archive_collection uses. ``late`` is inserted
+    when the prune pass starts, as a reading arriving after its day was exported."""
+
+    def __init__(self, docs, late=()):
+        self.docs = list(docs)
+        self.late = list(late)
+        self.passes = 0
+
+    @staticmethod
+    def matches(doc, query):
+        for field, condition in query.items():
+            value = doc.get(field)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand or op == "$in" and value not in operand:
+                    return False
+                if op == "$gte" and not value >= operand or op == "$lt" and not value < operand:
+                    return False
+        return True
+
+    def aggregate(self, pipeline):
+        self.passes += 1
+        if self.passes == 2:
+            self.docs += self.late
+        before = pipeline[0]["$match"]["timestamp"]["$lt"]
+        days = {(doc["patient_id"], doc["timestamp"].date().isoformat()) for doc in self.docs if doc["timestamp"] < before}
+        return [{"_id": {"patient_id": p, "day": d}} for p, d in sorted(days, key=lambda key: key[1])]
+
+    def find(self, query, projection=None):
+        return Cursor(doc for doc in self.docs if self.matches(doc, query))
+
+    def delete_many(self, query):
+        kept = [doc for doc in self.docs if not self.matches(doc, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return Result(deleted)
+
+
+def test_prunes_only_documents_on_disk(tmp_path):
+    docs = [reading("p1", DAY + timedelta(minutes=i)) for i in range(5)] + [reading("p1", DAY + timedelta(days=2))]
+    late = reading("p1", DAY + timedelta(hours=23))
+    collection = Collection(docs, late=[late])
+
+    archived, pruned = archive.archive_collection("realtime_data", collection, DAY + timedelta(days=1), root=str(tmp_path))
+
+    assert (archived, pruned) == (5, 5)
+    # The late reading and the open day stay in MongoDB
+    assert {doc["_id"] for doc in collection.docs} == {late["_id"], docs[-1]["_id"]}
+    assert archive.archived_before("realtime_data", str(tmp_path)) == DAY + timedelta(days=1)
+
+
+def test_realtime_groups_read_back(tmp_path):
+    root = str(tmp_path)
+    docs = [reading("p1", DAY + timedelta(hours=i), heart_rate=70 + i) for i in range(4)]
+    archive.archive_collection("realtime_data", Collection(docs), DAY + timedelta(days=1), root=root)
+
+    groups = archive.realtime_groups("p1", DAY - timedelta(days=1), root=root)
+    assert groups["overall"][0]["record_count"] == 4
+    assert groups["overall"][0]["sum_hr"] == 70 + 71 + 72 + 73
+    # `until` cuts the archived range short
+    assert archive.realtime_groups("p1", DAY - timedelta(days=1), root=root, until=DAY + timedelta(hours=2))["overall"][0]["record_count"] == 2
+    assert archive.realtime_groups("p2", DAY - timedelta(days=1), root=root) is None
+
+
+def test_nothing_archived_without_archive_dir(monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", "")
+    assert archive.archived_before("realtime_data") is None
+    assert archive.realtime_groups("p1", DAY) is None
+    assert archive.hot_since("realtime_data", DAY) == DAY
+
+
+def test_archive_job_needs_absolute_archive_dir(monkeypatch, tmp_path):
+    from workflow import jobs
+
+    class Scheduler:
+        def __init__(self):
+            self.names = []
+
+        def add(self, name, *args, **kwargs):
+            self.names.append(name)
+
+    monkeypatch.setattr(jobs, "JOBS", (("archive", "15 2 * * *", jobs.run_archive, None, 60),))
+    for archive_dir, scheduled in (("", []), ("archive", []), (str(tmp_path), ["archive"])):
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", archive_dir)
+        monkeypatch.setattr(jobs, "scheduler", Scheduler())
+        jobs.register_jobs()
+        assert jobs.scheduler.names == scheduled, archive_dir
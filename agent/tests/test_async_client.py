@@ -0,0 +1,26 @@
+# asyncio runtime (sockets/async_client.py): per-patient workflow locks are
+# dropped once a patient's runs are done.
+import asyncio
+from sockets import async_client
+
+
+def test_patient_locks_dropped_after_runs(monkeypatch):
+    order = []
+
+    class Workflow:
+        async def ainvoke(self, state):
+            await asyncio.sleep(0)
+            order.append(state["n"])
+
+    monkeypatch.setattr(async_client, "load_workflow", lambda name: Workflow())
+
+    async def main():
+        for n in range(3):
+            await async_client.run_workflow("async_emergency_workflow", {"n": n}, key="p")
+        assert async_client.patient_runs["p"] == 3
+        await asyncio.gather(*async_client.inflight)
+
+    asyncio.run(main())
+    assert order == [0, 1, 2]
+    assert "p" not in async_client.patient_locks
+    assert "p" not in async_client.patient_runs
@@ -0,0 +1,110 @@
+# Personal baselines (utils/baselines.py) and the baseline_deviation decision
+import random
+import statistics
+import time
+import pytest
+from utils.baselines import BaselineEngine, VitalBaseline
+from utils.vitals_checks import triage
+
+
+def steady(rng, heart_rate=70):
+    return {"heart_rate": rng.gauss(heart_rate, 4), "spo2": rng.gauss(97, 1), "stress_level": rng.gauss(20, 6)}
+
+
+def learned_engine(**options):
+    engine = BaselineEngine(min_samples=100, threshold=3.0, **options)
+    rng = random.Random(3)
+    for _ in range(500):
+        engine.update("p", steady(rng))
+    return engine, rng
+
+
+def test_welford_matches_population_statistics():
+    values = [random.Random(1).uniform(50, 120) for _ in range(200)]
+    baseline = VitalBaseline()
+    for value in values:
+        baseline.update(value, alpha=0.1, max_count=10000)
+    assert baseline.mean == pytest.approx(statistics.fmean(values))
+    assert baseline.var == pytest.approx(statistics.pvariance(values))
+
+
+def test_no_deviation_while_learning():
+    engine = BaselineEngine(min_samples=100)
+    for _ in range(99):
+        engine.update("p", {"heart_rate": 70, "spo2": 97, "stress_level": 20})
+    engine.update("p", {"heart_rate": 100, "spo2": 97, "stress_level": 20})
+    assert engine.deviating("p") == ()
+
+
+def test_sustained_rise_deviates_without_widening_the_baseline():
+    engine, rng = learned_engine()
+    assert engine.deviating("p") == ()
+    std_before = engine._patients["p"]["heart_rate"].std()
+
+    for _ in range(30):
+        engine.update("p", {**steady(rng), "heart_rate": 98})
+    assert "heart_rate" in engine.deviating("p")
+    assert engine._patients["p"]["heart_rate"].std() == pytest.approx(std_before)
+
+
+def test_only_concerning_direction_deviates():
+    engine, rng = learned_engine()
+    # Higher SpO2 and lower stress are not a concern
+    for _ in range(30):
+        engine.update("p", {**steady(rng), "spo2": 100, "stress_level": 0})
+    assert engine.deviating("p") == ()
+
+
+def test_snapshot_restores_the_same_signal():
+    engine, rng = learned_engine()
+    for _ in range(30):
+        engine.update("p", {**steady(rng), "heart_rate": 98})
+
+    restored = BaselineEngine(min_samples=100, threshold=3.0)
+    restored.restore(engine.snapshot("p"))
+    assert restored.deviating("p") == engine.deviating("p")
+    assert restored.deviation("p") == engine.deviation("p")
+
+
+def test_triage_baseline_deviation():
+    normal = {"heart_rate": 95, "spo2": 97, "stress_level": 20}
+    assert triage(normal, lambda type: True, ("heart_rate",)) == "baseline_deviation"
+    assert triage(normal, lambda type: type != "baseline_sms", ("heart_rate",)) == "normal"
+    assert triage(normal, lambda type: True, ()) == "normal"
+    # Threshold alerts take precedence over the personal baseline
+    assert triage({**normal, "heart_rate": 130}, lambda type: True, ("heart_rate",)) == "high_alert"
+
+
+def test_idle_patient_dropped_once_saved_and_reloaded():
+    from utils.idle import IdleTracker
+
+    class Snapshots:
+        def __init__(self):
+            self.docs = {}
+
+        def bulk_write(self, ops, ordered):
+            for op in ops:
+                self.docs[op._filter["_id"]] = op._doc
+
+        def find_one(self, query):
+            return self.docs.get(query["_id"])
+
+    engine, rng = learned_engine()
+    engine._idle = IdleTracker(0.05, interval=0)
+    engine.update("p", steady(rng))
+    before = engine.deviation("p")
+
+    # Not until its latest readings are in a snapshot
+    time.sleep(0.1)
+    engine.update("other", steady(rng))
+    assert engine.known("p")
+
+    snapshots = Snapshots()
+    engine.save(snapshots)
+    time.sleep(0.1)
+    engine.update("other", steady(rng))
+    assert not engine.known("p")
+    assert engine.deviating("p") == ()
+
+    engine.reload("p", snapshots)
+    assert engine.deviation("p") == before
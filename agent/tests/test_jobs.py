@@ -0,0 +1,58 @@
+# Scheduled jobs (workflow/jobs.py): the asyncio runtime's sweeps run on its
+# event loop while the scheduler's worker thread waits for them.
+import asyncio
+import threading
+from workflow import jobs
+from utils.scheduler import afan_out
+
+
+class Scheduler:
+    def __init__(self):
+        self.runs = {}
+
+    def add(self, name, trigger, run, **kwargs):
+        self.runs[name] = run
+
+
+def test_async_jobs_run_on_the_loop(monkeypatch):
+    ran = []
+
+    async def arun(scheduled):
+        ran.append((scheduled, threading.current_thread()))
+        return "done"
+
+    monkeypatch.setattr(jobs, "JOBS", (
+        ("sweep", "every 60s", lambda scheduled: "sync", arun, 60),
+        ("archive", "off", jobs.run_archive, None, 60),
+    ))
+
+    async def main():
+        monkeypatch.setattr(jobs, "scheduler", Scheduler())
+        jobs.register_jobs(loop=asyncio.get_running_loop())
+        # As the scheduler's worker thread would call it
+        return await asyncio.to_thread(jobs.scheduler.runs["sweep"], "slot")
+
+    assert asyncio.run(main()) == "done"
+    assert ran == [("slot", threading.main_thread())]
+
+    monkeypatch.setattr(jobs, "scheduler", Scheduler())
+    jobs.register_jobs()
+    assert jobs.scheduler.runs["sweep"]("slot") == "sync"
+
+
+def test_afan_out_collects_errors_and_bounds_concurrency():
+    running = []
+    peak = []
+
+    async def run(patient_id):
+        running.append(patient_id)
+        peak.append(len(running))
+        await asyncio.sleep(0)
+        running.remove(patient_id)
+        if patient_id == "p2":
+            raise ValueError(patient_id)
+
+    errors = asyncio.run(afan_out(run, ["p1", "p2", "p3", "p4"], limit=2))
+    assert max(peak) == 2
+    assert [patient_id for patient_id, error in errors.items() if error is not None] == ["p2"]
+    assert isinstance(errors["p2"], ValueError)
@@ -0,0 +1,92 @@
+# Rollup flushes (utils/rollups.py): a flush retried after an unknown outcome
+# does not count its readings twice.
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from pymongo.errors import AutoReconnect
+from utils.rollups import RollupAggregator, summarize_rollups
+
+START = datetime(2026, 1, 5, 12, 0)
+
+
+def evaluate(expr, doc):
+    """The aggregation expressions the rollup upserts use"""
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc.get(expr[1:])
+    if isinstance(expr, list):
+        return [evaluate(e, doc) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    (op, args), = expr.items()
+    args = evaluate(args, doc)
+    if op == "$cond":
+        return args[1] if args[0] else args[2]
+    if op == "$in":
+        return args[0] in args[1]
+    if op == "$ifNull":
+        return args[1] if args[0] is None else args[0]
+    if op == "$add":
+        return sum(args)
+    if op == "$min":
+        return min(a for a in args if a is not None)
+    if op == "$max":
+        return max(a for a in args if a is not None)
+    if op == "$concatArrays":
+        return sum(args, [])
+    if op == "$slice":
+        return args[0][args[1]:]
+    raise NotImplementedError(op)
+
+
+class Rollups:
+    """Applies the upserts, then fails the call if ``lose_reply`` is set, as a dropped connection would"""
+
+    def __init__(self):
+        self.rows = {}
+        self.lose_reply = False
+
+    def bulk_write(self, ops, ordered):
+        for op in ops:
+            key = tuple(op._filter.values())
+            row = self.rows.setdefault(key, dict(op._filter))
+            for stage in op._doc:
+                row.update({field: evaluate(expr, row) for field, expr in stage["$set"].items()})
+        if self.lose_reply:
+            self.lose_reply = False
+            raise AutoReconnect("connection closed")
+
+    def find(self, granularity):
+        return [row for row in self.rows.values() if row["granularity"] == granularity]
+
+
+def reading(second, heart_rate):
+    return SimpleNamespace(patient_id="p", timestamp=START + timedelta(seconds=second), heart_rate=heart_rate,
+                           spo2=97, stress_level=10, steps=100 + second, calories_burned=second)
+
+
+def test_flush_retried_after_lost_reply_counts_once():
+    collection = Rollups()
+    rollups = RollupAggregator(collection)
+    rollups.add(reading(0, 70))
+    rollups.add(reading(10, 80))
+    rollups.flush()
+
+    rollups.add(reading(20, 90))
+    collection.lose_reply = True
+    rollups.flush()
+    # The lost flush is resent with the next one
+    rollups.add(reading(30, 100))
+    rollups.flush()
+    rollups.flush()
+
+    for granularity in ("minute", "hour", "day", "week"):
+        rows = collection.find(granularity)
+        assert len(rows) == 1
+        assert rows[0]["count"] == 4
+        assert rows[0]["sum_heart_rate"] == 70 + 80 + 90 + 100
+        assert rows[0]["sum_calories_burned"] == 0 + 10 + 20 + 30
+        assert (rows[0]["start"], rows[0]["end"]) == (START, START + timedelta(seconds=30))
+
+        stats = summarize_rollups(rows)
+        assert stats["mean"]["heart_rate"] == 85
+        assert stats["max"]["heart_rate"] == 100
+        assert stats["delta"]["steps"] == 30
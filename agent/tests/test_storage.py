@@ -0,0 +1,26 @@
+# realtime_data layout decisions (config/storage.py)
+from datetime import datetime
+import pytest
+from config import settings
+from config.storage import storage_plan, written_filter
+
+
+def test_storage_plan(monkeypatch):
+    monkeypatch.setattr(settings, "REALTIME_RETENTION_DAYS", 0)
+    timeseries = {"name": "realtime_data", "type": "timeseries", "options": {"timeseries": {"timeField": "timestamp"}}}
+    assert storage_plan(None, "timeseries") == ("create",)
+    assert storage_plan(None, "collection") is None
+    assert storage_plan({"name": "realtime_data", "type": "collection"}, "timeseries") == ("mismatch", "collection")
+    assert storage_plan(timeseries, "collection") == ("mismatch", "timeseries")
+    assert storage_plan(timeseries, "timeseries") is None
+
+    monkeypatch.setattr(settings, "REALTIME_RETENTION_DAYS", 30)
+    assert storage_plan(timeseries, "timeseries") == ("retention", 30 * 24 * 60 * 60)
+    with pytest.raises(ValueError):
+        storage_plan(None, "capped")
+
+
+def test_written_filter_bounds_timestamps():
+    docs = [{"_id": 1, "timestamp": datetime(2026, 1, 2)}, {"_id": 2, "timestamp": datetime(2026, 1, 1)}]
+    assert written_filter(docs) == {"_id": {"$in": [1, 2]}, "timestamp": {"$gte": datetime(2026, 1, 1), "$lte": datetime(2026, 1, 2)}}
+    assert written_filter([{"_id": 3}]) == {"_id": {"$in": [3]}}
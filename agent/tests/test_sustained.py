@@ -0,0 +1,78 @@
+# Sustained-condition rules (utils/sustained.py): windows restart after a gap in
+# the readings, and the graph triages with the confirmation captured at ingest.
+import time
+from datetime import datetime, timedelta
+from utils.sustained import SustainedRules, parse_rules
+
+START = datetime(2026, 1, 1, 12, 0)
+
+
+def feed(rules, patient_id, seconds, **vitals):
+    for second in seconds:
+        rules.update(patient_id, {"timestamp": START + timedelta(seconds=second), **vitals})
+
+
+def test_time_rule_not_confirmed_across_gap():
+    rules = SustainedRules(parse_rules("high_alert: heart_rate > 110 for 30s"), max_gap=15)
+    feed(rules, "p", range(0, 15, 5), heart_rate=130)
+    # 45s from the first reading, but nothing between 10s and 40s
+    feed(rules, "p", (40, 45), heart_rate=130)
+    assert "high_alert" not in rules.confirmed("p")
+
+    feed(rules, "p", range(50, 75, 5), heart_rate=130)
+    assert "high_alert" in rules.confirmed("p")
+    assert rules.evidence("p", "high_alert")[0]["span_seconds"] == 30
+
+
+def test_time_rule_without_max_gap_spans_gap():
+    rules = SustainedRules(parse_rules("high_alert: heart_rate > 110 for 30s"))
+    feed(rules, "p", (0, 5, 10, 40), heart_rate=130)
+    assert "high_alert" in rules.confirmed("p")
+
+
+def test_count_rule_restarts_after_gap():
+    rules = SustainedRules(parse_rules("high_alert: spo2 < 93 in 4/6"), max_gap=15)
+    feed(rules, "p", (0, 5, 10), spo2=88)
+    feed(rules, "p", (60,), spo2=88)
+    assert "high_alert" not in rules.confirmed("p")
+    feed(rules, "p", (65, 70, 75), spo2=88)
+    assert "high_alert" in rules.confirmed("p")
+
+
+def test_graph_uses_confirmation_from_triage(monkeypatch):
+    from sockets.ingest import emergency_state, triage_reading
+    from utils.spam_avoidance import cooldowns
+    from utils.sustained import sustained
+    from workflow.emergency_monitoring import hardcoded_checks
+
+    monkeypatch.setattr(cooldowns, "loaded", True)
+    patient_id = "sustained-capture"
+    data = {"heart_rate": 130, "spo2": 97, "stress_level": 10}
+    feed(sustained, patient_id, range(0, 40, 5), **data)
+
+    state = emergency_state(data, patient_id)
+    assert triage_reading(state) == "high_alert"
+    evidence = state["evidence"]
+    assert evidence
+
+    # A later reading after a gap restarts the windows before a worker runs the graph
+    feed(sustained, patient_id, (300,), **data)
+    assert "high_alert" not in sustained.confirmed(patient_id)
+
+    result = hardcoded_checks(state)
+    assert result["decision"] == "high_alert"
+    assert result["evidence"] == evidence
+
+
+def test_idle_patients_are_dropped():
+    from utils.idle import IdleTracker
+
+    rules = SustainedRules(parse_rules("high_alert: heart_rate > 110 for 30s"))
+    rules._idle = IdleTracker(0.05, interval=0)
+    feed(rules, "quiet", range(0, 40, 5), heart_rate=130)
+    assert "high_alert" in rules.confirmed("quiet")
+
+    time.sleep(0.1)
+    feed(rules, "busy", (0,), heart_rate=70)
+    assert list(rules._windows) == ["busy"]
+    assert rules.confirmed("quiet") == rules.ungated
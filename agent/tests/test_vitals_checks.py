@@ -0,0 +1,102 @@
+# The fast path (sockets/ingest.py) and the graph's hardcoded_checks both decide
+# through utils/vitals_checks.triage. These tests pin triage to the rules
+# hardcoded_checks applied before they were moved out of the graph, across
+# every threshold boundary and cooldown combination.
+import itertools
+import pytest
+from utils.vitals_checks import classify_vitals, triage
+
+HEART_RATES = (0, 49, 50, 59, 60, 100, 101, 110, 111, 220)
+SPO2S = (70, 92, 93, 94, 95, 100, 101)
+STRESS_LEVELS = (0, 40, 41, 60, 61, 100)
+ACTION_TYPES = ("emergency_call", "emergency_sms", "therapist_call")
+COOLDOWNS = [dict(zip(ACTION_TYPES, flags)) for flags in itertools.product((True, False), repeat=len(ACTION_TYPES))]
+
+
+def baseline_hardcoded_checks(data, cooled_off):
+    """hardcoded_checks from workflow/emergency_monitoring.py before the fast path, verbatim"""
+    heart_rate, spo2, stress = data.get("heart_rate"), data.get("spo2"), data.get("stress_level")
+
+    status_list = []
+
+    # check heart rate
+    if 60 <= heart_rate <= 100:
+        status_list.append("Normal")
+    elif 50 <= heart_rate <= 59 or 101 <= heart_rate <= 110:
+        status_list.append("Low Alert")
+    else:
+        status_list.append("High Alert")
+
+    # check SpO2
+    if 95 <= spo2 <= 100:
+        status_list.append("Normal")
+    elif 93 <= spo2 <= 94:
+        status_list.append("Low Alert")
+    else:
+        status_list.append("High Alert")
+
+    # check stress level
+    if 0 <= stress <= 40:
+        status_list.append("Normal")
+    elif 41 <= stress <= 60:
+        status_list.append("Low Alert")
+
+
+    # determine final status
+    if "High Alert" in status_list:
+        final_status = "high_alert"
+    elif "Low Alert" in status_list:
+        final_status = "small_alert"
+    else:
+        final_status = "normal"
+
+    if(
+        (final_status == "high_alert" and not(cooled_off("emergency_call")))
+        or
+        (final_status == "small_alert" and not(cooled_off("emergency_sms")))
+    ):
+        final_status = "normal"
+
+    if(final_status == "normal" and stress > 60 and cooled_off("therapist_call")):
+        final_status = "high_stress"
+
+    return final_status
+
+
+def readings():
+    for heart_rate, spo2, stress in itertools.product(HEART_RATES, SPO2S, STRESS_LEVELS):
+        yield {"heart_rate": heart_rate, "spo2": spo2, "stress_level": stress}
+
+
+@pytest.mark.parametrize("cooldown", COOLDOWNS, ids=lambda c: ",".join(t for t, ok in c.items() if not ok) or "none_active")
+def test_triage_matches_baseline_hardcoded_checks(cooldown):
+    cooled_off = cooldown.__getitem__
+    for data in readings():
+        assert triage(data, cooled_off) == baseline_hardcoded_checks(data, cooled_off), data
+
+
+def test_classify_vitals_boundaries():
+    assert classify_vitals({"heart_rate": 60, "spo2": 95, "stress_level": 40}) == "normal"
+    assert classify_vitals({"heart_rate": 100, "spo2": 100, "stress_level": 0}) == "normal"
+    assert classify_vitals({"heart_rate": 59, "spo2": 95, "stress_level": 40}) == "small_alert"
+    assert classify_vitals({"heart_rate": 101, "spo2": 95, "stress_level": 40}) == "small_alert"
+    assert classify_vitals({"heart_rate": 80, "spo2": 94, "stress_level": 40}) == "small_alert"
+    assert classify_vitals({"heart_rate": 80, "spo2": 97, "stress_level": 41}) == "small_alert"
+    assert classify_vitals({"heart_rate": 49, "spo2": 97, "stress_level": 10}) == "high_alert"
+    assert classify_vitals({"heart_rate": 111, "spo2": 97, "stress_level": 10}) == "high_alert"
+    assert classify_vitals({"heart_rate": 80, "spo2": 92, "stress_level": 10}) == "high_alert"
+    # Stress above 60 is not a threshold alert; triage routes it to the therapist
+    assert classify_vitals({"heart_rate": 80, "spo2": 97, "stress_level": 61}) == "normal"
+
+
+def test_fast_path_matches_graph(monkeypatch):
+    from sockets.ingest import needs_workflow
+    from utils.spam_avoidance import cooldowns
+    from workflow.emergency_monitoring import hardcoded_checks
+
+    # No call/SMS history, without loading it from MongoDB
+    monkeypatch.setattr(cooldowns, "loaded", True)
+
+    for data in readings():
+        decision = hardcoded_checks({"patient_id": "equivalence", "data": data})["decision"]
+        assert needs_workflow(data, "equivalence") == (decision if decision != "normal" else None), data
@@ -0,0 +1,60 @@
+# Rolling vitals window (utils/vitals_window.py): rings grow as they fill and
+# answer like a scan over the readings they hold; idle patients are dropped.
+import random
+import time
+from datetime import datetime
+import pytest
+from utils.idle import IdleTracker
+from utils.reading_columns import FIELDS, VITALS, COUNTERS
+from utils.vitals_window import VitalsWindow, VitalsWindows
+
+
+def scan(readings, since):
+    window = [(ts, reading) for ts, reading in readings if ts >= since]
+    return {
+        "count": len(window),
+        "mean": {f: sum(r[f] for _, r in window) / len(window) for f in FIELDS},
+        "min": {f: min(r[f] for _, r in window) for f in VITALS},
+        "max": {f: max(r[f] for _, r in window) for f in VITALS},
+        "delta": {f: window[-1][1][f] - window[0][1][f] for f in COUNTERS},
+    }
+
+
+@pytest.mark.parametrize("readings_count", [5, 64, 65, 200, 300])
+def test_growing_ring_matches_scan(readings_count):
+    rng = random.Random(readings_count)
+    window = VitalsWindow(capacity=256, initial_capacity=4)
+    readings = []
+    for i in range(readings_count):
+        reading = {"heart_rate": rng.randint(50, 130), "spo2": rng.randint(88, 100), "stress_level": rng.randint(0, 90),
+                   "steps": 10 * i, "calories_burned": i}
+        window.append(float(i), reading)
+        readings.append((float(i), reading))
+
+    assert window.capacity == min(256, max(4, 1 << (readings_count - 1).bit_length()))
+    held = readings[-256:]
+    for since in (0, held[0][0], readings_count / 2, readings_count - 1):
+        stats = window.stats(since)
+        expected = scan(held, since)
+        assert stats["count"] == expected["count"]
+        assert stats["complete"] == (readings_count <= 256 or since > readings[-257][0])
+        assert stats["mean"] == pytest.approx(expected["mean"])
+        assert (stats["min"], stats["max"], stats["delta"]) == (expected["min"], expected["max"], expected["delta"])
+
+
+def reading(patient_id):
+    return {"patient_id": patient_id, "timestamp": datetime.now(), "heart_rate": 70, "spo2": 97, "stress_level": 10,
+            "steps": 0, "calories_burned": 0}
+
+
+def test_idle_patients_are_dropped():
+    windows = VitalsWindows(capacity=16, initial_capacity=4)
+    windows._idle = IdleTracker(0.05, interval=0)
+    windows.append_reading(reading("quiet"))
+
+    time.sleep(0.1)
+    windows.append_reading(reading("busy"))
+    assert windows.patients() == ["busy"]
+    # Asking about a patient does not create a window for them
+    assert windows.stats_last("quiet", 60)["count"] == 0
+    assert windows.patients() == ["busy"]
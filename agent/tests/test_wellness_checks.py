@@ -0,0 +1,45 @@
+# Periodic and daily wellness checks: a patient with nothing to report ends the
+# graph after aggregate_data, without reaching the model or the SMS step, and the
+# daily sweep only visits patients with data from the last day.
+from datetime import datetime, timedelta
+from workflow import daily_wellness_check, periodic_wellness_check
+
+
+class EmptyCollection:
+    def find(self, *args, **kwargs):
+        return iter(())
+
+    def find_one(self, *args, **kwargs):
+        return None
+
+
+def test_graphs_end_without_data(monkeypatch):
+    monkeypatch.setattr(daily_wellness_check, "daily_data_collection", EmptyCollection())
+    monkeypatch.setattr(periodic_wellness_check, "realtime_rollups_collection", EmptyCollection())
+
+    daily = daily_wellness_check.daily_workflow.invoke({"patient_id": "quiet"})
+    periodic = periodic_wellness_check.periodic_workflow.invoke({"patient_id": "quiet"})
+    assert daily == {"patient_id": "quiet", "status": "no_data"}
+    assert periodic == {"patient_id": "quiet", "status": "no_data"}
+
+
+
+def test_daily_sweep_skips_patients_without_recent_data(monkeypatch):
+    queries = []
+
+    class DailyCollection(EmptyCollection):
+        def distinct(self, key, query):
+            queries.append(query)
+            return []
+
+    monkeypatch.setattr(daily_wellness_check, "daily_data_collection", DailyCollection())
+    class Chain:
+        def batch(self, inputs):
+            return []
+
+    monkeypatch.setattr(daily_wellness_check.llm, "bounded", lambda *args: Chain())
+
+    before = datetime.now()
+    assert daily_wellness_check.run_batch() == {}
+    since = queries[0]["timestamp"]["$gte"]
+    assert before - timedelta(days=1, seconds=5) < since <= datetime.now() - timedelta(days=1)
@@ -0,0 +1,86 @@
+# Write-behind retries (utils/write_behind.py) against a collection that, like a
+# time-series collection, accepts duplicate _ids.
+import asyncio
+from datetime import datetime, timedelta
+from pymongo.errors import AutoReconnect
+from utils.write_behind import AsyncWriteBehindBuffer, WriteBehindBuffer
+
+START = datetime(2026, 1, 1, 12, 0)
+
+
+class TimeSeriesCollection:
+    """insert_many without a unique _id index. Each entry of ``failures`` makes one call
+    write that many documents and then fail, as a dropped connection would."""
+
+    name = "realtime_data"
+
+    def __init__(self, failures=()):
+        self.docs = []
+        self.failures = list(failures)
+
+    def insert_many(self, docs, ordered=True):
+        if self.failures:
+            self.docs.extend(docs[:self.failures.pop(0)])
+            raise AutoReconnect("connection reset")
+        self.docs.extend(docs)
+
+    def find(self, query, projection=None):
+        ids, bounds = set(query["_id"]["$in"]), query["timestamp"]
+        return [
+            {"_id": doc["_id"]} for doc in self.docs
+            if doc["_id"] in ids and bounds["$gte"] <= doc["timestamp"] <= bounds["$lte"]
+        ]
+
+
+class AsyncTimeSeriesCollection(TimeSeriesCollection):
+    class Cursor:
+        def __init__(self, docs):
+            self.docs = docs
+
+        async def to_list(self, length=None):
+            return self.docs
+
+    async def insert_many(self, docs, ordered=True):
+        TimeSeriesCollection.insert_many(self, docs, ordered)
+
+    def find(self, query, projection=None):
+        return self.Cursor(TimeSeriesCollection.find(self, query, projection))
+
+
+def readings(count):
+    return [{"patient_id": "p", "timestamp": START + timedelta(seconds=5 * i), "heart_rate": 80} for i in range(count)]
+
+
+def write(collection, docs, **options):
+    buffer = WriteBehindBuffer(collection, batch_size=len(docs), flush_interval=60, retry_backoff=0, **options)
+    for doc in docs:
+        buffer.add(doc)
+    buffer.close()
+
+
+def test_dedupe_skips_documents_written_before_an_error():
+    collection = TimeSeriesCollection(failures=[4, 0])
+    write(collection, readings(10), dedupe=True)
+    ids = [doc["_id"] for doc in collection.docs]
+    assert len(ids) == 10 and len(set(ids)) == 10
+
+
+def test_retry_without_dedupe_duplicates_on_time_series():
+    collection = TimeSeriesCollection(failures=[4])
+    write(collection, readings(10))
+    assert len(collection.docs) == 14
+
+
+def test_async_dedupe_skips_documents_written_before_an_error():
+    collection = AsyncTimeSeriesCollection(failures=[6])
+
+    async def run():
+        buffer = AsyncWriteBehindBuffer(collection, batch_size=10, flush_interval=60, retry_backoff=0, dedupe=True)
+        buffer.start()
+        for doc in readings(10):
+            await buffer.add(doc)
+        await buffer.close()
+
+    asyncio.run(run())
+    ids = [doc["_id"] for doc in collection.docs]
+    assert len(ids) == 10 and len(set(ids)) == 10
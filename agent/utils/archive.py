@@ -0,0 +1,264 @@
+# Cold tier for realtime_data and daily_data. Closed days are exported to
+# compressed Arrow IPC (Feather v2) files, one per collection, patient and day:
+#
+#   ARCHIVE_DIR/realtime_data/patient_id=<id>/2026-01-31.arrow
+#
+# and then pruned from MongoDB. ``_state.json`` in each collection directory
+# records the day the archive is complete up to (the watermark): the trend
+# analysis reads days before it from the files, memory-mapped, and days from it
+# onwards from MongoDB, so the two never overlap.
+import json
+import os
+from datetime import datetime, timedelta
+from urllib.parse import quote
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from config import settings
+from config.db import realtime_data_collection, daily_data_collection
+from utils.patients import patient_filter
+from utils.metrics import counter
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+archived_documents = counter("agent_archive_documents_total", "Documents written to the cold archive, by collection")
+pruned_documents = counter("agent_archive_pruned_total", "Archived documents deleted from MongoDB, by collection")
+
+REALTIME_SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("patient_id", pa.string()),
+    ("timestamp", pa.timestamp("ms")),
+    ("heart_rate", pa.int32()),
+    ("spo2", pa.int32()),
+    ("stress_level", pa.int32()),
+    ("steps", pa.int64()),
+    ("calories_burned", pa.int64()),
+])
+
+DAILY_SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("patient_id", pa.string()),
+    ("timestamp", pa.timestamp("ms")),
+    ("sleep", pa.struct([
+        ("duration", pa.int32()),
+        ("quality", pa.string()),
+        ("start", pa.timestamp("ms")),
+        ("end", pa.timestamp("ms")),
+    ])),
+    ("nutrition", pa.struct([("calories", pa.int32()), ("protein", pa.int32()), ("carbs", pa.int32()), ("fat", pa.int32())])),
+    ("water_intake", pa.float64()),
+    ("energy_score", pa.int32()),
+])
+
+SCHEMAS = {"realtime_data": REALTIME_SCHEMA, "daily_data": DAILY_SCHEMA}
+
+# Closed days per patient, oldest first; documents without patient_id belong to the default patient
+CLOSED_DAYS = [
+    {"$group": {
+        "_id": {
+            "patient_id": {"$ifNull": ["$patient_id", settings.DEFAULT_PATIENT_ID]},
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+        },
+    }},
+    {"$sort": {"_id.day": 1}},
+]
+
+
+# ---- FILES ----
+def archive_root(root=None):
+    """Archive directory, or None when ARCHIVE_DIR is not set (nothing is archived)"""
+    return root or settings.ARCHIVE_DIR or None
+
+
+def collection_dir(kind, root=None):
+    return os.path.join(archive_root(root), kind)
+
+
+def partition_path(kind, patient_id, day, root=None):
+    return os.path.join(collection_dir(kind, root), f"patient_id={quote(patient_id, safe='')}", f"{day}.arrow")
+
+
+def archived_before(kind, root=None):
+    """First day not (completely) in the archive, or None if nothing is archived"""
+    if archive_root(root) is None:
+        return None
+    try:
+        with open(os.path.join(collection_dir(kind, root), "_state.json")) as f:
+            return datetime.fromisoformat(json.load(f)["archived_before"])
+    except FileNotFoundError:
+        return None
+
+
+def _set_archived_before(kind, day, root=None):
+    # Never moves back: days before the old watermark are already pruned from MongoDB
+    current = archived_before(kind, root)
+    if current is not None and current >= day:
+        return
+    path = os.path.join(collection_dir(kind, root), "_state.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"archived_before": day.date().isoformat()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def hot_since(kind, since, root=None):
+    """Start of the range the trend analysis reads from MongoDB rather than the archive"""
+    boundary = archived_before(kind, root)
+    return since if boundary is None else max(since, boundary)
+
+
+def to_table(kind, docs):
+    schema = SCHEMAS[kind]
+    rows = [{**doc, "_id": str(doc["_id"]), "patient_id": doc.get("patient_id") or settings.DEFAULT_PATIENT_ID} for doc in docs]
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+def write_partition(kind, patient_id, day, table, root=None):
+    """Write (or merge into) one day's file. Rows already archived are kept once, by _id."""
+    path = partition_path(kind, patient_id, day, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        existing = feather.read_table(path, memory_map=True)
+        table = table.filter(pc.invert(pc.is_in(table["_id"], existing["_id"])))
+        table = pa.concat_tables([existing, table])
+    table = table.sort_by("timestamp")
+    # Written aside and renamed, so readers never see a partial file
+    feather.write_feather(table, path + ".tmp", compression=settings.ARCHIVE_COMPRESSION)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_partitions(kind, patient_id, since, columns=None, root=None, until=None):
+    """One patient's archived rows from ``since`` up to the watermark (and before ``until``), memory-mapped, or None"""
+    boundary = archived_before(kind, root)
+    if boundary is None:
+        return None
+    directory = os.path.dirname(partition_path(kind, patient_id, "-", root))
+    if not os.path.isdir(directory):
+        return None
+    first, last = since.date().isoformat(), boundary.date().isoformat()
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.endswith(".arrow") and first <= name[:-len(".arrow")] < last
+        and (until is None or name[:-len(".arrow")] <= until.date().isoformat())
+    )
+    if not names:
+        return None
+    # Uncompressed columns are used in place; compressed ones are decompressed from the mapping
+    tables = [feather.read_table(os.path.join(directory, name), columns=columns, memory_map=True) for name in names]
+    table = pa.concat_tables(tables)
+    keep = pc.greater_equal(table["timestamp"], pa.scalar(since, pa.timestamp("ms")))
+    if until is not None:
+        keep = pc.and_(keep, pc.less(table["timestamp"], pa.scalar(until, pa.timestamp("ms"))))
+    return table.filter(keep)
+
+
+# ---- ARCHIVAL ----
+def closed_days(collection, before):
+    """(patient_id, day, filter for that patient's day) for every day with documents before ``before``"""
+    for group in collection.aggregate([{"$match": {"timestamp": {"$lt": before}}}, *CLOSED_DAYS]):
+        patient_id, day = group["_id"]["patient_id"], group["_id"]["day"]
+        start = datetime.fromisoformat(day)
+        yield patient_id, day, {**patient_filter(patient_id), "timestamp": {"$gte": start, "$lt": start + timedelta(days=1)}}
+
+
+def archive_collection(kind, collection, before, root=None):
+    """Export every closed day before ``before`` and prune it from ``collection``.
+    Returns (documents archived, documents pruned)."""
+    archived = pruned = 0
+    for patient_id, day, query in closed_days(collection, before):
+        docs = list(collection.find(query).sort("timestamp", 1))
+        if docs:
+            write_partition(kind, patient_id, day, to_table(kind, docs), root)
+            archived += len(docs)
+            archived_documents.inc(len(docs), collection=kind)
+
+    # Complete up to `before` only once every day before it is on disk
+    _set_archived_before(kind, before, root)
+
+    for patient_id, day, query in closed_days(collection, before):
+        path = partition_path(kind, patient_id, day, root)
+        if not os.path.exists(path):
+            continue
+        on_disk = set(feather.read_table(path, columns=["_id"], memory_map=True)["_id"].to_pylist())
+        # Only documents verified on disk are deleted; late readings for an archived day
+        # stay in MongoDB until the next run merges them
+        ids = [doc["_id"] for doc in collection.find(query, {"_id": 1}) if str(doc["_id"]) in on_disk]
+        if ids:
+            result = collection.delete_many({"_id": {"$in": ids}})
+            pruned += result.deleted_count
+            pruned_documents.inc(result.deleted_count, collection=kind)
+    return archived, pruned
+
+
+def archive_closed_days(now=None, root=None):
+    """Archive days older than ARCHIVE_AFTER_DAYS from both collections. Returns {collection: (archived, pruned)}."""
+    if archive_root(root) is None:
+        raise RuntimeError("ARCHIVE_DIR is not set; refusing to prune MongoDB without an archive")
+    now = now or datetime.now()
+    before = datetime.combine(now.date() - timedelta(days=settings.ARCHIVE_AFTER_DAYS), datetime.min.time())
+    report = {}
+    for kind, collection in (("realtime_data", realtime_data_collection), ("daily_data", daily_data_collection)):
+        report[kind] = archive_collection(kind, collection, before, root)
+        log.info("🧊 Archived %d and pruned %d %s documents before %s", *report[kind], kind, before.date(), extra={"collection": kind})
+    return report
+
+
+# ---- TREND GROUPS ----
+# Same shapes as the realtime/daily pipelines in utils/trends.py, so the archived
+# part merges with the MongoDB part (merge_realtime_groups / merge_daily_groups).
+def _sum(column):
+    return pc.sum(column).as_py() or 0
+
+
+def realtime_groups(patient_id, since, root=None, until=None):
+    columns = ["timestamp", "heart_rate", "spo2", "stress_level", "steps", "calories_burned"]
+    table = read_partitions("realtime_data", patient_id, since, columns, root, until)
+    if table is None or table.num_rows == 0:
+        return None
+
+    sums = [("heart_rate", "sum_hr"), ("spo2", "sum_spo2"), ("stress_level", "sum_stress"), ("steps", "total_steps"), ("calories_burned", "total_calories")]
+    weeks = table.append_column("year", pc.iso_year(table["timestamp"])).append_column("week", pc.iso_week(table["timestamp"]))
+    grouped = weeks.group_by(["year", "week"]).aggregate([(column, "sum") for column, _ in sums] + [("timestamp", "count")])
+    weekly = [
+        {
+            "_id": {"year": row["year"], "week": row["week"]},
+            **{name: row[f"{column}_sum"] or 0 for column, name in sums},
+            "record_count": row["timestamp_count"],
+        }
+        for row in grouped.to_pylist()
+    ]
+    bounds = pc.min_max(table["timestamp"]).as_py()
+    overall = {"_id": None, **{name: _sum(table[column]) for column, name in sums}, "record_count": table.num_rows, "start": bounds["min"], "end": bounds["max"]}
+    return {"weekly": weekly, "overall": [overall]}
+
+
+def daily_groups(patient_id, since, recent=14, root=None):
+    table = read_partitions("daily_data", patient_id, since, root=root)
+    if table is None or table.num_rows == 0:
+        return None
+
+    sleep, nutrition = table["sleep"], table["nutrition"]
+    totals = {
+        "_id": None,
+        "total_days": table.num_rows,
+        "sleep_duration_sum": _sum(pc.struct_field(sleep, "duration")),
+        "sleep_count": table.num_rows - sleep.null_count,
+        "calories_sum": _sum(pc.struct_field(nutrition, "calories")),
+        "protein_sum": _sum(pc.struct_field(nutrition, "protein")),
+        "nutrition_count": table.num_rows - nutrition.null_count,
+        "energy_sum": _sum(table["energy_score"]),
+        "energy_count": table.num_rows - table["energy_score"].null_count,
+        "water_sum": _sum(table["water_intake"]),
+        "water_count": table.num_rows - table["water_intake"].null_count,
+    }
+    quality = pc.value_counts(pc.drop_null(pc.struct_field(sleep, "quality"))).to_pylist()
+    newest = table.sort_by([("timestamp", "descending")]).slice(0, recent)
+    columns = ["timestamp", "sleep", "nutrition", "energy_score", "water_intake"]
+    rows = [{k: v for k, v in row.items() if v is not None} for row in newest.select(columns).to_pylist()]
+    return {
+        "totals": [totals],
+        "sleep_quality": [{"_id": q["values"], "count": q["counts"]} for q in quality],
+        "recent": rows,
+    }
@@ -0,0 +1,288 @@
+# Per-patient personal baselines for the emergency workflow. Each vital keeps
+# an EWMA of recent readings and a Welford mean/variance of the patient's
+# history, updated in O(1) per reading and entirely in memory. Compact
+# snapshots go to MongoDB in the background so baselines survive restarts.
+import asyncio
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+from config import settings, async_db
+from config.db import patient_baselines_collection
+from utils.idle import IdleTracker
+from utils.log import get_logger
+from utils.metrics import counter, gauge
+from utils.reading_columns import VITALS
+
+log = get_logger(__name__)
+
+baseline_patients = gauge("agent_baseline_patients", "Patients with a personal baseline in memory")
+baseline_deviations = counter("agent_baseline_deviations_total", "Readings whose smoothed value deviated from the personal baseline, by vital")
+snapshot_writes = counter("agent_baseline_snapshot_writes_total", "Patient baseline snapshots written to MongoDB")
+
+# Which way a deviation is a concern: 1 above baseline, -1 below, 0 either way
+DIRECTION = {"heart_rate": 0, "spo2": -1, "stress_level": 1}
+# Standard deviation floors, so a very steady vital does not turn small changes into huge z-scores
+MIN_STD = {"heart_rate": 3.0, "spo2": 0.75, "stress_level": 5.0}
+
+
+class VitalBaseline:
+    """EWMA plus Welford mean/variance for one vital.
+
+    The Welford count stops at ``max_count``, after which the mean and
+    variance forget old readings exponentially, so a baseline follows slow
+    changes over weeks while staying steady against a bad afternoon. A reading
+    further than ``clip`` from the mean moves the mean as if it were at that
+    distance and leaves the variance alone, so an episode being flagged does
+    not widen the baseline enough to hide itself.
+    """
+
+    __slots__ = ("n", "mean", "var", "ewma")
+
+    def __init__(self, n=0, mean=0.0, var=0.0, ewma=None):
+        self.n = n
+        self.mean = mean
+        self.var = var
+        self.ewma = ewma
+
+    def update(self, x, alpha, max_count, clip=None):
+        self.ewma = x if self.ewma is None else self.ewma + alpha * (x - self.ewma)
+        self.n = min(self.n + 1, max_count)
+        w = 1 / self.n
+        delta = x - self.mean
+        if clip is not None and abs(delta) > clip:
+            self.mean += w * math.copysign(clip, delta)
+            return
+        self.mean += w * delta
+        self.var = (1 - w) * (self.var + w * delta * delta)
+
+    def std(self, floor=0.0):
+        return max(math.sqrt(self.var), floor)
+
+    def z(self, x, floor=0.0):
+        return (x - self.mean) / self.std(floor)
+
+
+class BaselineEngine:
+    """Personal baselines for every patient, with a "deviation from baseline" signal.
+
+    ``update`` folds a reading in and works out the signal: the z-score of
+    each vital's EWMA against the patient's own mean and standard deviation.
+    A vital deviates once the patient has ``min_samples`` readings and its
+    z-score passes ``threshold`` in the direction that matters for it.
+    ``deviating`` is then a dict lookup for the fast path and the graph.
+
+    Patients idle for ``idle_seconds`` leave memory once their snapshot is
+    written; ``reload`` brings a snapshot back when they send again.
+    """
+
+    def __init__(self, alpha=0.1, max_count=10000, min_samples=120, threshold=3.0, snapshot_interval=60.0, idle_seconds=0):
+        self.alpha = alpha
+        self.max_count = max_count
+        self.min_samples = min_samples
+        self.threshold = threshold
+        self.snapshot_interval = snapshot_interval
+        self.idle_seconds = idle_seconds
+        self._patients = {}
+        self._deviating = {}
+        self._dirty = set()
+        self._idle = IdleTracker(idle_seconds)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._task = None
+
+    def update(self, patient_id, reading):
+        """Fold a validated realtime_data reading (or dict) into the patient's baseline"""
+        if not isinstance(reading, dict):
+            reading = {f: getattr(reading, f) for f in VITALS}
+        with self._lock:
+            for idle in self._idle.touch(patient_id):
+                # Unsaved changes keep a patient until the next snapshot has them
+                if idle not in self._dirty:
+                    self._patients.pop(idle, None)
+                    self._deviating.pop(idle, None)
+                    self._idle.forget(idle)
+            vitals = self._patients.get(patient_id)
+            if vitals is None:
+                vitals = self._patients[patient_id] = {f: VitalBaseline() for f in VITALS}
+            baseline_patients.set(len(self._patients))
+            learned = vitals[VITALS[0]].n >= self.min_samples
+            for f in VITALS:
+                value = reading.get(f)
+                if value is not None:
+                    b = vitals[f]
+                    b.update(value, self.alpha, self.max_count, self.threshold * b.std(MIN_STD[f]) if learned else None)
+            deviating = self._deviating[patient_id] = self._find_deviations(vitals)
+            self._dirty.add(patient_id)
+        for f in deviating:
+            baseline_deviations.inc(vital=f)
+
+    def _find_deviations(self, vitals):
+        if vitals[VITALS[0]].n < self.min_samples:
+            return ()
+        deviating = []
+        for f, b in vitals.items():
+            score = b.z(b.ewma, MIN_STD[f])
+            if (abs(score) if DIRECTION[f] == 0 else score * DIRECTION[f]) >= self.threshold:
+                deviating.append(f)
+        return tuple(deviating)
+
+    def deviating(self, patient_id):
+        """Vitals currently off the patient's baseline; empty while the baseline is still learning"""
+        return self._deviating.get(patient_id, ())
+
+    def deviation(self, patient_id):
+        """{"z": {vital: z-score of its EWMA}, "baseline": {vital: mean}, "current": {vital: EWMA}}, or None"""
+        with self._lock:
+            vitals = self._patients.get(patient_id)
+            if vitals is None:
+                return None
+            return {
+                "z": {f: b.z(b.ewma, MIN_STD[f]) for f, b in vitals.items()},
+                "baseline": {f: b.mean for f, b in vitals.items()},
+                "current": {f: b.ewma for f, b in vitals.items()},
+            }
+
+    # ---- SNAPSHOTS ----
+    def snapshot(self, patient_id):
+        """Compact document: one array per statistic, in VITALS order"""
+        vitals = self._patients[patient_id]
+        return {
+            "_id": patient_id,
+            "fields": list(VITALS),
+            "n": [vitals[f].n for f in VITALS],
+            "mean": [vitals[f].mean for f in VITALS],
+            "var": [vitals[f].var for f in VITALS],
+            "ewma": [vitals[f].ewma for f in VITALS],
+            "updated": datetime.now(timezone.utc),
+        }
+
+    def restore(self, doc, replace=True):
+        """Load a snapshot written by ``snapshot``; vitals missing from it start fresh.
+        With ``replace`` False a patient already in memory keeps their state."""
+        columns = {f: i for i, f in enumerate(doc.get("fields", VITALS))}
+        vitals = {}
+        for f in VITALS:
+            i = columns.get(f)
+            vitals[f] = VitalBaseline() if i is None else VitalBaseline(doc["n"][i], doc["mean"][i], doc["var"][i], doc["ewma"][i])
+        with self._lock:
+            if not replace and doc["_id"] in self._patients:
+                return
+            self._patients[doc["_id"]] = vitals
+            self._idle.touch(doc["_id"])
+            self._deviating[doc["_id"]] = self._find_deviations(vitals)
+            baseline_patients.set(len(self._patients))
+
+    def _take_ops(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return dirty, [ReplaceOne({"_id": pid}, self.snapshot(pid), upsert=True) for pid in dirty]
+
+    def _failed(self, dirty, error):
+        log.error("❌ Baseline snapshot failed: %s", error)
+        # Retried with the next snapshot
+        with self._lock:
+            self._dirty |= dirty
+
+    def _recent(self):
+        """Snapshots of patients who may still be sending; the rest are reloaded when they do"""
+        if not self.idle_seconds:
+            return {}
+        return {"updated": {"$gte": datetime.now(timezone.utc) - timedelta(seconds=self.idle_seconds)}}
+
+    def known(self, patient_id):
+        return patient_id in self._patients
+
+    def load(self, collection=None):
+        collection = collection if collection is not None else patient_baselines_collection
+        for doc in collection.find(self._recent()):
+            self.restore(doc)
+        return len(self._patients)
+
+    async def aload(self, collection=None):
+        collection = collection if collection is not None else async_db.patient_baselines_collection
+        async for doc in collection.find(self._recent()):
+            self.restore(doc)
+        return len(self._patients)
+
+    def reload(self, patient_id, collection=None):
+        """Bring back the snapshot of a patient not in memory (not loaded at start, or dropped as idle)"""
+        collection = collection if collection is not None else patient_baselines_collection
+        try:
+            doc = collection.find_one({"_id": patient_id})
+        except PyMongoError as e:
+            log.warning("⚠️ Could not reload baseline, starting fresh: %s", e, extra={"patient_id": patient_id})
+            return
+        if doc is not None:
+            self.restore(doc, replace=False)
+
+    async def areload(self, patient_id, collection=None):
+        collection = collection if collection is not None else async_db.patient_baselines_collection
+        try:
+            doc = await collection.find_one({"_id": patient_id})
+        except PyMongoError as e:
+            log.warning("⚠️ Could not reload baseline, starting fresh: %s", e, extra={"patient_id": patient_id})
+            return
+        if doc is not None:
+            self.restore(doc, replace=False)
+
+    def save(self, collection=None):
+        collection = collection if collection is not None else patient_baselines_collection
+        dirty, ops = self._take_ops()
+        if not ops:
+            return
+        try:
+            collection.bulk_write(ops, ordered=False)
+            snapshot_writes.inc(len(ops))
+        except PyMongoError as e:
+            self._failed(dirty, e)
+
+    async def asave(self, collection=None):
+        collection = collection if collection is not None else async_db.patient_baselines_collection
+        dirty, ops = self._take_ops()
+        if not ops:
+            return
+        try:
+            await collection.bulk_write(ops, ordered=False)
+            snapshot_writes.inc(len(ops))
+        except PyMongoError as e:
+            self._failed(dirty, e)
+
+    # ---- BACKGROUND SNAPSHOTS ----
+    def start(self):
+        def run():
+            while not self._stop.wait(self.snapshot_interval):
+                self.save()
+        self._thread = threading.Thread(target=run, name="baseline-snapshots", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.save()
+
+    def astart(self):
+        async def run():
+            while not self._stop.is_set():
+                await asyncio.sleep(self.snapshot_interval)
+                await self.asave()
+        self._task = asyncio.create_task(run())
+
+    async def aclose(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+        await self.asave()
+
+
+baselines = BaselineEngine(
+    alpha=settings.BASELINE_ALPHA,
+    max_count=settings.BASELINE_MAX_COUNT,
+    min_samples=settings.BASELINE_MIN_SAMPLES,
+    threshold=settings.BASELINE_Z_THRESHOLD,
+    snapshot_interval=settings.BASELINE_SNAPSHOT_INTERVAL,
+    idle_seconds=settings.PATIENT_IDLE_SECONDS,
+)
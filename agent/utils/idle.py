@@ -0,0 +1,38 @@
+# Idle patients. The vitals windows, sustained-rule windows and baselines each
+# keep state per patient; a patient who has sent nothing for idle_seconds has
+# that state dropped, so an agent serving a changing fleet does not keep
+# everyone it has ever seen in memory.
+import time
+
+
+class IdleTracker:
+    """When each patient last sent a reading, and which have since gone quiet.
+
+    ``touch`` is a dict store, plus a scan for idle patients at most once every
+    ``interval`` seconds. Callers hold their own lock and ``forget`` the
+    patients whose state they drop. ``idle_seconds`` 0 never reports anyone.
+    """
+
+    def __init__(self, idle_seconds, interval=60.0):
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self._seen = {}
+        self._next_scan = time.monotonic() + interval
+
+    def touch(self, patient_id):
+        """Record a reading; returns the patients idle for ``idle_seconds`` when a scan is due"""
+        self._seen[patient_id] = time.time()
+        now = time.monotonic()
+        if now < self._next_scan:
+            return ()
+        self._next_scan = now + self.interval
+        return self.idle()
+
+    def idle(self, now=None):
+        if not self.idle_seconds:
+            return []
+        cutoff = (time.time() if now is None else now) - self.idle_seconds
+        return [patient_id for patient_id, seen in self._seen.items() if seen < cutoff]
+
+    def forget(self, patient_id):
+        self._seen.pop(patient_id, None)
@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from config import settings
+from utils.metrics import counter, gauge
+
+cache_requests = counter("agent_llm_cache_requests_total", "LLM response cache lookups by result (hit/miss)")
+cache_entries = gauge("agent_llm_cache_entries", "Entries held by each LLM response cache")
+
+
+def quantize(value, step):
+    """Snap a number to the nearest multiple of ``step``"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    return round(round(value / step) * step, 6)
+
+
+def fingerprint(inputs, quanta, ignore=(), prefix=""):
+    """Canonical, quantized form of the prompt inputs.
+
+    ``quanta`` maps dotted field paths to bucket sizes (e.g. {"heart_rate": 5});
+    fields in ``ignore`` (timestamps, ids) do not take part in the key.
+    """
+    out = {}
+    for name, value in inputs.items():
+        path = f"{prefix}{name}"
+        if path in ignore:
+            continue
+        if isinstance(value, dict):
+            out[name] = fingerprint(value, quanta, ignore, prefix=f"{path}.")
+        elif path in quanta:
+            out[name] = quantize(value, quanta[path])
+        else:
+            out[name] = value
+    return out
+
+
+class ResponseCache:
+    """Size-bounded LRU of chain results with a TTL, keyed on quantized prompt inputs.
+
+    Readings that land in the same buckets get the same message, so repeated
+    alerts for a persistent condition skip the LLM round-trip.
+    """
+
+    def __init__(self, name, quanta, ignore=(), maxsize=None, ttl=None):
+        self.name = name
+        self.quanta = quanta
+        self.ignore = set(ignore)
+        self.maxsize = settings.LLM_CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = settings.LLM_CACHE_TTL_SECONDS if ttl is None else ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, inputs):
+        return json.dumps(fingerprint(inputs, self.quanta, self.ignore), sort_keys=True, default=str)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                cache_requests.inc(cache=self.name, result="hit")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        cache_requests.inc(cache=self.name, result="miss")
+        return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            cache_entries.set(len(self._entries), cache=self.name)
+
+    def invoke(self, chain, inputs, key_inputs=None):
+        """chain.invoke(inputs) through the cache; ``key_inputs`` overrides what the key is built from"""
+        key = self.key(inputs if key_inputs is None else key_inputs)
+        result = self.get(key)
+        if result is None:
+            result = chain.invoke(inputs)
+            self.put(key, result)
+        return result
+
+    async def ainvoke(self, chain, inputs, key_inputs=None):
+        key = self.key(inputs if key_inputs is None else key_inputs)
+        result = self.get(key)
+        if result is None:
+            result = await chain.ainvoke(inputs)
+            self.put(key, result)
+        return result
+
+    def batch(self, run, inputs, key_inputs=None):
+        """Results for a list of inputs; only the misses go to ``run(inputs)``.
+
+        ``run`` returns one result or exception per input (e.g. a bounded
+        chain's batch); exceptions are passed through and not cached.
+        """
+        keys = [self.key(k) for k in (inputs if key_inputs is None else key_inputs)]
+        results = [self.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, result in zip(missing, run([inputs[i] for i in missing])):
+                if not isinstance(result, Exception):
+                    self.put(keys[i], result)
+                results[i] = result
+        return results
+
+    async def abatch(self, run, inputs, key_inputs=None):
+        keys = [self.key(k) for k in (inputs if key_inputs is None else key_inputs)]
+        results = [self.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, result in zip(missing, await run([inputs[i] for i in missing])):
+                if not isinstance(result, Exception):
+                    self.put(keys[i], result)
+                results[i] = result
+        return results
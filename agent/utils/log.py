@@ -0,0 +1,168 @@
+# Structured logging for the agent. Records go through a bounded queue to a
+# QueueListener thread that formats and writes them, so socket callbacks and
+# workflow nodes never wait on stdout. When the queue is full, records are
+# dropped (and counted) rather than blocking the caller.
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from config import settings
+from utils.metrics import counter
+
+records_dropped = counter("agent_log_records_dropped_total", "Log records not written, by reason (sampled/rate_limited/queue_full)")
+
+ROOT = "agent"
+
+# LogRecord attributes that are not structured fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def get_logger(name):
+    """Logger under the agent's namespace, e.g. get_logger(__name__)"""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def fields(record):
+    """Structured fields passed with ``extra=``, e.g. stream and patient_id"""
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+# ---- FORMATTERS ----
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extra = fields(record)
+        if extra:
+            line += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        return line
+
+
+# ---- HANDLERS ----
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record"""
+
+    def prepare(self, record):
+        # Resolve the message and traceback on the caller's thread, kept as separate fields
+        # for the formatter. This is the agent logger's only handler, so the record is not copied.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            records_dropped.inc(reason="queue_full")
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def setup_logging(level=None, format=None, stream=None):
+    """Route the agent's loggers through the background queue. Safe to call more than once."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if (format or settings.LOG_FORMAT) == "json" else TextFormatter())
+
+        records = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        _listener = QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+        # Process names are not logged; skip looking them up for every record
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
+        logger = logging.getLogger(ROOT)
+        logger.setLevel(level or settings.LOG_LEVEL)
+        logger.addHandler(DroppingQueueHandler(records))
+        logger.propagate = False
+
+
+def stop_logging():
+    """Write out what is still queued and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        logger = logging.getLogger(ROOT)
+        for handler in list(logger.handlers):
+            if isinstance(handler, DroppingQueueHandler):
+                logger.removeHandler(handler)
+
+
+# ---- PAYLOAD SAMPLING ----
+class PayloadSampler:
+    """Which payload dumps to log: a sample rate per event type, then at most
+    ``max_per_second`` per event type (token bucket)"""
+
+    def __init__(self, rates, max_per_second, default_rate=1.0):
+        self.rates = rates
+        self.default_rate = default_rate
+        self.max_per_second = max_per_second
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def allow(self, event):
+        rate = self.rates.get(event, self.default_rate)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            records_dropped.inc(reason="sampled")
+            return False
+        if self.max_per_second <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._tokens.get(event, (self.max_per_second, now))
+            tokens = min(self.max_per_second, tokens + (now - last) * self.max_per_second)
+            if tokens < 1:
+                self._tokens[event] = (tokens, now)
+                records_dropped.inc(reason="rate_limited")
+                return False
+            self._tokens[event] = (tokens - 1, now)
+        return True
+
+
+payload_sampler = PayloadSampler(settings.LOG_PAYLOAD_SAMPLE_RATE, settings.LOG_PAYLOAD_MAX_PER_SECOND)
+
+
+def log_payload(logger, event, payload):
+    """Log a received payload if its event type's sampling and rate limit allow it"""
+    if not logger.isEnabledFor(logging.INFO) or not payload_sampler.allow(event):
+        return
+    patient_id = payload.get("patient_id") if isinstance(payload, dict) else None
+    logger.info("📡 Received %s", event, extra={"stream": event, "patient_id": patient_id, "payload": payload})
@@ -0,0 +1,31 @@
+from config.settings import DEFAULT_PATIENT_ID
+
+
+def patient_filter(patient_id):
+    """Mongo filter for one patient's documents. Legacy documents without patient_id belong to the default patient."""
+    if patient_id == DEFAULT_PATIENT_ID:
+        return {"patient_id": {"$in": [patient_id, None]}}
+    return {"patient_id": patient_id}
+
+
+def patient_of(state):
+    return state.get("patient_id") or DEFAULT_PATIENT_ID
+
+
+
+def active_patients(collection, since=None):
+    """Patients with documents in ``collection`` (newer than ``since``, if given)"""
+    query = {"timestamp": {"$gte": since}} if since is not None else {}
+    patients = {patient_id or DEFAULT_PATIENT_ID for patient_id in collection.distinct("patient_id", query)}
+    # distinct() skips documents without the field; those are the default patient's
+    if collection.find_one({**query, "patient_id": None}, projection={"_id": 1}):
+        patients.add(DEFAULT_PATIENT_ID)
+    return sorted(patients)
+
+
+async def aactive_patients(collection, since=None):
+    query = {"timestamp": {"$gte": since}} if since is not None else {}
+    patients = {patient_id or DEFAULT_PATIENT_ID for patient_id in await collection.distinct("patient_id", query)}
+    if await collection.find_one({**query, "patient_id": None}, projection={"_id": 1}):
+        patients.add(DEFAULT_PATIENT_ID)
+    return sorted(patients)
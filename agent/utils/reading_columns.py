@@ -0,0 +1,137 @@
+from array import array
+from bisect import bisect_left
+from config import settings
+
+FIELDS = ("heart_rate", "spo2", "stress_level", "steps", "calories_burned")
+# Vitals get min/max; cumulative device counters are reported over a window as last - first
+VITALS = ("heart_rate", "spo2", "stress_level")
+COUNTERS = ("steps", "calories_burned")
+
+
+class ReadingColumns:
+    """Struct-of-arrays for one patient's realtime readings.
+
+    One ``array('d')`` per field plus epoch-second timestamps, 8 bytes a value
+    instead of a dict and boxed floats per reading. Readings are expected in
+    timestamp order, so time ranges are found by binary search and returned
+    as zero-copy memoryview slices (see ColumnsSlice).
+    """
+
+    def __init__(self):
+        self.ts = array("d")
+        self.columns = {f: array("d") for f in FIELDS}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    # ---- BUILDING ----
+    def append(self, timestamp, reading):
+        """``timestamp`` in epoch seconds, ``reading`` maps FIELDS to numbers.
+
+        Fails with BufferError while a slice of these columns is alive.
+        """
+        self.ts.append(timestamp)
+        for f in FIELDS:
+            self.columns[f].append(reading[f])
+
+    def append_doc(self, doc):
+        """A Mongo document or validated realtime_data model (datetime ``timestamp``)"""
+        if not isinstance(doc, dict):
+            doc = {f: getattr(doc, f) for f in FIELDS + ("timestamp",)}
+        self.append(doc["timestamp"].timestamp(), doc)
+
+    def append_payload(self, payload):
+        """A raw socket payload (``timestamp`` in epoch milliseconds)"""
+        self.append(payload["timestamp"] / 1000, payload)
+
+    @classmethod
+    def from_docs(cls, docs):
+        columns = cls()
+        for doc in docs:
+            columns.append_doc(doc)
+        return columns
+
+    @classmethod
+    def from_payloads(cls, payloads):
+        columns = cls()
+        for payload in payloads:
+            columns.append_payload(payload)
+        return columns
+
+    # ---- SLICING ----
+    def slice(self, start=0, stop=None):
+        return ColumnsSlice(self, start, len(self) if stop is None else stop)
+
+    def between(self, since, until=None):
+        """Readings with ``since`` <= timestamp < ``until`` (epoch seconds), as a zero-copy slice"""
+        start = bisect_left(self.ts, since)
+        stop = len(self) if until is None else bisect_left(self.ts, until, start)
+        return ColumnsSlice(self, start, stop)
+
+
+class ColumnsSlice:
+    """Memoryview slices over a ReadingColumns range; no values are copied.
+
+    While a slice is alive its columns cannot grow, so release() it (or use it
+    as a context manager) before appending more readings.
+    """
+
+    def __init__(self, columns, start, stop):
+        self._views = [memoryview(columns.ts)] + [memoryview(columns[f]) for f in FIELDS]
+        self.ts = self._views[0][start:stop]
+        self.columns = {f: view[start:stop] for f, view in zip(FIELDS, self._views[1:])}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def release(self):
+        for view in [self.ts, *self.columns.values(), *self._views]:
+            view.release()
+
+    def stats(self):
+        """Count, mean, min, max and counter deltas, shaped like VitalsWindow.stats"""
+        count = len(self)
+        if count == 0:
+            return {
+                "count": 0,
+                "mean": {f: None for f in FIELDS},
+                "min": {f: None for f in VITALS},
+                "max": {f: None for f in VITALS},
+                "delta": {f: None for f in COUNTERS},
+            }
+        return {
+            "count": count,
+            "mean": {f: sum(self.columns[f]) / count for f in FIELDS},
+            "min": {f: min(self.columns[f]) for f in VITALS},
+            "max": {f: max(self.columns[f]) for f in VITALS},
+            "delta": {f: self.columns[f][-1] - self.columns[f][0] for f in COUNTERS},
+        }
+
+
+def append_by_patient(by_patient, doc):
+    """Append a document to its patient's ReadingColumns in ``by_patient``"""
+    patient_id = doc.get("patient_id") or settings.DEFAULT_PATIENT_ID
+    columns = by_patient.get(patient_id)
+    if columns is None:
+        columns = by_patient[patient_id] = ReadingColumns()
+    columns.append_doc(doc)
+
+
+def columns_by_patient(docs):
+    """Split documents (e.g. a cursor sorted by timestamp) into ReadingColumns per patient"""
+    by_patient = {}
+    for doc in docs:
+        append_by_patient(by_patient, doc)
+    return by_patient
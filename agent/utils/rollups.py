@@ -0,0 +1,246 @@
+import asyncio
+import threading
+import uuid
+from datetime import timedelta
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from utils.metrics import counter
+from utils.log import get_logger
+from utils.reading_columns import FIELDS, VITALS, COUNTERS
+
+log = get_logger(__name__)
+
+rollup_upserts = counter("agent_rollup_upserts_total", "Rollup bucket upserts sent to MongoDB")
+rollup_retries = counter("agent_rollup_requeued_total", "Rollup bucket upserts kept for the next flush after a failed bulk write")
+rollup_dropped = counter("agent_rollup_dropped_total", "Rollup bucket upserts dropped because too many failed ones were pending")
+
+
+# ---- BUCKETS ----
+def minute_start(ts):
+    return ts.replace(second=0, microsecond=0)
+
+
+def hour_start(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(ts):
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def week_start(ts):
+    """Monday of the ISO week"""
+    return day_start(ts) - timedelta(days=ts.weekday())
+
+
+GRANULARITIES = {
+    "minute": minute_start,
+    "hour": hour_start,
+    "day": day_start,
+    "week": week_start,
+}
+
+
+def _new_bucket():
+    return {
+        "count": 0,
+        "sum": {f: 0 for f in FIELDS},
+        "min": {},
+        "max": {},
+        "start": None,
+        "end": None,
+    }
+
+
+# A bucket row remembers the ids of its last few flushes, so a flush retried after
+# an unknown outcome (a lost reply, a timeout) is not counted twice
+FLUSH_IDS_KEPT = 32
+
+
+def _bucket_update(flush_id, bucket):
+    """Update pipeline adding one flush of ``bucket`` to its row, once per ``flush_id``"""
+    applied = {"$in": [flush_id, {"$ifNull": ["$flushes", []]}]}
+
+    def add(field, value):
+        return {"$cond": [applied, f"${field}", {"$add": [{"$ifNull": [f"${field}", 0]}, value]}]}
+
+    lowest = {f"min_{f}": bucket["min"][f] for f in VITALS}
+    highest = {f"max_{f}": bucket["max"][f] for f in VITALS}
+    for f in COUNTERS:
+        lowest[f"first_{f}"] = bucket["min"][f]
+        highest[f"last_{f}"] = bucket["max"][f]
+    lowest["start"] = bucket["start"]
+    highest["end"] = bucket["end"]
+
+    return [{"$set": {
+        "count": add("count", bucket["count"]),
+        **{f"sum_{f}": add(f"sum_{f}", bucket["sum"][f]) for f in FIELDS},
+        # Minimums and maximums come out the same however often they are applied
+        **{field: {"$min": [f"${field}", value]} for field, value in lowest.items()},
+        **{field: {"$max": [f"${field}", value]} for field, value in highest.items()},
+        "flushes": {"$cond": [applied, "$flushes", {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$flushes", []]}, [flush_id]]}, -FLUSH_IDS_KEPT,
+        ]}]},
+    }}]
+
+
+class RollupAggregator:
+    """Accumulates readings into minute/hour/day/week buckets and upserts them periodically.
+
+    Each flush adds the pending buckets' counts and sums to their rows and
+    takes the ``$min``/``$max`` of the rest, so concurrent agents and repeated
+    flushes of the same bucket combine correctly. Steps and calories are
+    cumulative device counters, so their first/last values in a bucket are
+    the minimum/maximum.
+
+    Upserts a failed flush did not confirm are resent as they were on the
+    next flush, up to ``max_pending`` of them; past that the oldest are
+    dropped. Each flush has an id that the rows record, so an upsert that
+    was applied before the failure is not applied again.
+    """
+
+    def __init__(self, collection, flush_interval=10.0, max_pending=100000):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._unsettled = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._task = None
+        self._wake = None
+
+    def add(self, reading):
+        """Fold a validated realtime_data reading into its buckets"""
+        ts = reading.timestamp
+        values = {f: getattr(reading, f) for f in FIELDS}
+        with self._lock:
+            for granularity, start_of in GRANULARITIES.items():
+                key = (reading.patient_id, granularity, start_of(ts))
+                bucket = self._pending.get(key)
+                if bucket is None:
+                    bucket = self._pending[key] = _new_bucket()
+                bucket["count"] += 1
+                for f, value in values.items():
+                    bucket["sum"][f] += value
+                    bucket["min"][f] = min(bucket["min"].get(f, value), value)
+                    bucket["max"][f] = max(bucket["max"].get(f, value), value)
+                bucket["start"] = min(bucket["start"] or ts, ts)
+                bucket["end"] = max(bucket["end"] or ts, ts)
+
+    def _take_ops(self):
+        """Upserts left over from failed flushes, then the pending buckets under a new flush id.
+        Returns ((bucket key, flush id), bucket) items and their upserts, in the same order."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            unsettled, self._unsettled = self._unsettled, {}
+
+        flush_id = uuid.uuid4().hex
+        taken = [*unsettled.items(), *(((key, flush_id), bucket) for key, bucket in pending.items())]
+        ops = [
+            UpdateOne(
+                {"patient_id": patient_id, "granularity": granularity, "bucket": bucket_start},
+                _bucket_update(flush_id, bucket),
+                upsert=True,
+            )
+            for ((patient_id, granularity, bucket_start), flush_id), bucket in taken
+        ]
+        return taken, ops
+
+    def _failed(self, taken, error):
+        """Keep the upserts a failed bulk_write did not confirm for the next flush"""
+        if isinstance(error, BulkWriteError):
+            # Unordered: every op without a write error was applied
+            failed = {err["index"] for err in error.details.get("writeErrors", [])}
+            rollup_upserts.inc(len(taken) - len(failed))
+            taken = [item for i, item in enumerate(taken) if i in failed]
+        # Otherwise any of them may have been applied; resending them under the
+        # same flush ids leaves those rows as they are
+
+        with self._lock:
+            self._unsettled.update(taken)
+            overflow = len(self._unsettled) - self.max_pending
+            if overflow > 0:
+                for key in sorted(self._unsettled, key=lambda key: key[0][2])[:overflow]:
+                    del self._unsettled[key]
+        rollup_retries.inc(len(taken))
+        if overflow > 0:
+            rollup_dropped.inc(overflow)
+        log.error(
+            "❌ Rollup flush failed, %d upserts kept for the next flush%s: %s", len(taken),
+            f", {overflow} oldest dropped" if overflow > 0 else "", error,
+        )
+
+    def flush(self):
+        taken, ops = self._take_ops()
+        if not ops:
+            return
+        try:
+            self.collection.bulk_write(ops, ordered=False)
+            rollup_upserts.inc(len(ops))
+        except PyMongoError as e:
+            self._failed(taken, e)
+
+    async def aflush(self):
+        taken, ops = self._take_ops()
+        if not ops:
+            return
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+            rollup_upserts.inc(len(ops))
+        except PyMongoError as e:
+            self._failed(taken, e)
+
+    # ---- BACKGROUND FLUSHING ----
+    def start(self):
+        def run():
+            while not self._stop.wait(self.flush_interval):
+                self.flush()
+        self._thread = threading.Thread(target=run, name="rollup-flusher", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def astart(self):
+        self._wake = asyncio.Event()
+
+        async def run():
+            while not self._stop.is_set():
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self.aflush()
+        self._task = asyncio.create_task(run())
+
+    async def aclose(self):
+        """Stop the flusher without interrupting a flush in progress, then flush the remainder"""
+        self._stop.set()
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+        await self.aflush()
+
+
+# ---- READERS ----
+def rollup_query(patient_id, granularity, since):
+    return {"patient_id": patient_id, "granularity": granularity, "bucket": {"$gte": GRANULARITIES[granularity](since)}}
+
+
+def summarize_rollups(rows):
+    """Count, means and counter deltas across rollup rows, like VitalsWindow.stats"""
+    count = sum(row["count"] for row in rows)
+    if count == 0:
+        return None
+    return {
+        "count": count,
+        "mean": {f: sum(row[f"sum_{f}"] for row in rows) / count for f in FIELDS},
+        "min": {f: min(row[f"min_{f}"] for row in rows) for f in VITALS},
+        "max": {f: max(row[f"max_{f}"] for row in rows) for f in VITALS},
+        "delta": {f: max(row[f"last_{f}"] for row in rows) - min(row[f"first_{f}"] for row in rows) for f in COUNTERS},
+    }
@@ -0,0 +1,270 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from utils.metrics import counter, gauge, histogram
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+SCHEDULER_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+job_runs = counter("agent_scheduler_runs_total", "Scheduled job runs by job and status (ok/failed/skipped)")
+job_seconds = histogram("agent_scheduler_run_seconds", "Scheduled job duration", buckets=SCHEDULER_BUCKETS)
+job_lag = gauge("agent_scheduler_start_lag_seconds", "Seconds between a run's scheduled time and its start (jitter included)")
+job_next = gauge("agent_scheduler_next_run_timestamp", "Unix time of each job's next run")
+
+
+# ---- TRIGGERS ----
+class IntervalTrigger:
+    """Every ``seconds``, aligned to the epoch so restarts keep the same slots"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def next_after(self, dt):
+        ts = dt.timestamp()
+        return datetime.fromtimestamp((ts // self.seconds + 1) * self.seconds)
+
+    def __repr__(self):
+        return f"every {self.seconds}s"
+
+
+def _cron_field(field, low, high):
+    """Values of one cron field: *, n, a-b, */n, a-b/n and comma lists"""
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-"))
+        else:
+            start = end = int(part)
+        if step and part != "*" and "-" not in part:
+            end = high
+        if not (low <= start <= end <= high):
+            raise ValueError(f"cron field {field!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, int(step or 1)))
+    return values
+
+
+class CronTrigger:
+    """Five-field cron (minute hour day-of-month month day-of-week), local time.
+
+    Day-of-week is 0-6 from Sunday (7 is Sunday too). As in cron, when both
+    day fields are restricted a day matches if either does.
+    """
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes = _cron_field(fields[0], 0, 59)
+        self.hours = _cron_field(fields[1], 0, 23)
+        self.days = _cron_field(fields[2], 1, 31)
+        self.months = _cron_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt):
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, dt):
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months or not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
+
+    def __repr__(self):
+        return self.expr
+
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_trigger(spec):
+    """'every 3h' / 'every 90s' for intervals, anything else is a cron expression"""
+    spec = spec.strip()
+    if spec.startswith("every "):
+        amount = spec[len("every "):].strip()
+        return IntervalTrigger(float(amount[:-1]) * _UNITS[amount[-1]])
+    return CronTrigger(spec)
+
+
+# ---- SCHEDULER ----
+class Job:
+    def __init__(self, name, trigger, run, jitter=0.0, max_runtime=3600.0, catch_up=True):
+        self.name = name
+        self.trigger = trigger
+        self.run = run
+        self.jitter = jitter
+        self.max_runtime = max_runtime
+        self.catch_up = catch_up
+        self.scheduled = None
+        self.due = None
+        self.running = False
+
+
+class Scheduler:
+    """Runs jobs on cron/interval triggers in a background thread.
+
+    - Jitter: each run starts a random 0..jitter seconds after its slot.
+    - Single flight: a run is skipped while the previous one is still going,
+      in this process or (through a lease in ``runs``) in another agent.
+    - Catch-up: ``runs`` remembers each job's last slot; a slot missed while
+      the agent was down runs once at startup (missed slots are coalesced).
+    """
+
+    def __init__(self, runs, workers=2):
+        self.runs = runs
+        self.owner = f"{threading.get_native_id()}-{random.getrandbits(32):08x}"
+        self.jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, name, trigger, run, **options):
+        """Register ``run(scheduled)``, called with the slot's datetime"""
+        self.jobs[name] = Job(name, trigger, run, **options)
+
+    def _last_scheduled(self, job):
+        try:
+            doc = self.runs.find_one({"_id": job.name}) or {}
+        except PyMongoError as e:
+            log.error("❌ Could not read scheduler state for %s: %s", job.name, e, extra={"job": job.name})
+            doc = {}
+        return doc.get("last_scheduled")
+
+    def _plan(self, job, now, last=None):
+        """Set the job's next slot; a missed slot after ``last`` is due immediately"""
+        missed = job.trigger.next_after(last) if (job.catch_up and last is not None) else None
+        if missed is not None and missed <= now:
+            job.scheduled, job.due = missed, now
+            log.info("⏰ %s: catching up the run scheduled for %s", job.name, f"{missed:%Y-%m-%d %H:%M}", extra={"job": job.name})
+        else:
+            job.scheduled = job.trigger.next_after(now)
+            job.due = job.scheduled + timedelta(seconds=random.uniform(0, job.jitter))
+        job_next.set(job.due.timestamp(), job=job.name)
+
+    def start(self):
+        now = datetime.now()
+        for job in self.jobs.values():
+            self._plan(job, now, self._last_scheduled(job))
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = datetime.now()
+            for job in self.jobs.values():
+                if job.due <= now:
+                    self._dispatch(job, now)
+                    self._plan(job, now)
+            wait = min((job.due - now).total_seconds() for job in self.jobs.values()) if self.jobs else 60
+            self._wake.wait(max(0.0, min(wait, 60)))
+            self._wake.clear()
+
+    def _claim(self, job, scheduled, now):
+        """Take the job's lease in ``runs`` for ``scheduled``; False if another run still holds it,
+        another agent already ran that slot, or MongoDB could not be reached"""
+        try:
+            self.runs.find_one_and_update(
+                {
+                    "_id": job.name,
+                    "$and": [
+                        {"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                        {"$or": [{"last_scheduled": None}, {"last_scheduled": {"$lt": scheduled}}]},
+                    ],
+                },
+                {"$set": {
+                    "lease_until": now + timedelta(seconds=job.max_runtime),
+                    "owner": self.owner,
+                    "last_scheduled": scheduled,
+                    "last_started": now,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+        except PyMongoError as e:
+            log.error("❌ Could not claim %s for %s: %s", job.name, f"{scheduled:%H:%M}", e, extra={"job": job.name})
+            return False
+
+    def _dispatch(self, job, now):
+        scheduled = job.scheduled
+        if job.running or not self._claim(job, scheduled, now):
+            log.info("⏭️ %s: skipping %s, still running or already taken", job.name, f"{scheduled:%H:%M}", extra={"job": job.name})
+            job_runs.inc(job=job.name, status="skipped")
+            return
+        job.running = True
+        job_lag.set((now - scheduled).total_seconds(), job=job.name)
+        self._executor.submit(self._run, job, scheduled)
+
+    def _run(self, job, scheduled):
+        started = time.monotonic()
+        status = "ok"
+        try:
+            job.run(scheduled)
+        except Exception as e:
+            status = "failed"
+            log.exception("❌ Scheduled job %s failed: %s", job.name, e, extra={"job": job.name})
+        finally:
+            elapsed = time.monotonic() - started
+            job.running = False
+            job_runs.inc(job=job.name, status=status)
+            job_seconds.observe(elapsed, job=job.name)
+            try:
+                self.runs.update_one(
+                    {"_id": job.name, "owner": self.owner},
+                    {"$set": {"lease_until": None, "last_finished": datetime.now(), "last_status": status, "last_seconds": elapsed}},
+                )
+            except PyMongoError as e:
+                log.error("❌ Could not record scheduler run for %s: %s", job.name, e, extra={"job": job.name})
+
+    def close(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+
+def fan_out(run, patient_ids, workers):
+    """Run ``run(patient_id)`` for every patient on a thread pool; returns {patient_id: exception or None}"""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fan-out") as pool:
+        futures = {patient_id: pool.submit(run, patient_id) for patient_id in patient_ids}
+    return {patient_id: future.exception() for patient_id, future in futures.items()}
+
+
+async def afan_out(run, patient_ids, limit):
+    """fan_out for coroutines: at most ``limit`` ``run(patient_id)`` at once on the running loop"""
+    slots = asyncio.Semaphore(limit)
+
+    async def one(patient_id):
+        async with slots:
+            await run(patient_id)
+
+    results = await asyncio.gather(*(one(patient_id) for patient_id in patient_ids), return_exceptions=True)
+    return {patient_id: result for patient_id, result in zip(patient_ids, results)}
@@ -1,24 +1,96 @@
+import threading
 from config.db import call_sms_history_collection
+from config import async_db, settings
 from datetime import datetime, timezone
+from models.call_sms_history import call_sms_history
 
-def cooled_off(type):
-    latest_doc = call_sms_history_collection.find_one(
-        {"type": type}, 
-        sort=[("timestamp", -1)],
-        projection={"timestamp": 1, "_id": 0}
-    )
 
-    if latest_doc:
-        timestamp = latest_doc["timestamp"]
+def _as_utc(timestamp):
+    # Make it aware in UTC
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
 
-        # Make it aware in UTC
-        if timestamp.tzinfo is None:
-            timestamp = timestamp.replace(tzinfo=timezone.utc)
 
-        diff = (datetime.now(timezone.utc) - timestamp).total_seconds() / 60
-        if diff > 30:
+# Latest history timestamp per (patient, action type), in one round-trip
+LATEST_BY_TYPE = [
+    {"$group": {
+        "_id": {"patient_id": {"$ifNull": ["$patient_id", settings.DEFAULT_PATIENT_ID]}, "type": "$type"},
+        "timestamp": {"$max": "$timestamp"},
+    }},
+]
+
+
+class CooldownTracker:
+    """Last call/SMS time per patient and action type, kept in memory.
+
+    Loaded from call_sms_history once, then updated by ``record`` in the same
+    call that writes the history document, so cooldown checks never touch
+    MongoDB.
+    """
+
+    def __init__(self, windows, default_minutes=30):
+        self.windows = windows
+        self.default_minutes = default_minutes
+        self._last = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def _apply(self, docs):
+        with self._lock:
+            for doc in docs:
+                key = (doc["_id"]["patient_id"], doc["_id"]["type"])
+                self._last[key] = _as_utc(doc["timestamp"])
+            self.loaded = True
+
+    def load(self, collection=None):
+        collection = collection if collection is not None else call_sms_history_collection
+        self._apply(collection.aggregate(LATEST_BY_TYPE))
+
+    async def aload(self, collection=None):
+        collection = collection if collection is not None else async_db.call_sms_history_collection
+        cursor = await collection.aggregate(LATEST_BY_TYPE)
+        self._apply(await cursor.to_list())
+
+    def cooled_off(self, patient_id, type, now=None):
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            last = self._last.get((patient_id, type))
+        if last is None:
             return True
-        else:
-            return False
-    else:
-        return True
\ No newline at end of file
+        diff = (now - last).total_seconds() / 60
+        return diff > self.windows.get(type, self.default_minutes)
+
+    def for_patient(self, patient_id):
+        """``cooled_off(type)`` bound to one patient, as triage expects"""
+        return lambda type: self.cooled_off(patient_id, type)
+
+    def _mark(self, patient_id, type):
+        doc = call_sms_history(patient_id = patient_id, type = type, timestamp = datetime.now(timezone.utc)).model_dump()
+        with self._lock:
+            self._last[(patient_id, type)] = doc["timestamp"]
+        return doc
+
+    def record(self, patient_id, type, collection=None):
+        """Start the patient's cooldown for ``type`` and write its history document"""
+        collection = collection if collection is not None else call_sms_history_collection
+        collection.insert_one(self._mark(patient_id, type))
+
+    async def arecord(self, patient_id, type, collection=None):
+        collection = collection if collection is not None else async_db.call_sms_history_collection
+        await collection.insert_one(self._mark(patient_id, type))
+
+
+cooldowns = CooldownTracker(settings.COOLDOWN_MINUTES, settings.DEFAULT_COOLDOWN_MINUTES)
+
+
+def cooled_off(patient_id, type):
+    if not cooldowns.loaded:
+        cooldowns.load()
+    return cooldowns.cooled_off(patient_id, type)
+
+
+async def acooled_off(patient_id, type):
+    if not cooldowns.loaded:
+        await cooldowns.aload()
+    return cooldowns.cooled_off(patient_id, type)
@@ -0,0 +1,236 @@
+# Sustained-condition rules for the emergency workflow. A threshold alert
+# only escalates once a rule for its level holds over the patient's recent
+# readings, e.g. "heart_rate > 110 for 30s" or "spo2 < 93 in 4/6", so a
+# single out-of-range sample no longer places a call. Every rule keeps a
+# sliding window per patient with monotonic-deque min/max, a running sum and
+# a running count of matching samples, updated in amortized O(1) per reading.
+# A window restarts after a gap in the readings longer than max_gap, so a
+# condition is only confirmed by readings that actually cover its duration.
+import operator
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from config import settings
+from utils.idle import IdleTracker
+from utils.metrics import counter
+from utils.reading_columns import VITALS
+
+gated_readings = counter("agent_sustained_gated_total", "Out-of-range readings held back because no sustained rule confirmed them, by threshold status")
+
+LEVELS = ("small_alert", "high_alert")
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+_UNITS = {"s": 1, "m": 60, "h": 3600}
+_RULE = re.compile(
+    r"(?P<level>\w+)\s*:\s*(?P<vital>\w+)\s*(?P<op>>=|<=|>|<)\s*(?P<threshold>-?\d+(?:\.\d+)?)\s+"
+    r"(?:for\s+(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>[smh])|in\s+(?P<k>\d+)\s*/\s*(?P<n>\d+))"
+)
+
+
+class Rule:
+    """``level: vital op threshold for <n>s|m|h`` (every reading over that long)
+    or ``level: vital op threshold in k/n`` (k of the last n readings)"""
+
+    def __init__(self, level, vital, op, threshold, seconds=None, k=None, n=None):
+        self.level = level
+        self.vital = vital
+        self.op = op
+        self.threshold = threshold
+        self.seconds = seconds
+        self.k = k
+        self.n = n
+
+    def test(self, value):
+        return OPS[self.op](value, self.threshold)
+
+    def window(self, max_gap=None):
+        return SlidingWindow(self.test, seconds=self.seconds, size=self.n, max_gap=max_gap)
+
+    def holds(self, window):
+        if self.k is not None:
+            return window.matches >= self.k
+        # The window reaches back to a reading at least `seconds` old, and even its
+        # most lenient value (min for >, max for <) is past the threshold
+        if not window.covers(self.seconds):
+            return False
+        return self.test(window.min() if self.op[0] == ">" else window.max())
+
+    def __str__(self):
+        condition = f"for {self.seconds:g}s" if self.k is None else f"in {self.k}/{self.n}"
+        return f"{self.level}: {self.vital} {self.op} {self.threshold:g} {condition}"
+
+
+def parse_rules(spec):
+    """Rules from a ';'-separated spec; empty or "off" means no rules"""
+    if spec.strip().lower() in ("", "off"):
+        return []
+    rules = []
+    for part in spec.split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        match = _RULE.fullmatch(part)
+        if match is None:
+            raise ValueError(f"Cannot parse sustained rule {part!r}")
+        level, vital = match["level"], match["vital"]
+        if level not in LEVELS:
+            raise ValueError(f"Unknown alert level {level!r} in {part!r}, expected one of {LEVELS}")
+        if vital not in VITALS:
+            raise ValueError(f"Unknown vital {vital!r} in {part!r}, expected one of {VITALS}")
+        if match["k"] is None:
+            rule = Rule(level, vital, match["op"], float(match["threshold"]), seconds=float(match["amount"]) * _UNITS[match["unit"]])
+        else:
+            k, n = int(match["k"]), int(match["n"])
+            if not 0 < k <= n:
+                raise ValueError(f"Sustained rule {part!r} needs 0 < k <= n")
+            rule = Rule(level, vital, match["op"], float(match["threshold"]), k=k, n=n)
+        rules.append(rule)
+    return rules
+
+
+class SlidingWindow:
+    """Recent readings of one vital: the last ``size`` readings, or for a time
+    window every reading since the last one at least ``seconds`` old. Readings
+    before a gap longer than ``max_gap`` seconds are dropped.
+
+    ``mins``/``maxs`` are monotonic deques of (seq, value), so the front is the
+    window's min/max; ``total`` and ``matches`` are running sums.
+    """
+
+    __slots__ = ("test", "seconds", "size", "max_gap", "samples", "mins", "maxs", "total", "matches", "seq")
+
+    def __init__(self, test, seconds=None, size=None, max_gap=None):
+        self.test = test
+        self.seconds = seconds
+        self.size = size
+        self.max_gap = max_gap
+        self.samples = deque()  # (seq, ts, value, matched)
+        self.mins = deque()
+        self.maxs = deque()
+        self.total = 0.0
+        self.matches = 0
+        self.seq = 0
+
+    def add(self, ts, value):
+        if self.samples and ts < self.samples[-1][1]:
+            return False
+        if self.samples and self.max_gap and ts - self.samples[-1][1] > self.max_gap:
+            self.clear()
+        matched = self.test(value)
+        self.seq += 1
+        self.samples.append((self.seq, ts, value, matched))
+        self.total += value
+        self.matches += matched
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        self.mins.append((self.seq, value))
+        while self.maxs and self.maxs[-1][1] <= value:
+            self.maxs.pop()
+        self.maxs.append((self.seq, value))
+
+        if self.size is not None:
+            while len(self.samples) > self.size:
+                self._evict()
+        else:
+            while len(self.samples) > 1 and self.samples[1][1] <= ts - self.seconds:
+                self._evict()
+        return True
+
+    def clear(self):
+        self.samples.clear()
+        self.mins.clear()
+        self.maxs.clear()
+        self.total = 0.0
+        self.matches = 0
+
+    def _evict(self):
+        seq, _, value, matched = self.samples.popleft()
+        self.total -= value
+        self.matches -= matched
+        if self.mins[0][0] == seq:
+            self.mins.popleft()
+        if self.maxs[0][0] == seq:
+            self.maxs.popleft()
+
+    def covers(self, seconds):
+        return bool(self.samples) and self.samples[-1][1] - self.samples[0][1] >= seconds
+
+    def min(self):
+        return self.mins[0][1]
+
+    def max(self):
+        return self.maxs[0][1]
+
+    def stats(self):
+        count = len(self.samples)
+        return {
+            "count": count,
+            "matches": self.matches,
+            "min": self.min(),
+            "max": self.max(),
+            "mean": self.total / count,
+            "span_seconds": self.samples[-1][1] - self.samples[0][1],
+        }
+
+
+class SustainedRules:
+    """Per-patient rule windows, and which alert levels they currently confirm.
+
+    A level with no rules is always confirmed, so it escalates on a single
+    reading as before. ``confirmed`` and ``evidence`` are lookups for the
+    ingest fast path and the graph; ``update`` does the work per reading.
+    A patient's windows are dropped after ``idle_seconds`` without readings.
+    """
+
+    def __init__(self, rules, max_gap=None, idle_seconds=0):
+        self.rules = rules
+        self.max_gap = max_gap
+        self.ungated = frozenset(LEVELS) - {rule.level for rule in rules}
+        self._windows = {}
+        self._confirmed = {}
+        self._idle = IdleTracker(idle_seconds)
+        self._lock = threading.Lock()
+
+    def update(self, patient_id, reading):
+        """Fold a validated realtime_data reading (or dict with a datetime ``timestamp``) into the patient's windows"""
+        if not isinstance(reading, dict):
+            reading = {f: getattr(reading, f) for f in VITALS + ("timestamp",)}
+        timestamp = reading["timestamp"]
+        ts = timestamp.timestamp() if isinstance(timestamp, datetime) else float(timestamp)
+        with self._lock:
+            for idle in self._idle.touch(patient_id):
+                self._windows.pop(idle, None)
+                self._confirmed.pop(idle, None)
+                self._idle.forget(idle)
+            windows = self._windows.get(patient_id)
+            if windows is None:
+                windows = self._windows[patient_id] = [rule.window(self.max_gap) for rule in self.rules]
+            confirmed = set(self.ungated)
+            for rule, window in zip(self.rules, windows):
+                value = reading.get(rule.vital)
+                if value is not None:
+                    window.add(ts, value)
+                if window.samples and rule.holds(window):
+                    confirmed.add(rule.level)
+            self._confirmed[patient_id] = frozenset(confirmed)
+
+    def confirmed(self, patient_id):
+        """Alert levels a reading of this patient may escalate to right now"""
+        return self._confirmed.get(patient_id, self.ungated)
+
+    def evidence(self, patient_id, level):
+        """Window statistics of the rules confirming ``level``, for the alert"""
+        with self._lock:
+            windows = self._windows.get(patient_id, ())
+            return [
+                {"rule": str(rule), **window.stats()}
+                for rule, window in zip(self.rules, windows)
+                if rule.level == level and window.samples and rule.holds(window)
+            ]
+
+
+sustained = SustainedRules(
+    parse_rules(settings.SUSTAINED_RULES),
+    max_gap=settings.SUSTAINED_MAX_GAP_SECONDS,
+    idle_seconds=settings.PATIENT_IDLE_SECONDS,
+)
@@ -0,0 +1,86 @@
+# Timing hooks and counters for the ingest path, the LangGraph nodes and MongoDB,
+# served with everything else in utils/metrics.py from the /metrics endpoint.
+import functools
+import inspect
+import threading
+import time
+from pymongo import monitoring
+from utils.metrics import counter, gauge, histogram, on_scrape
+
+NODE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 120)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+events_received = counter("agent_events_received_total", "Socket.IO events received by event name")
+validation_failures = counter("agent_validation_failures_total", "Socket.IO payloads that failed model validation, by event name")
+alerts_sent = counter("agent_alerts_total", "Alerts raised by the emergency workflow, by type")
+cooldown_suppressed = counter("agent_cooldown_suppressed_total", "Alerts held back because their type was still cooling down, by type")
+decision_lag = histogram(
+    "agent_alert_decision_lag_seconds",
+    "Seconds from the device timestamp to the alert decision, by decision and path (fast/graph)",
+    buckets=LAG_BUCKETS,
+)
+workflows_inflight = gauge("agent_workflows_inflight", "Emergency workflow runs currently executing")
+node_seconds = histogram("agent_node_seconds", "LangGraph node duration by workflow and node", buckets=NODE_BUCKETS)
+mongo_seconds = histogram("agent_mongo_command_seconds", "MongoDB command duration by command and outcome (ok/failed)", buckets=MONGO_BUCKETS)
+threads_active = gauge("agent_threads", "Live Python threads")
+
+on_scrape(lambda: threads_active.set(threading.active_count()))
+
+
+# ---- ALERT PATH ----
+# Cooldown type checked by triage for each alerting status
+COOLDOWN_TYPE = {"small_alert": "emergency_sms", "high_alert": "emergency_call"}
+
+
+def record_decision(data, status, decision, path):
+    """Lag from the reading's device timestamp (epoch ms) to ``decision``, and any cooldown suppression.
+
+    ``status`` is the threshold status of the reading after sustained-condition
+    rules (sustained_status) and ``decision`` what triage made of it after cooldowns.
+    """
+    timestamp = data.get("timestamp")
+    if isinstance(timestamp, (int, float)):
+        # Device clocks can run ahead of ours
+        decision_lag.observe(max(0.0, time.time() - timestamp / 1000), decision=decision, path=path)
+    if status in COOLDOWN_TYPE and decision != status:
+        cooldown_suppressed.inc(type=COOLDOWN_TYPE[status])
+
+
+# ---- NODES ----
+def timed_node(workflow, name, node):
+    """``node`` wrapped to record agent_node_seconds; async nodes stay async for ainvoke"""
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def timed(state):
+            started = time.perf_counter()
+            try:
+                return await node(state)
+            finally:
+                node_seconds.observe(time.perf_counter() - started, workflow=workflow, node=name)
+    else:
+        @functools.wraps(node)
+        def timed(state):
+            started = time.perf_counter()
+            try:
+                return node(state)
+            finally:
+                node_seconds.observe(time.perf_counter() - started, workflow=workflow, node=name)
+    return timed
+
+
+# ---- MONGODB ----
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command timings from the driver, for every collection, sync and async clients alike"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        mongo_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome="failed")
+
+
+mongo_commands = MongoCommandMetrics()
@@ -0,0 +1,122 @@
+# Compact prompt context for the trend analysis in workflow/diagnose.py.
+# The trends dicts from utils/trends.py are rendered as short CSV-style tables
+# with rounded numbers instead of indented JSON, then coarsened step by step
+# (fewer recent days, two- and four-week rows) until they fit the token budget.
+import json
+from utils.metrics import histogram
+
+context_tokens = histogram(
+    "agent_trend_context_tokens",
+    "Estimated prompt tokens of the trend analysis context",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 5000, 10000, 20000),
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English, digits and punctuation)"""
+    return (len(text) + 3) // 4
+
+
+def _num(value, digits=1):
+    if value is None:
+        return ""
+    value = round(value, digits)
+    return str(int(value)) if digits == 0 or value == int(value) else str(value)
+
+
+def _merge_weeks(rows, span):
+    """Combine ``span`` consecutive weekly rows (newest first) into one, weighting averages by record count"""
+    merged = []
+    for i in range(0, len(rows), span):
+        group = rows[i:i + span]
+        count = sum(row["record_count"] for row in group) or 1
+        label = group[-1]["week"] if len(group) == 1 else f"{group[-1]['week']}..{group[0]['week'][-3:]}"
+        merged.append({
+            "week": label,
+            **{f: sum(row[f] * row["record_count"] for row in group) / count for f in ("avg_hr", "avg_spo2", "avg_stress")},
+            "total_steps": sum(row["total_steps"] for row in group),
+            "total_calories": sum(row["total_calories"] for row in group),
+            "record_count": sum(row["record_count"] for row in group),
+        })
+    return merged
+
+
+def encode_realtime(trends, week_span=1):
+    if not trends:
+        return "no realtime data"
+    overall = trends["overall_averages"]
+    rows = [{"week": week, **values} for week, values in trends["weekly_averages"].items()]
+    if week_span > 1:
+        rows = _merge_weeks(rows, week_span)
+
+    lines = [
+        f"records={trends['total_records']} from={trends['date_range']['start'][:10]} to={trends['date_range']['end'][:10]}",
+        f"overall hr={_num(overall['heart_rate'])} spo2={_num(overall['spo2'])} stress={_num(overall['stress_level'])}",
+        "week,hr,spo2,stress,steps,kcal,n (newest first)",
+    ]
+    for row in rows:
+        lines.append(",".join([
+            row["week"], _num(row["avg_hr"]), _num(row["avg_spo2"]), _num(row["avg_stress"]),
+            _num(row["total_steps"], 0), _num(row["total_calories"], 0), str(row["record_count"]),
+        ]))
+    return "\n".join(lines)
+
+
+def encode_daily(trends, recent=14):
+    if not trends:
+        return "no daily data"
+    sleep, nutrition = trends["sleep_analysis"], trends["nutrition_analysis"]
+    energy, hydration = trends["energy_trends"], trends["hydration_trends"]
+    quality = sleep["quality_distribution"]
+
+    lines = [
+        f"days={trends['total_days']}",
+        f"sleep avg_min={_num(sleep['average_duration'], 0)} quality good/average/poor={quality['good']}/{quality['average']}/{quality['poor']}",
+        f"nutrition avg_kcal={_num(nutrition['avg_calories'], 0)} avg_protein_g={_num(nutrition['avg_protein'], 0)}",
+        f"energy avg={_num(energy['average_score'])} hydration avg_l={_num(hydration['average_intake'], 2)}",
+    ]
+    if recent:
+        days = min(recent, 7)
+        if sleep["recent_pattern"][:days]:
+            lines.append("recent sleep date,min,quality: " + "; ".join(
+                f"{p['date'][5:10]},{p['duration']},{p['quality'][0]}" for p in sleep["recent_pattern"][:days]))
+        if nutrition["recent_pattern"][:days]:
+            lines.append("recent meals date,kcal,protein,carbs,fat: " + "; ".join(
+                f"{p['date'][5:10]},{p['calories']},{p['protein']},{p['carbs']},{p['fat']}" for p in nutrition["recent_pattern"][:days]))
+        if energy["recent_scores"][:recent]:
+            lines.append("recent energy (newest first): " + ",".join(_num(v) for v in energy["recent_scores"][:recent]))
+        if hydration["recent_intake"][:recent]:
+            lines.append("recent water_l (newest first): " + ",".join(_num(v, 2) for v in hydration["recent_intake"][:recent]))
+    return "\n".join(lines)
+
+
+# Coarsening steps, tried in order until the context fits: (weekly row span, recent days)
+LEVELS = ((1, 14), (1, 7), (2, 7), (2, 3), (4, 3), (4, 0), (13, 0))
+
+
+def build_trend_context(realtime_trends, daily_trends, budget):
+    """Compact realtime/daily texts within ``budget`` tokens, plus a size report.
+
+    The report has the estimated ``tokens``, the ``json_tokens`` of the old
+    indented-JSON encoding and the ``reduction`` between them.
+    """
+    for week_span, recent in LEVELS:
+        realtime_text = encode_realtime(realtime_trends, week_span)
+        daily_text = encode_daily(daily_trends, recent)
+        tokens = estimate_tokens(realtime_text) + estimate_tokens(daily_text)
+        if tokens <= budget:
+            break
+
+    json_tokens = (
+        estimate_tokens(json.dumps(realtime_trends, indent=2, default=str))
+        + estimate_tokens(json.dumps(daily_trends, indent=2, default=str))
+    )
+    context_tokens.observe(tokens)
+    report = {
+        "tokens": tokens,
+        "json_tokens": json_tokens,
+        "reduction": 1 - tokens / json_tokens if json_tokens else 0.0,
+        "week_span": week_span,
+        "recent_days": recent,
+    }
+    return realtime_text, daily_text, report
@@ -0,0 +1,232 @@
+# Server-side aggregation for the 3-month trend analysis in workflow/diagnose.py.
+# MongoDB groups the raw documents; Python only turns the small summary into the
+# trends dicts the prompt expects. Groups carry sums and counts (not averages)
+# so partial results can be merged before averaging.
+
+VITALS_SUMS = {
+    "sum_hr": {"$sum": "$heart_rate"},
+    "sum_spo2": {"$sum": "$spo2"},
+    "sum_stress": {"$sum": "$stress_level"},
+    "total_steps": {"$sum": "$steps"},
+    "total_calories": {"$sum": "$calories_burned"},
+    "record_count": {"$sum": 1},
+}
+
+
+def _present(path):
+    """1 if the field is set on the document, else 0 (missing and null sort below every value)"""
+    return {"$cond": [{"$gt": [path, None]}, 1, 0]}
+
+
+def realtime_trends_pipeline(match):
+    return [
+        {"$match": match},
+        {"$facet": {
+            "weekly": [
+                {"$group": {
+                    "_id": {"year": {"$isoWeekYear": "$timestamp"}, "week": {"$isoWeek": "$timestamp"}},
+                    **VITALS_SUMS,
+                }},
+            ],
+            "overall": [
+                {"$group": {
+                    "_id": None,
+                    **VITALS_SUMS,
+                    "start": {"$min": "$timestamp"},
+                    "end": {"$max": "$timestamp"},
+                }},
+            ],
+        }},
+    ]
+
+
+def daily_trends_pipeline(match, recent=14):
+    return [
+        {"$match": match},
+        {"$sort": {"timestamp": -1}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_days": {"$sum": 1},
+                    "sleep_duration_sum": {"$sum": "$sleep.duration"},
+                    "sleep_count": {"$sum": _present("$sleep")},
+                    "calories_sum": {"$sum": "$nutrition.calories"},
+                    "protein_sum": {"$sum": "$nutrition.protein"},
+                    "nutrition_count": {"$sum": _present("$nutrition")},
+                    "energy_sum": {"$sum": "$energy_score"},
+                    "energy_count": {"$sum": _present("$energy_score")},
+                    "water_sum": {"$sum": "$water_intake"},
+                    "water_count": {"$sum": _present("$water_intake")},
+                }},
+            ],
+            "sleep_quality": [
+                {"$match": {"sleep.quality": {"$exists": True}}},
+                {"$group": {"_id": "$sleep.quality", "count": {"$sum": 1}}},
+            ],
+            "recent": [
+                {"$limit": recent},
+                {"$project": {"_id": 0, "timestamp": 1, "sleep": 1, "nutrition": 1, "energy_score": 1, "water_intake": 1}},
+            ],
+        }},
+    ]
+
+
+def week_key(group_id):
+    return f"{group_id['year']}-W{group_id['week']:02d}"
+
+
+def _averages(group):
+    count = group["record_count"]
+    return {
+        "heart_rate": group["sum_hr"] / count,
+        "spo2": group["sum_spo2"] / count,
+        "stress_level": group["sum_stress"] / count,
+    }
+
+
+def realtime_trends_from(weekly, overall):
+    """Trends dict from the realtime pipeline's weekly and overall groups"""
+    if not overall or not overall[0]["record_count"]:
+        return {}
+
+    weekly_averages = {}
+    for group in sorted(weekly, key=lambda g: (g["_id"]["year"], g["_id"]["week"]), reverse=True):
+        averages = _averages(group)
+        weekly_averages[week_key(group["_id"])] = {
+            "avg_hr": averages["heart_rate"],
+            "avg_spo2": averages["spo2"],
+            "avg_stress": averages["stress_level"],
+            "total_steps": group["total_steps"],
+            "total_calories": group["total_calories"],
+            "record_count": group["record_count"]
+        }
+
+    totals = overall[0]
+    return {
+        "total_records": totals["record_count"],
+        "date_range": {
+            "start": totals["start"].isoformat(),
+            "end": totals["end"].isoformat()
+        },
+        "weekly_averages": weekly_averages,
+        "overall_averages": _averages(totals)
+    }
+
+
+def _ratio(total, count):
+    return total / count if count else 0
+
+
+def daily_trends_from(totals, sleep_quality, recent):
+    """Trends dict from the daily pipeline's facets; ``recent`` is newest first"""
+    if not totals or not totals[0]["total_days"]:
+        return {}
+    totals = totals[0]
+
+    quality_distribution = {"good": 0, "average": 0, "poor": 0}
+    for row in sleep_quality:
+        if row["_id"] in quality_distribution:
+            quality_distribution[row["_id"]] = row["count"]
+
+    sleep_patterns = [
+        {"duration": r["sleep"]["duration"], "quality": r["sleep"]["quality"], "date": r["timestamp"].isoformat()}
+        for r in recent if "sleep" in r
+    ]
+    nutrition_patterns = [
+        {**{k: r["nutrition"][k] for k in ("calories", "protein", "carbs", "fat")}, "date": r["timestamp"].isoformat()}
+        for r in recent if "nutrition" in r
+    ]
+
+    return {
+        "total_days": totals["total_days"],
+        "sleep_analysis": {
+            "average_duration": _ratio(totals["sleep_duration_sum"], totals["sleep_count"]),
+            "quality_distribution": quality_distribution,
+            "recent_pattern": sleep_patterns[:7]
+        },
+        "nutrition_analysis": {
+            "avg_calories": _ratio(totals["calories_sum"], totals["nutrition_count"]),
+            "avg_protein": _ratio(totals["protein_sum"], totals["nutrition_count"]),
+            "recent_pattern": nutrition_patterns[:7]
+        },
+        "energy_trends": {
+            "average_score": _ratio(totals["energy_sum"], totals["energy_count"]),
+            "recent_scores": [r["energy_score"] for r in recent if "energy_score" in r][:14]
+        },
+        "hydration_trends": {
+            "average_intake": _ratio(totals["water_sum"], totals["water_count"]),
+            "recent_intake": [r["water_intake"] for r in recent if "water_intake" in r][:14]
+        }
+    }
+
+
+# Rollup field -> trend group field
+ROLLUP_SUMS = {
+    "sum_hr": "sum_heart_rate",
+    "sum_spo2": "sum_spo2",
+    "sum_stress": "sum_stress_level",
+    "total_steps": "sum_steps",
+    "total_calories": "sum_calories_burned",
+    "record_count": "count",
+}
+
+
+def trend_groups_from_rollups(rows):
+    """Weekly and overall groups, shaped like the realtime pipeline's facets, from day rollup rows"""
+    weekly = {}
+    overall = {"_id": None, **{k: 0 for k in ROLLUP_SUMS}, "start": None, "end": None}
+    for row in rows:
+        year, week, _ = row["bucket"].isocalendar()
+        group = weekly.setdefault((year, week), {"_id": {"year": year, "week": week}, **{k: 0 for k in ROLLUP_SUMS}})
+        for field, source in ROLLUP_SUMS.items():
+            group[field] += row[source]
+            overall[field] += row[source]
+        overall["start"] = min(overall["start"] or row["start"], row["start"])
+        overall["end"] = max(overall["end"] or row["end"], row["end"])
+
+    return list(weekly.values()), ([overall] if overall["record_count"] else [])
+
+
+# ---- MERGING ----
+# Combine the same groups from two sources (MongoDB and the cold archive in
+# utils/archive.py); either side may be None.
+def merge_realtime_groups(a, b):
+    if not a or not b:
+        return a or b
+    weekly = {}
+    for group in a["weekly"] + b["weekly"]:
+        key = (group["_id"]["year"], group["_id"]["week"])
+        merged = weekly.setdefault(key, {"_id": group["_id"], **{k: 0 for k in ROLLUP_SUMS}})
+        for field in ROLLUP_SUMS:
+            merged[field] += group[field]
+
+    overall = a["overall"] + b["overall"]
+    if len(overall) > 1:
+        first, second = overall
+        overall = [{
+            "_id": None,
+            **{field: first[field] + second[field] for field in ROLLUP_SUMS},
+            "start": min(first["start"], second["start"]),
+            "end": max(first["end"], second["end"]),
+        }]
+    return {"weekly": list(weekly.values()), "overall": overall}
+
+
+def merge_daily_groups(a, b, recent=14):
+    if not a or not b:
+        return a or b
+    totals = a["totals"] + b["totals"]
+    if len(totals) > 1:
+        totals = [{field: (value if field == "_id" else value + totals[1][field]) for field, value in totals[0].items()}]
+
+    quality = {}
+    for row in a["sleep_quality"] + b["sleep_quality"]:
+        quality[row["_id"]] = quality.get(row["_id"], 0) + row["count"]
+
+    newest = sorted(a["recent"] + b["recent"], key=lambda r: r["timestamp"], reverse=True)[:recent]
+    return {
+        "totals": totals,
+        "sleep_quality": [{"_id": q, "count": count} for q, count in quality.items()],
+        "recent": newest,
+    }
@@ -0,0 +1,99 @@
+# Threshold rules of the emergency workflow, kept free of LangGraph/LLM imports
+# so the ingest path can apply them to every reading cheaply.
+
+# Urgency of each triage decision; queued workflows are never displaced by a less urgent one
+SEVERITY = {"normal": 0, "baseline_deviation": 1, "small_alert": 2, "high_stress": 3, "high_alert": 4}
+
+def classify_vitals(data):
+    """Threshold status of a single reading: normal, small_alert or high_alert"""
+    heart_rate, spo2, stress = data.get("heart_rate"), data.get("spo2"), data.get("stress_level")
+
+    status_list = []
+
+    # check heart rate
+    if 60 <= heart_rate <= 100:
+        status_list.append("Normal")
+    elif 50 <= heart_rate <= 59 or 101 <= heart_rate <= 110:
+        status_list.append("Low Alert")
+    else:
+        status_list.append("High Alert")
+
+    # check SpO2
+    if 95 <= spo2 <= 100:
+        status_list.append("Normal")
+    elif 93 <= spo2 <= 94:
+        status_list.append("Low Alert")
+    else:
+        status_list.append("High Alert")
+
+    # check stress level
+    if 0 <= stress <= 40:
+        status_list.append("Normal")
+    elif 41 <= stress <= 60:
+        status_list.append("Low Alert")
+
+
+    # determine final status
+    if "High Alert" in status_list:
+        return "high_alert"
+    elif "Low Alert" in status_list:
+        return "small_alert"
+    else:
+        return "normal"
+
+
+def vitals_findings(data):
+    """Plain-language findings for the vitals outside their normal range"""
+    heart_rate, spo2, stress = data.get("heart_rate"), data.get("spo2"), data.get("stress_level")
+
+    findings = []
+    if heart_rate > 100:
+        findings.append("a high heart rate")
+    elif heart_rate < 60:
+        findings.append("a low heart rate")
+    if spo2 < 95:
+        findings.append("lower oxygen levels")
+    if stress > 40:
+        findings.append("raised stress")
+    return findings
+
+
+def sustained_status(status, confirmed):
+    """Threshold status once sustained-condition rules are applied: an alert level
+    stands only if ``confirmed`` includes it, otherwise it drops a level"""
+    if confirmed is None:
+        return status
+    if status == "high_alert" and status not in confirmed:
+        status = "small_alert"
+    if status == "small_alert" and status not in confirmed:
+        status = "normal"
+    return status
+
+
+def triage(data, cooled_off, deviating=(), confirmed=None):
+    """Decision hardcoded_checks makes for a reading: normal, small_alert, high_alert,
+    high_stress or baseline_deviation.
+
+    ``cooled_off(type)`` says whether an action type is out of its cooldown,
+    ``deviating`` lists the vitals off the patient's personal baseline (utils/baselines.py)
+    and ``confirmed`` the alert levels its sustained-condition rules currently
+    confirm (utils/sustained.py); None skips that gate.
+    """
+    status = classify_vitals(data)
+    final_status = sustained_status(status, confirmed)
+
+    if(
+        (final_status == "high_alert" and not(cooled_off("emergency_call")))
+        or
+        (final_status == "small_alert" and not(cooled_off("emergency_sms")))
+    ):
+        final_status = "normal"
+    
+    if(final_status == "normal" and data.get("stress_level") > 60 and cooled_off("therapist_call")):
+        final_status = "high_stress"
+
+    # Within the population thresholds, but not normal for this patient
+    if status == "normal" and final_status == "normal" and deviating and cooled_off("baseline_sms"):
+        final_status = "baseline_deviation"
+    
+    return final_status
@@ -0,0 +1,254 @@
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from config import settings
+from utils.idle import IdleTracker
+from utils.reading_columns import FIELDS, VITALS, COUNTERS, columns_by_patient, append_by_patient
+
+INF = float("inf")
+
+
+class VitalsWindow:
+    """Ring buffer of the most recent realtime readings.
+
+    Every column is an ``array`` indexed by ring slot. Alongside the raw values
+    each field keeps a running total (so a window sum is two lookups) and each
+    vital a min and max segment tree over the slots. A time window is located by
+    binary search on the timestamp column, so mean, delta and count are O(log n)
+    for the lookup plus O(1), and min/max are O(log n).
+
+    Readings must arrive in timestamp order; older ones are ignored. The ring
+    starts at ``initial_capacity`` slots and doubles whenever it fills, up to
+    ``capacity``; after that each reading overwrites the oldest, so ``stats``
+    reports whether its window is still complete.
+    """
+
+    def __init__(self, capacity=4096, initial_capacity=None):
+        self.max_capacity = capacity
+        self.capacity = min(initial_capacity or capacity, capacity)
+        self._lock = threading.Lock()
+        self._ts = array("d", [0.0]) * self.capacity
+        self._values = {f: array("d", [0.0]) * self.capacity for f in FIELDS}
+        self._totals = {f: array("d", [0.0]) * self.capacity for f in FIELDS}
+        self._min_tree = {f: array("d", [INF]) * (2 * self.capacity) for f in VITALS}
+        self._max_tree = {f: array("d", [-INF]) * (2 * self.capacity) for f in VITALS}
+        self._running = {f: 0.0 for f in FIELDS}
+        self._head = 0  # next slot to write
+        self._size = 0
+        self._evicted = -INF  # timestamp of the newest overwritten reading
+
+    def __len__(self):
+        return self._size
+
+    # ---- WRITES ----
+    def append(self, timestamp, reading):
+        """Add one reading. ``timestamp`` is epoch seconds, ``reading`` maps FIELDS to numbers."""
+        with self._lock:
+            if self._size and timestamp < self._ts[(self._head - 1) % self.capacity]:
+                return False
+
+            if self._size == self.capacity < self.max_capacity:
+                self._grow()
+            slot = self._head
+            if self._size == self.capacity:
+                self._evicted = self._ts[slot]
+            self._ts[slot] = timestamp
+            for f in FIELDS:
+                value = float(reading[f])
+                self._values[f][slot] = value
+                self._running[f] += value
+                self._totals[f][slot] = self._running[f]
+            for f in VITALS:
+                value = self._values[f][slot]
+                self._tree_set(self._min_tree[f], slot, value, min)
+                self._tree_set(self._max_tree[f], slot, value, max)
+
+            self._head = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+            return True
+
+    def append_reading(self, reading):
+        """Add a Mongo document or validated realtime_data model whose ``timestamp`` is a datetime."""
+        if not isinstance(reading, dict):
+            reading = {f: getattr(reading, f) for f in FIELDS + ("timestamp",)}
+        return self.append(reading["timestamp"].timestamp(), reading)
+
+    def extend(self, columns):
+        """Add every reading of a ReadingColumns (or slice); returns how many were taken"""
+        ts = columns.ts
+        values = [columns[f] for f in FIELDS]
+        added = 0
+        for i in range(len(ts)):
+            added += self.append(ts[i], dict(zip(FIELDS, (column[i] for column in values))))
+        return added
+
+    def _grow(self):
+        """Double a full ring, up to max_capacity. The oldest reading moves to slot 0 and
+        the trees are rebuilt bottom-up, O(capacity) once per doubling."""
+        capacity = min(2 * self.capacity, self.max_capacity)
+        head, spare = self._head, capacity - self._size
+
+        def unrolled(column, fill=0.0):
+            return column[head:] + column[:head] + array("d", [fill]) * spare
+
+        self._ts = unrolled(self._ts)
+        self._values = {f: unrolled(self._values[f]) for f in FIELDS}
+        self._totals = {f: unrolled(self._totals[f]) for f in FIELDS}
+        for trees, fill, fn in ((self._min_tree, INF, min), (self._max_tree, -INF, max)):
+            for f in VITALS:
+                tree = array("d", [fill]) * capacity + self._values[f][:self._size] + array("d", [fill]) * spare
+                for i in range(capacity - 1, 0, -1):
+                    tree[i] = fn(tree[2 * i], tree[2 * i + 1])
+                trees[f] = tree
+        self.capacity = capacity
+        self._head = self._size
+
+    def _tree_set(self, tree, slot, value, fn):
+        i = slot + self.capacity
+        tree[i] = value
+        i >>= 1
+        while i:
+            tree[i] = fn(tree[2 * i], tree[2 * i + 1])
+            i >>= 1
+
+    # ---- QUERIES ----
+    def _slot(self, i):
+        """Physical slot of logical index i (0 = oldest)"""
+        return (self._head - self._size + i) % self.capacity
+
+    def _first_at_or_after(self, since):
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ts[self._slot(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _tree_query(self, tree, lo, hi, fn, result):
+        """Fold fn over physical slots lo..hi inclusive (no wrap-around)"""
+        lo += self.capacity
+        hi += self.capacity + 1
+        while lo < hi:
+            if lo & 1:
+                result = fn(result, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = fn(result, tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return result
+
+    def _range_fold(self, tree, first, last, fn, identity):
+        lo, hi = self._slot(first), self._slot(last)
+        if lo <= hi:
+            return self._tree_query(tree, lo, hi, fn, identity)
+        result = self._tree_query(tree, lo, self.capacity - 1, fn, identity)
+        return self._tree_query(tree, 0, hi, fn, result)
+
+    def stats(self, since):
+        """Count, mean, min, max and counter deltas for readings at or after ``since`` (epoch seconds).
+        ``complete`` is False when readings in that window were already overwritten."""
+        with self._lock:
+            first = self._first_at_or_after(since)
+            count = self._size - first
+            result = {"count": count, "complete": self._evicted < since, "mean": {}, "min": {}, "max": {}, "delta": {}}
+            if count == 0:
+                for f in FIELDS:
+                    result["mean"][f] = None
+                for f in VITALS:
+                    result["min"][f] = result["max"][f] = None
+                for f in COUNTERS:
+                    result["delta"][f] = None
+                return result
+
+            last = self._size - 1
+            first_slot, last_slot = self._slot(first), self._slot(last)
+            for f in FIELDS:
+                values, totals = self._values[f], self._totals[f]
+                total = totals[last_slot] - totals[first_slot] + values[first_slot]
+                result["mean"][f] = total / count
+            for f in VITALS:
+                result["min"][f] = self._range_fold(self._min_tree[f], first, last, min, INF)
+                result["max"][f] = self._range_fold(self._max_tree[f], first, last, max, -INF)
+            for f in COUNTERS:
+                result["delta"][f] = self._values[f][last_slot] - self._values[f][first_slot]
+            return result
+
+    def stats_last(self, seconds):
+        return self.stats(time.time() - seconds)
+
+
+class VitalsWindows:
+    """One VitalsWindow per patient, created on the patient's first reading and
+    dropped once the patient has sent nothing for ``idle_seconds``"""
+
+    def __init__(self, capacity=4096, initial_capacity=None, idle_seconds=0):
+        self.capacity = capacity
+        self.initial_capacity = initial_capacity
+        self._windows = {}
+        self._idle = IdleTracker(idle_seconds)
+        self._lock = threading.Lock()
+
+    def get(self, patient_id):
+        window = self._windows.get(patient_id)
+        if window is None:
+            with self._lock:
+                window = self._windows.setdefault(patient_id, VitalsWindow(self.capacity, self.initial_capacity))
+        return window
+
+    def patients(self):
+        return list(self._windows)
+
+    def _touch(self, patient_id):
+        with self._lock:
+            for idle in self._idle.touch(patient_id):
+                self._windows.pop(idle, None)
+                self._idle.forget(idle)
+
+    def append_reading(self, reading):
+        if isinstance(reading, dict):
+            patient_id = reading.get("patient_id") or settings.DEFAULT_PATIENT_ID
+        else:
+            patient_id = reading.patient_id
+        self._touch(patient_id)
+        return self.get(patient_id).append_reading(reading)
+
+    def extend(self, by_patient):
+        """Bulk-load {patient_id: ReadingColumns}; returns the number of readings taken"""
+        for patient_id in by_patient:
+            self._touch(patient_id)
+        return sum(self.get(patient_id).extend(columns) for patient_id, columns in by_patient.items())
+
+    def stats_last(self, patient_id, seconds):
+        # Queries do not create windows, so asking about a patient does not keep one alive
+        return self._windows.get(patient_id, _NO_READINGS).stats_last(seconds)
+
+
+_NO_READINGS = VitalsWindow(capacity=1)
+
+
+# Shared by the socket handlers (writers) and the workflows (readers)
+vitals_windows = VitalsWindows(settings.VITALS_WINDOW_CAPACITY, settings.VITALS_WINDOW_INITIAL_CAPACITY, settings.PATIENT_IDLE_SECONDS)
+
+
+def _warm_up_cursor(collection, seconds):
+    since = datetime.now() - timedelta(seconds=seconds)
+    projection = {f: 1 for f in FIELDS + ("timestamp", "patient_id")}
+    # Each patient's ring keeps only its newest readings, so no per-patient limit is needed
+    return collection.find({"timestamp": {"$gte": since}}, projection).sort("timestamp", 1)
+
+
+def warm_up(collection, windows=vitals_windows, seconds=settings.VITALS_WINDOW_SECONDS):
+    """Load the last ``seconds`` of readings from MongoDB into every patient's window"""
+    return windows.extend(columns_by_patient(_warm_up_cursor(collection, seconds)))
+
+
+async def awarm_up(collection, windows=vitals_windows, seconds=settings.VITALS_WINDOW_SECONDS):
+    by_patient = {}
+    async for doc in _warm_up_cursor(collection, seconds):
+        append_by_patient(by_patient, doc)
+    return windows.extend(by_patient)
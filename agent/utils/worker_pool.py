@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+from itertools import count
+from utils.metrics import counter, gauge, histogram
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+POLICIES = ("block", "drop_oldest", "coalesce")
+
+queue_depth = gauge("agent_pool_queue_depth", "Tasks waiting in a worker pool")
+queue_wait = histogram("agent_pool_queue_wait_seconds", "Time a task spent queued before a worker picked it up")
+tasks_submitted = counter("agent_pool_tasks_submitted_total", "Tasks submitted to a worker pool")
+tasks_dropped = counter("agent_pool_tasks_dropped_total", "Tasks dropped because a pool queue was full")
+tasks_coalesced = counter("agent_pool_tasks_coalesced_total", "Tasks replaced by a newer task for the same stream")
+tasks_failed = counter("agent_pool_tasks_failed_total", "Tasks that raised an exception")
+
+
+class _Shard:
+    """One worker's queue. Tasks with the same key always land on the same shard, so they run in order."""
+
+    def __init__(self, max_queue):
+        self.max_queue = max_queue
+        self.items = deque()
+        self.pending = {}  # stream key -> queued entry, used for coalescing
+        self.cond = threading.Condition()
+
+
+class BoundedExecutor:
+    """Fixed set of worker threads fed by bounded queues.
+
+    Each worker owns a queue; tasks submitted with a ``key`` (a stream id) are
+    routed to the same worker so per-stream ordering is preserved. When a queue
+    is full the ``policy`` decides what happens:
+
+    - ``block``: the submitting thread waits for space (backpressure)
+    - ``drop_oldest``: the oldest queued task is discarded
+    - ``coalesce``: a queued task for the same key is replaced by the new one;
+      falls back to ``drop_oldest`` when the key has nothing queued
+
+    Tasks carry a ``priority`` (alert severity). Overflow never discards a
+    queued task of higher priority than the new one; when there is nothing
+    it may discard, the submitter waits as with ``block``. Below capacity
+    every task is queued.
+    """
+
+    def __init__(self, name, workers=4, max_queue=100, policy="block"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {POLICIES}")
+        self.name = name
+        self.policy = policy
+        # Split the queue limit across shards so the pool-wide bound stays at max_queue
+        per_shard = max(1, max_queue // max(1, workers))
+        self._shards = [_Shard(per_shard) for _ in range(max(1, workers))]
+        self._round_robin = count()
+        self._closed = False
+        self._threads = []
+        for i, shard in enumerate(self._shards):
+            t = threading.Thread(target=self._run, args=(shard,), name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _shard_for(self, key):
+        if key is None:
+            return self._shards[next(self._round_robin) % len(self._shards)]
+        return self._shards[hash(key) % len(self._shards)]
+
+    def submit(self, fn, *args, key=None, priority=0):
+        """Queue ``fn(*args)``. Returns False if the pool is shut down."""
+        if self._closed:
+            return False
+
+        shard = self._shard_for(key)
+        with shard.cond:
+            while len(shard.items) >= shard.max_queue:
+                if self.policy == "coalesce" and key is not None:
+                    entry = shard.pending.get(key)
+                    if entry is not None and entry[4] <= priority:
+                        entry[1], entry[2], entry[4] = fn, args, priority
+                        tasks_coalesced.inc(pool=self.name)
+                        return True
+                victim = None if self.policy == "block" else self._victim(shard, priority)
+                if victim is None:
+                    shard.cond.wait()
+                    if self._closed:
+                        return False
+                    continue
+                shard.items.remove(victim)
+                if victim[0] is not None and shard.pending.get(victim[0]) is victim:
+                    del shard.pending[victim[0]]
+                tasks_dropped.inc(pool=self.name)
+                queue_depth.dec(pool=self.name)
+
+            entry = [key, fn, args, time.monotonic(), priority]
+            shard.items.append(entry)
+            if key is not None:
+                shard.pending[key] = entry
+            shard.cond.notify_all()
+
+        tasks_submitted.inc(pool=self.name)
+        queue_depth.inc(pool=self.name)
+        return True
+
+    @staticmethod
+    def _victim(shard, priority):
+        """Oldest queued entry that a task of ``priority`` may displace, or None"""
+        return next((entry for entry in shard.items if entry[4] <= priority), None)
+
+    def _run(self, shard):
+        while True:
+            with shard.cond:
+                while not shard.items and not self._closed:
+                    shard.cond.wait()
+                if not shard.items:
+                    return
+                entry = shard.items.popleft()
+                key = entry[0]
+                if key is not None and shard.pending.get(key) is entry:
+                    del shard.pending[key]
+                shard.cond.notify_all()
+
+            queue_depth.dec(pool=self.name)
+            queue_wait.observe(time.monotonic() - entry[3], pool=self.name)
+            try:
+                entry[1](*entry[2])
+            except Exception as e:
+                tasks_failed.inc(pool=self.name)
+                log.exception("❌ Task failed in %s pool: %s", self.name, e, extra={"pool": self.name})
+
+    def depth(self):
+        return sum(len(shard.items) for shard in self._shards)
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "submitted": tasks_submitted.value(pool=self.name),
+            "dropped": tasks_dropped.value(pool=self.name),
+            "coalesced": tasks_coalesced.value(pool=self.name),
+            "failed": tasks_failed.value(pool=self.name),
+        }
+
+    def shutdown(self, wait=True):
+        """Stop accepting tasks; workers drain what is already queued before exiting."""
+        self._closed = True
+        for shard in self._shards:
+            with shard.cond:
+                shard.cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
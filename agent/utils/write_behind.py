@@ -0,0 +1,266 @@
+import asyncio
+import threading
+import time
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+from config.storage import written_filter
+from utils.metrics import counter, gauge, histogram
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+DUPLICATE_KEY = 11000
+
+batches_written = counter("agent_write_behind_batches_total", "insert_many batches sent to MongoDB")
+docs_written = counter("agent_write_behind_docs_total", "Documents written by the write-behind buffer")
+docs_lost = counter("agent_write_behind_docs_lost_total", "Documents dropped after exhausting retries")
+batch_retries = counter("agent_write_behind_retries_total", "Retried insert_many batches")
+docs_deduplicated = counter("agent_write_behind_deduplicated_total", "Documents found already written before a retry")
+buffered_docs = gauge("agent_write_behind_buffered_docs", "Documents waiting to be flushed")
+flush_latency = histogram("agent_write_behind_flush_seconds", "Time taken to flush one batch")
+
+
+def _failed_docs(pending, error):
+    """Documents from an unordered batch that need another attempt. Duplicate keys mean already written."""
+    failed = {
+        err["index"] for err in error.details.get("writeErrors", [])
+        if err.get("code") != DUPLICATE_KEY
+    }
+    return [doc for i, doc in enumerate(pending) if i in failed]
+
+
+def _unwritten(pending, written, name):
+    if written:
+        docs_deduplicated.inc(len(written), collection=name)
+    return [doc for doc in pending if doc["_id"] not in written]
+
+
+class WriteBehindBuffer:
+    """Groups documents into unordered ``insert_many`` batches.
+
+    A batch is flushed when it reaches ``batch_size`` documents or when the
+    oldest buffered document is ``flush_interval`` seconds old. Each document
+    gets its ``_id`` assigned up front, so retrying a partially written batch
+    is idempotent: documents that already landed come back as duplicate-key
+    errors and are ignored.
+
+    A time-series collection does not enforce unique ``_id``s, so the same
+    retry would store those documents twice. With ``dedupe``, a retry after an
+    error that may have left part of the batch written (anything but a
+    BulkWriteError, which lists exactly the failed documents) first looks up
+    which ``_id``s landed and only inserts the rest.
+    """
+
+    def __init__(self, collection, batch_size=500, flush_interval=1.0, max_retries=5, retry_backoff=0.5, max_buffered=50000, dedupe=False):
+        self.collection = collection
+        self.dedupe = dedupe
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_buffered = max_buffered
+        self.name = collection.name
+
+        self._docs = []
+        self._first_added = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+        self._thread.start()
+
+    def add(self, doc):
+        doc.setdefault("_id", ObjectId())
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Write-behind buffer for {self.name} is closed")
+            # Backpressure: never hold more than max_buffered documents in memory
+            while len(self._docs) >= self.max_buffered:
+                self._cond.notify_all()
+                self._cond.wait()
+            if not self._docs:
+                self._first_added = time.monotonic()
+            self._docs.append(doc)
+            buffered_docs.inc(collection=self.name)
+            if len(self._docs) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _take_batch(self):
+        batch, self._docs = self._docs[:self.batch_size], self._docs[self.batch_size:]
+        self._first_added = time.monotonic() if self._docs else None
+        buffered_docs.dec(len(batch), collection=self.name)
+        self._cond.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._docs) >= self.batch_size:
+                        break
+                    if self._docs:
+                        remaining = self.flush_interval - (time.monotonic() - self._first_added)
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed and not self._docs:
+                    return
+                batch = self._take_batch()
+            self._write(batch)
+
+    def _write(self, batch):
+        with self._flush_lock:
+            start = time.monotonic()
+            pending = batch
+            unknown = False  # whether part of `pending` may already be written
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if unknown:
+                        written = {doc["_id"] for doc in self.collection.find(written_filter(pending), {"_id": 1})}
+                        pending, unknown = _unwritten(pending, written, self.name), False
+                    if pending:
+                        self.collection.insert_many(pending, ordered=False)
+                    pending = []
+                except BulkWriteError as e:
+                    pending = _failed_docs(pending, e)
+                except PyMongoError as e:
+                    log.warning("❌ Batch insert into %s failed (attempt %d): %s", self.name, attempt + 1, e, extra={"collection": self.name})
+                    unknown = unknown or self.dedupe
+
+                if not pending:
+                    break
+                batch_retries.inc(collection=self.name)
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+            batches_written.inc(collection=self.name)
+            docs_written.inc(len(batch) - len(pending), collection=self.name)
+            flush_latency.observe(time.monotonic() - start, collection=self.name)
+            if pending:
+                docs_lost.inc(len(pending), collection=self.name)
+                log.error("❌ Gave up on %d documents for %s", len(pending), self.name, extra={"collection": self.name})
+
+    def flush(self):
+        """Synchronously write everything buffered so far."""
+        while True:
+            with self._cond:
+                if not self._docs:
+                    break
+                batch = self._take_batch()
+            self._write(batch)
+        # Wait for a batch the background thread may be writing right now
+        with self._flush_lock:
+            pass
+
+    def close(self):
+        """Stop accepting documents and flush the remainder."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+
+
+class AsyncWriteBehindBuffer:
+    """asyncio counterpart of WriteBehindBuffer for an async pymongo collection.
+
+    Call ``start()`` from a running event loop and ``await close()`` on shutdown.
+    """
+
+    def __init__(self, collection, batch_size=500, flush_interval=1.0, max_retries=5, retry_backoff=0.5, max_buffered=50000, dedupe=False):
+        self.collection = collection
+        self.dedupe = dedupe
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_buffered = max_buffered
+        self.name = collection.name
+
+        self._docs = []
+        self._first_added = None
+        self._cond = asyncio.Condition()
+        self._closed = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def add(self, doc):
+        doc.setdefault("_id", ObjectId())
+        async with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Write-behind buffer for {self.name} is closed")
+            await self._cond.wait_for(lambda: len(self._docs) < self.max_buffered)
+            if not self._docs:
+                self._first_added = time.monotonic()
+            self._docs.append(doc)
+            buffered_docs.inc(collection=self.name)
+            if len(self._docs) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _take_batch(self):
+        batch, self._docs = self._docs[:self.batch_size], self._docs[self.batch_size:]
+        self._first_added = time.monotonic() if self._docs else None
+        buffered_docs.dec(len(batch), collection=self.name)
+        self._cond.notify_all()
+        return batch
+
+    async def _run(self):
+        while True:
+            async with self._cond:
+                while not self._closed:
+                    if len(self._docs) >= self.batch_size:
+                        break
+                    timeout = None
+                    if self._docs:
+                        timeout = self.flush_interval - (time.monotonic() - self._first_added)
+                        if timeout <= 0:
+                            break
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                if self._closed and not self._docs:
+                    return
+                batch = self._take_batch()
+            await self._write(batch)
+
+    async def _write(self, batch):
+        start = time.monotonic()
+        pending = batch
+        unknown = False
+        for attempt in range(self.max_retries + 1):
+            try:
+                if unknown:
+                    found = await self.collection.find(written_filter(pending), {"_id": 1}).to_list()
+                    pending, unknown = _unwritten(pending, {doc["_id"] for doc in found}, self.name), False
+                if pending:
+                    await self.collection.insert_many(pending, ordered=False)
+                pending = []
+            except BulkWriteError as e:
+                pending = _failed_docs(pending, e)
+            except PyMongoError as e:
+                log.warning("❌ Batch insert into %s failed (attempt %d): %s", self.name, attempt + 1, e, extra={"collection": self.name})
+                unknown = unknown or self.dedupe
+
+            if not pending:
+                break
+            batch_retries.inc(collection=self.name)
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+
+        batches_written.inc(collection=self.name)
+        docs_written.inc(len(batch) - len(pending), collection=self.name)
+        flush_latency.observe(time.monotonic() - start, collection=self.name)
+        if pending:
+            docs_lost.inc(len(pending), collection=self.name)
+            log.error("❌ Gave up on %d documents for %s", len(pending), self.name, extra={"collection": self.name})
+
+    async def close(self):
+        """Stop accepting documents and flush the remainder."""
+        async with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._task is not None:
+            await self._task
@@ -1,43 +1,53 @@
+import asyncio
 from langgraph.graph import StateGraph, END
 from typing import TypedDict
-from langchain.chat_models import init_chat_model
-from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from config.db import daily_data_collection
+from config import async_db
+from workflow import llm
+from utils.patients import patient_filter, patient_of, active_patients, aactive_patients
+from utils.llm_cache import ResponseCache
+from utils.telemetry import timed_node
+from utils.log import get_logger, setup_logging
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 import json
+from datetime import datetime, timedelta
 
-load_dotenv()
+log = get_logger(__name__)
 
-model = init_chat_model(model="gemini-2.0-flash", model_provider="google_genai")
+sms_cache = ResponseCache(
+    "daily_sms",
+    quanta={"sleep.duration": 30, "nutrition.calories": 100, "nutrition.protein": 10, "nutrition.carbs": 20, "nutrition.fat": 10, "energy_score": 10, "water_intake": 0.25},
+    ignore=("timestamp", "patient_id", "sleep.start", "sleep.end"),
+)
 
 
 
 
 # ---- STATE ----
 class State(TypedDict):
+    patient_id: str
     data: dict
     status: str
     sms_message: str
 
 
+# ---- LLM OUTPUT ----
+class SmsMessage(BaseModel):
+    message: str = Field(description='Short SMS message for the patient')
+
+
 # ---- NODES ----
 def aggregate_data(state: State):
-    latest_daily_data = daily_data_collection.find_one(sort=[("timestamp", -1)], projection={"_id": 0}) or {}
+    latest_daily_data = daily_data_collection.find_one(patient_filter(patient_of(state)), sort=[("timestamp", -1)], projection={"_id": 0}) or {}
     if latest_daily_data == {}:
-        return END
+        return {"status": "no_data"}
     
     return {"status": "data_collected", "data": latest_daily_data}
 
 
-def pass_to_llm(state: State):
-    data = state["data"]
-
-    class SmsMessage(BaseModel):
-        message: str = Field(description='Short SMS message for the patient')
-
-
+def build_sms_chain(model):
     parser = PydanticOutputParser(pydantic_object=SmsMessage)
 
     template = PromptTemplate(
@@ -62,40 +72,157 @@ def pass_to_llm(state: State):
         partial_variables={'format_instruction':parser.get_format_instructions()}
     )
 
-    chain = template | model | parser
-    final_result = chain.invoke({"patient_data": json.dumps(data, indent=2, default=str)})
+    return template | model | parser
+
+
+def fallback_sms(data):
+    """Template SMS for when the model misses its deadline"""
+    parts = []
+    if "sleep" in data:
+        parts.append(f"{data['sleep']['duration'] / 60:.1f}h of sleep")
+    if "water_intake" in data:
+        parts.append(f"{data['water_intake']}L of water")
+    if "energy_score" in data:
+        parts.append(f"energy {data['energy_score']}/100")
+    summary = ", ".join(parts) or "your daily data is in"
+    return f"Daily check-in: {summary}. Keep up the good habits, stay hydrated and get some rest tonight!"
+
+
+def pass_to_llm(state: State):
+    data = state["data"]
+
+    chain = llm.bounded("daily_wellness_check", "daily_sms", build_sms_chain)
+    try:
+        sms_message = sms_cache.invoke(chain, {"patient_data": json.dumps(data, indent=2, default=str)}, key_inputs=data).message
+    except llm.LLMUnavailable as e:
+        log.warning("⚠️ Using fallback SMS: %s", e, extra={"workflow": "daily_wellness_check", "patient_id": patient_of(state)})
+        sms_message = fallback_sms(data)
 
-    return {**state, "sms_message": final_result.message}
+    return {**state, "sms_message": sms_message}
 
 
 def sms_alert(state: State):
-    print("📩 Sending SMS alert...")
     sms_message = state.get("sms_message")
-    print(f"sms_message: {sms_message}")
+    log.info("📩 Sending SMS alert: %s", sms_message, extra={"workflow": "daily_wellness_check", "patient_id": patient_of(state)})
     # Twilio Integration for SMS
     return {**state, "alert_sent": True}
 
 
 
+# ---- ASYNC NODES ----
+async def aaggregate_data(state: State):
+    latest_daily_data = await async_db.daily_data_collection.find_one(patient_filter(patient_of(state)), sort=[("timestamp", -1)], projection={"_id": 0}) or {}
+    if latest_daily_data == {}:
+        return {"status": "no_data"}
+
+    return {"status": "data_collected", "data": latest_daily_data}
+
+
+async def apass_to_llm(state: State):
+    data = state["data"]
+
+    chain = llm.bounded("daily_wellness_check", "daily_sms", build_sms_chain)
+    try:
+        sms_message = (await sms_cache.ainvoke(chain, {"patient_data": json.dumps(data, indent=2, default=str)}, key_inputs=data)).message
+    except llm.LLMUnavailable as e:
+        log.warning("⚠️ Using fallback SMS: %s", e, extra={"workflow": "daily_wellness_check", "patient_id": patient_of(state)})
+        sms_message = fallback_sms(data)
+
+    return {**state, "sms_message": sms_message}
+
+
+# ---- CONDITIONAL LOGIC ----
+def has_data(state: State):
+    """Message the patient only when aggregate_data found something to report"""
+    return "pass_to_llm" if state["status"] == "data_collected" else END
+
+
 # ---- GRAPH ----
-graph = StateGraph(State)
+def build_graph(nodes):
+    graph = StateGraph(State)
 
-graph.add_node("aggregate_data", aggregate_data)
-graph.add_node("pass_to_llm", pass_to_llm)
-graph.add_node("sms_alert", sms_alert)
+    for name, node in nodes.items():
+        graph.add_node(name, timed_node("daily_wellness_check", name, node))
 
-graph.set_entry_point("aggregate_data")
+    graph.set_entry_point("aggregate_data")
 
-# ---- EDGES ----
-graph.add_edge("aggregate_data", "pass_to_llm")
-graph.add_edge("pass_to_llm", "sms_alert")
-graph.add_edge("sms_alert", END)
+    # ---- EDGES ----
+    graph.add_conditional_edges("aggregate_data", has_data, {"pass_to_llm": "pass_to_llm", END: END})
+    graph.add_edge("pass_to_llm", "sms_alert")
+    graph.add_edge("sms_alert", END)
 
 
-# ---- COMPILE ----
-daily_workflow = graph.compile()
+    # ---- COMPILE ----
+    return graph.compile()
+
+
+daily_workflow = build_graph({
+    "aggregate_data": aggregate_data,
+    "pass_to_llm": pass_to_llm,
+    "sms_alert": sms_alert,
+})
+
+async_daily_workflow = build_graph({
+    "aggregate_data": aaggregate_data,
+    "pass_to_llm": apass_to_llm,
+    "sms_alert": sms_alert,
+})
+
+# ---- BATCH ----
+# Daily sweep over every patient: one bounded chain.batch for the cache
+# misses, each result (or fallback) mapped back to that patient's SMS step.
+def prompt_inputs(data):
+    return {"patient_data": json.dumps(data, indent=2, default=str)}
+
+
+def sms_from(state, result):
+    if isinstance(result, Exception):
+        log.warning("⚠️ Using fallback SMS: %s", result, extra={"workflow": "daily_wellness_check", "patient_id": patient_of(state)})
+        return fallback_sms(state["data"])
+    return result.message
 
-if __name__ == "__main__":
-    daily_workflow.invoke({})
 
+def run_batch(patient_ids=None):
+    """Daily check for many patients; defaults to everyone with daily data from the last day.
+    Returns {patient_id: "sent" | "no_data"}."""
+    if patient_ids is None:
+        patient_ids = active_patients(daily_data_collection, since=datetime.now() - timedelta(days=1))
 
+    outcome = {patient_id: "no_data" for patient_id in patient_ids}
+    states = []
+    for patient_id in patient_ids:
+        update = aggregate_data({"patient_id": patient_id})
+        if update["status"] == "data_collected":
+            states.append({"patient_id": patient_id, **update})
+
+    chain = llm.bounded("daily_wellness_check", "daily_sms", build_sms_chain)
+    data = [state["data"] for state in states]
+    results = sms_cache.batch(chain.batch, [prompt_inputs(d) for d in data], key_inputs=data)
+
+    for state, result in zip(states, results):
+        sms_alert({**state, "sms_message": sms_from(state, result)})
+        outcome[state["patient_id"]] = "sent"
+    return outcome
+
+
+async def arun_batch(patient_ids=None):
+    if patient_ids is None:
+        patient_ids = await aactive_patients(async_db.daily_data_collection, since=datetime.now() - timedelta(days=1))
+
+    outcome = {patient_id: "no_data" for patient_id in patient_ids}
+    updates = await asyncio.gather(*(aaggregate_data({"patient_id": patient_id}) for patient_id in patient_ids))
+    states = [{"patient_id": patient_id, **update} for patient_id, update in zip(patient_ids, updates) if update["status"] == "data_collected"]
+
+    chain = llm.bounded("daily_wellness_check", "daily_sms", build_sms_chain)
+    data = [state["data"] for state in states]
+    results = await sms_cache.abatch(chain.abatch, [prompt_inputs(d) for d in data], key_inputs=data)
+
+    for state, result in zip(states, results):
+        sms_alert({**state, "sms_message": sms_from(state, result)})
+        outcome[state["patient_id"]] = "sent"
+    return outcome
+
+
+if __name__ == "__main__":
+    setup_logging()
+    run_batch()
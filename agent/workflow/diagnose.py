@@ -1,22 +1,28 @@
+import asyncio
 from langgraph.graph import StateGraph, END
 from typing import TypedDict
-from langchain.chat_models import init_chat_model
-from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from config.db import realtime_data_collection, daily_data_collection
-from pymongo import DESCENDING
+from config.db import realtime_data_collection, daily_data_collection, realtime_rollups_collection
+from config import async_db
+from workflow import llm
+from utils.patients import patient_filter, patient_of
+from utils.trends import realtime_trends_pipeline, daily_trends_pipeline, realtime_trends_from, daily_trends_from, trend_groups_from_rollups, merge_realtime_groups, merge_daily_groups
+from utils.rollups import rollup_query
+from utils import archive
+from utils.trend_context import build_trend_context
+from utils.telemetry import timed_node
+from utils.log import get_logger
+from config import settings
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 from datetime import datetime, timedelta
-import json
 
-load_dotenv()
-
-model = init_chat_model(model="gemini-2.0-flash", model_provider="google_genai")
+log = get_logger(__name__)
 
 
 # ---- STATE ----
 class State(TypedDict):
+    patient_id: str
     realtime_trends: dict
     daily_trends: dict
     analysis: dict
@@ -26,120 +32,64 @@ class State(TypedDict):
     should_alert: bool
 
 
+# ---- LLM OUTPUT ----
+class HealthAnalysis(BaseModel):
+    trend_summary: str = Field(description="Summary of key health trends over 3 months")
+    risk_factors: list = Field(description="List of identified risk factors or concerning patterns")
+    prediction: str = Field(description="Prediction: 'normal', 'watch', or 'concern'")
+    confidence_level: str = Field(description="Confidence in prediction: 'low', 'medium', 'high'")
+    recommendations: list = Field(description="List of actionable recommendations")
+    sms_message: str = Field(description="SMS message if alert is needed (empty if normal)")
+
+
 # ---- NODES ----
 def take_data_3month(state: State):
     """Aggregate 3 months of both realtime and daily data"""
     
     # Calculate date 3 months ago
     three_months_ago = datetime.now() - timedelta(days=90)
-    
-    # Get realtime data for past 3 months
-    realtime_data = list(realtime_data_collection.find(
-        {"timestamp": {"$gte": three_months_ago}}
-    ).sort("timestamp", DESCENDING))
-    
-    # Get daily data for past 3 months
-    daily_data = list(daily_data_collection.find(
-        {"timestamp": {"$gte": three_months_ago}}
-    ).sort("timestamp", DESCENDING))
-
-    if(len(realtime_data) == 0 or len(daily_data) == 0):
-        return END
-
-    # Analyze realtime trends
-    realtime_trends = {}
-    if realtime_data:
-        # Group by week for trend analysis
-        weekly_data = {}
-        for record in realtime_data:
-            week_key = record["timestamp"].strftime("%Y-W%U")
-            if week_key not in weekly_data:
-                weekly_data[week_key] = []
-            weekly_data[week_key].append(record)
-        
-        # Calculate weekly averages
-        weekly_averages = {}
-        for week, records in weekly_data.items():
-            weekly_averages[week] = {
-                "avg_hr": sum(r["heart_rate"] for r in records) / len(records),
-                "avg_spo2": sum(r["spo2"] for r in records) / len(records),
-                "avg_stress": sum(r["stress_level"] for r in records) / len(records),
-                "total_steps": sum(r["steps"] for r in records),
-                "total_calories": sum(r["calories_burned"] for r in records),
-                "record_count": len(records)
-            }
-        
-        realtime_trends = {
-            "total_records": len(realtime_data),
-            "date_range": {
-                "start": realtime_data[-1]["timestamp"].isoformat(),
-                "end": realtime_data[0]["timestamp"].isoformat()
-            },
-            "weekly_averages": weekly_averages,
-            "overall_averages": {
-                "heart_rate": sum(r["heart_rate"] for r in realtime_data) / len(realtime_data),
-                "spo2": sum(r["spo2"] for r in realtime_data) / len(realtime_data),
-                "stress_level": sum(r["stress_level"] for r in realtime_data) / len(realtime_data)
-            }
-        }
-    
-    # Analyze daily trends
-    daily_trends = {}
-    if daily_data:
-        sleep_patterns = []
-        nutrition_patterns = []
-        energy_scores = []
-        water_intake = []
-        
-        for record in daily_data:
-            if "sleep" in record:
-                sleep_patterns.append({
-                    "duration": record["sleep"]["duration"],
-                    "quality": record["sleep"]["quality"],
-                    "date": record["timestamp"].isoformat()
-                })
-            
-            if "nutrition" in record:
-                nutrition_patterns.append({
-                    "calories": record["nutrition"]["calories"],
-                    "protein": record["nutrition"]["protein"],
-                    "carbs": record["nutrition"]["carbs"],
-                    "fat": record["nutrition"]["fat"],
-                    "date": record["timestamp"].isoformat()
-                })
-            
-            if "energy_score" in record:
-                energy_scores.append(record["energy_score"])
-                
-            if "water_intake" in record:
-                water_intake.append(record["water_intake"])
-        
-        daily_trends = {
-            "total_days": len(daily_data),
-            "sleep_analysis": {
-                "average_duration": sum(s["duration"] for s in sleep_patterns) / len(sleep_patterns) if sleep_patterns else 0,
-                "quality_distribution": {
-                    "good": sum(1 for s in sleep_patterns if s["quality"] == "good"),
-                    "average": sum(1 for s in sleep_patterns if s["quality"] == "average"),
-                    "poor": sum(1 for s in sleep_patterns if s["quality"] == "poor")
-                },
-                "recent_pattern": sleep_patterns[:7] if sleep_patterns else []
-            },
-            "nutrition_analysis": {
-                "avg_calories": sum(n["calories"] for n in nutrition_patterns) / len(nutrition_patterns) if nutrition_patterns else 0,
-                "avg_protein": sum(n["protein"] for n in nutrition_patterns) / len(nutrition_patterns) if nutrition_patterns else 0,
-                "recent_pattern": nutrition_patterns[:7] if nutrition_patterns else []
-            },
-            "energy_trends": {
-                "average_score": sum(energy_scores) / len(energy_scores) if energy_scores else 0,
-                "recent_scores": energy_scores[:14] if energy_scores else []
-            },
-            "hydration_trends": {
-                "average_intake": sum(water_intake) / len(water_intake) if water_intake else 0,
-                "recent_intake": water_intake[:14] if water_intake else []
-            }
-        }
-    
+    patient_id = patient_of(state)
+
+    # Weekly and overall realtime groups from the day rollups, and from raw or archived
+    # readings for the part of the range before the first rolled-up reading
+    rows = list(realtime_rollups_collection.find(rollup_query(patient_id, "day", three_months_ago)))
+    realtime, until = rollup_trend_groups(rows)
+    if until is None or until > three_months_ago:
+        hot = next(realtime_data_collection.aggregate(realtime_trends_pipeline(hot_match(patient_id, "realtime_data", three_months_ago, until))))
+        cold = archive.realtime_groups(patient_id, three_months_ago, until=until)
+        realtime = merge_realtime_groups(realtime, merge_realtime_groups(hot, cold))
+
+    # Daily totals, sleep quality counts and the most recent days
+    hot = next(daily_data_collection.aggregate(daily_trends_pipeline(hot_match(patient_id, "daily_data", three_months_ago))))
+    daily = merge_daily_groups(hot, archive.daily_groups(patient_id, three_months_ago))
+
+    return trends_update(realtime, daily)
+
+
+def hot_match(patient_id, kind, since, until=None):
+    """Filter for the part of the range still in MongoDB; older days come from the cold archive"""
+    timestamp = {"$gte": archive.hot_since(kind, since)}
+    if until is not None:
+        timestamp["$lt"] = until
+    return {**patient_filter(patient_id), "timestamp": timestamp}
+
+
+def rollup_trend_groups(rows):
+    """Trend groups from day rollup rows and the first reading they cover, or (None, None)"""
+    if not rows:
+        return None, None
+    weekly, overall = trend_groups_from_rollups(rows)
+    return {"weekly": weekly, "overall": overall}, min(row["start"] for row in rows)
+
+
+def trends_update(realtime, daily):
+    realtime_trends = realtime_trends_from(realtime["weekly"], realtime["overall"])
+    daily_trends = daily_trends_from(daily["totals"], daily["sleep_quality"], daily["recent"])
+
+    # Nothing to analyse without both; the graph ends after this node
+    if(not realtime_trends or not daily_trends):
+        return {"status": "no_data"}
+
     return {
         "status": "data_collected",
         "realtime_trends": realtime_trends,
@@ -147,30 +97,17 @@ def take_data_3month(state: State):
     }
 
 
-def pass_to_llm(state: State):
-    """Pass aggregated data to LLM for trend analysis and prediction"""
-    
-    realtime_data = state["realtime_trends"]
-    daily_data = state["daily_trends"]
-    
-    class HealthAnalysis(BaseModel):
-        trend_summary: str = Field(description="Summary of key health trends over 3 months")
-        risk_factors: list = Field(description="List of identified risk factors or concerning patterns")
-        prediction: str = Field(description="Prediction: 'normal', 'watch', or 'concern'")
-        confidence_level: str = Field(description="Confidence in prediction: 'low', 'medium', 'high'")
-        recommendations: list = Field(description="List of actionable recommendations")
-        sms_message: str = Field(description="SMS message if alert is needed (empty if normal)")
-
+def build_analysis_chain(model):
     parser = PydanticOutputParser(pydantic_object=HealthAnalysis)
 
     template = PromptTemplate(
         template="""
         You are an AI health assistant analyzing 3 months of patient health data to identify trends and predict potential health issues.
 
-        REALTIME DATA TRENDS (3 months):
+        REALTIME DATA TRENDS (3 months; hr in bpm, spo2 in %, weekly rows as CSV):
         {realtime_trends}
 
-        DAILY LIFESTYLE DATA TRENDS (3 months):
+        DAILY LIFESTYLE DATA TRENDS (3 months; dates as MM-DD, sleep quality g/a/p):
         {daily_trends}
 
         ANALYSIS TASK:
@@ -207,17 +144,26 @@ def pass_to_llm(state: State):
         partial_variables={'format_instruction': parser.get_format_instructions()}
     )
 
-    chain = template | model | parser
-    
-    # Convert data to JSON strings for the prompt
-    realtime_json = json.dumps(realtime_data, indent=2, default=str)
-    daily_json = json.dumps(daily_data, indent=2, default=str)
-    
-    result = chain.invoke({
-        "realtime_trends": realtime_json,
-        "daily_trends": daily_json
-    })
+    return template | model | parser
 
+
+def analysis_inputs(state: State):
+    # Compact tables within the token budget, so the prompt does not grow with the history
+    realtime_text, daily_text, report = build_trend_context(
+        state["realtime_trends"], state["daily_trends"], settings.DIAGNOSE_TOKEN_BUDGET
+    )
+    log.info(
+        "🧮 Trend context: ~%d tokens (JSON ~%d, %.0f%% smaller)", report["tokens"], report["json_tokens"], report["reduction"] * 100,
+        extra={"workflow": "diagnose", "patient_id": patient_of(state)},
+    )
+
+    return {
+        "realtime_trends": realtime_text,
+        "daily_trends": daily_text
+    }
+
+
+def analysis_update(state: State, result):
     # Determine if we should send an alert
     should_alert = result.prediction in ["watch", "concern"] and result.sms_message.strip()
 
@@ -235,11 +181,19 @@ def pass_to_llm(state: State):
     }
 
 
+def pass_to_llm(state: State):
+    """Pass aggregated data to LLM for trend analysis and prediction"""
+    chain = llm.bounded("diagnose", "trend_analysis", build_analysis_chain)
+    result = chain.invoke(analysis_inputs(state))
+    return analysis_update(state, result)
+
+
 def send_sms(state: State):
     """Send SMS alert if prediction indicates concern"""
-    print("📩 Sending trend analysis SMS alert...")
-    print(f"Prediction: {state['prediction']}")
-    print(f"SMS: {state['sms_message']}")
+    log.info(
+        "📩 Sending trend analysis SMS alert: %s", state["sms_message"],
+        extra={"workflow": "diagnose", "patient_id": patient_of(state), "prediction": state["prediction"]},
+    )
     
     # TODO: Integrate with Twilio
     # sms_client.send_message(
@@ -252,46 +206,98 @@ def send_sms(state: State):
 
 def end_normal(state: State):
     """End node for normal predictions"""
-    print("✅ Health trends are normal - no alert needed")
-    print(f"Analysis: {state['analysis']['trend_summary']}")
+    log.info(
+        "✅ Health trends are normal - no alert needed: %s", state["analysis"]["trend_summary"],
+        extra={"workflow": "diagnose", "patient_id": patient_of(state)},
+    )
     return {**state, "status": "completed_normal"}
 
 
 # ---- CONDITIONAL LOGIC ----
+def has_trends(state: State):
+    """Analyse only when take_data_3month found both realtime and daily data"""
+    return "pass_to_llm" if state["status"] == "data_collected" else END
+
+
 def should_send_alert(state: State):
     """Determine if we should send an SMS alert"""
     return "send_sms" if state["should_alert"] else "end_normal"
 
 
+# ---- ASYNC NODES ----
+async def atake_data_3month(state: State):
+    three_months_ago = datetime.now() - timedelta(days=90)
+    patient_id = patient_of(state)
+
+    rows = await async_db.realtime_rollups_collection.find(rollup_query(patient_id, "day", three_months_ago)).to_list()
+    realtime, until = rollup_trend_groups(rows)
+    if until is None or until > three_months_ago:
+        realtime_cursor = await async_db.realtime_data_collection.aggregate(realtime_trends_pipeline(hot_match(patient_id, "realtime_data", three_months_ago, until)))
+        # Archive files are read off the event loop
+        cold = await asyncio.to_thread(archive.realtime_groups, patient_id, three_months_ago, until=until)
+        realtime = merge_realtime_groups(realtime, merge_realtime_groups((await realtime_cursor.to_list())[0], cold))
+
+    daily_cursor = await async_db.daily_data_collection.aggregate(daily_trends_pipeline(hot_match(patient_id, "daily_data", three_months_ago)))
+    cold = await asyncio.to_thread(archive.daily_groups, patient_id, three_months_ago)
+
+    return trends_update(realtime, merge_daily_groups((await daily_cursor.to_list())[0], cold))
+
+
+async def apass_to_llm(state: State):
+    chain = llm.bounded("diagnose", "trend_analysis", build_analysis_chain)
+    result = await chain.ainvoke(analysis_inputs(state))
+    return analysis_update(state, result)
+
+
 # ---- GRAPH ----
-graph = StateGraph(State)
-
-# Add nodes
-graph.add_node("take_data_3month", take_data_3month)
-graph.add_node("pass_to_llm", pass_to_llm)
-graph.add_node("send_sms", send_sms)
-graph.add_node("end_normal", end_normal)
-
-# Set entry point
-graph.set_entry_point("take_data_3month")
-
-# Add edges
-graph.add_edge("take_data_3month", "pass_to_llm")
-
-# Conditional edge based on LLM prediction
-graph.add_conditional_edges(
-    "pass_to_llm",
-    should_send_alert,
-    {
-        "send_sms": "send_sms",
-        "end_normal": "end_normal"
-    }
-)
+def build_graph(nodes):
+    graph = StateGraph(State)
+
+    # Add nodes
+    for name, node in nodes.items():
+        graph.add_node(name, timed_node("diagnose", name, node))
+
+    # Set entry point
+    graph.set_entry_point("take_data_3month")
+
+    # Add edges
+    graph.add_conditional_edges(
+        "take_data_3month",
+        has_trends,
+        {
+            "pass_to_llm": "pass_to_llm",
+            END: END
+        }
+    )
+
+    # Conditional edge based on LLM prediction
+    graph.add_conditional_edges(
+        "pass_to_llm",
+        should_send_alert,
+        {
+            "send_sms": "send_sms",
+            "end_normal": "end_normal"
+        }
+    )
+
+    # Both end nodes go to END
+    graph.add_edge("send_sms", END)
+    graph.add_edge("end_normal", END)
+
+    # ---- COMPILE ----
+    return graph.compile()
 
-# Both end nodes go to END
-graph.add_edge("send_sms", END)
-graph.add_edge("end_normal", END)
 
-# ---- COMPILE ----
-trend_analysis_workflow = graph.compile()
+trend_analysis_workflow = build_graph({
+    "take_data_3month": take_data_3month,
+    "pass_to_llm": pass_to_llm,
+    "send_sms": send_sms,
+    "end_normal": end_normal,
+})
 
+async_trend_analysis_workflow = build_graph({
+    "take_data_3month": atake_data_3month,
+    "pass_to_llm": apass_to_llm,
+    "send_sms": send_sms,
+    "end_normal": end_normal,
+})
@@ -1,120 +1,87 @@
 from langgraph.graph import StateGraph, END
 from typing import TypedDict
-from langchain.chat_models import init_chat_model
-from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from config.db import realtime_data_collection, call_sms_history_collection
-from pymongo import DESCENDING
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-from datetime import datetime, timedelta, timezone
-from utils.spam_avoidance import cooled_off
-from models.call_sms_history import call_sms_history
-
-load_dotenv()
-
-model = init_chat_model(model="gemini-2.0-flash", model_provider="google_genai")
+from utils.spam_avoidance import cooled_off, cooldowns
+from utils.vitals_checks import classify_vitals, sustained_status, triage, vitals_findings
+from utils.vitals_window import vitals_windows
+from utils.baselines import baselines
+from utils.sustained import sustained
+from utils.patients import patient_of
+from workflow import llm
+from utils.llm_cache import ResponseCache
+from utils.telemetry import alerts_sent, record_decision, timed_node
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+
+# Overrides and persistent conditions repeat near-identical readings; reuse their SMS
+sms_cache = ResponseCache(
+    "emergency_sms",
+    quanta={"heart_rate": 5, "avg_hr": 5, "spo2": 1, "avg_spo2": 1, "stress_level": 10, "avg_stress_level": 10},
+    ignore=("timestamp", "patient_id"),
+)
 
 
 
 
 # ---- STATE ----
 class State(TypedDict):
+    patient_id: str
     data: dict
+    confirmed: frozenset
     status: str
     decision: str
+    evidence: list
     alert_sent: bool
     sms_message: str
     therapist_conclusion: str
 
 
+# ---- LLM OUTPUT ----
+class SmsMessage(BaseModel):
+    message: str = Field(description='Short SMS alert message for the patient')
+
+
 # ---- NODES ----
 def take_data(state: State):
     return {"status": "data_collected"}
 
-def hardcoded_checks(state: State):
-    data = state["data"]
-    heart_rate, spo2, stress = data.get("heart_rate"), data.get("spo2"), data.get("stress_level")
-
-    status_list = []
-
-    # check heart rate
-    if 60 <= heart_rate <= 100:
-        status_list.append("Normal")
-    elif 50 <= heart_rate <= 59 or 101 <= heart_rate <= 110:
-        status_list.append("Low Alert")
-    else:
-        status_list.append("High Alert")
-
-    # check SpO2
-    if 95 <= spo2 <= 100:
-        status_list.append("Normal")
-    elif 93 <= spo2 <= 94:
-        status_list.append("Low Alert")
-    else:
-        status_list.append("High Alert")
-
-    # check stress level
-    if 0 <= stress <= 40:
-        status_list.append("Normal")
-    elif 41 <= stress <= 60:
-        status_list.append("Low Alert")
-
-
-    # determine final status
-    if "High Alert" in status_list:
-        final_status = "high_alert"
-    elif "Low Alert" in status_list:
-        final_status = "small_alert"
-    else:
-        final_status = "normal"
-
-    if(
-        (final_status == "high_alert" and not(cooled_off("emergency_call")))
-        or
-        (final_status == "small_alert" and not(cooled_off("emergency_sms")))
-    ):
-        final_status = "normal"
-    
-    if(final_status == "normal" and stress > 60 and cooled_off("therapist_call")):
-        final_status = "high_stress"
-    
-    return {"decision": final_status}
-
+def triage_confirmation(state):
+    """Alert levels confirmed when the reading was triaged (sockets/ingest.py), else the live ones"""
+    confirmed = state.get("confirmed")
+    return sustained.confirmed(patient_of(state)) if confirmed is None else confirmed
 
-def pass_to_llm(state: State):
-    data = state["data"]
 
-    # Calculate 5 minutes ago
-    five_minutes_ago = datetime.now(timezone.utc) - timedelta(minutes=5)
+def triage_evidence(state, decision):
+    """Window statistics of the sustained rules behind an alert, as captured at triage when it decided the same"""
+    if state.get("decision") == decision and state.get("evidence") is not None:
+        return state["evidence"]
+    return sustained.evidence(patient_of(state), decision)
 
-    # Query records from last 5 minutes
-    recent_data = list(
-        realtime_data_collection.find(
-            {"timestamp": {"$gte": five_minutes_ago}}
-        ).sort("timestamp", DESCENDING)
-    )
 
-    # Calculate averages
-    if recent_data:
-        avg_hr = sum(record["heart_rate"] for record in recent_data) / len(recent_data)
-        avg_spo2 = sum(record["spo2"] for record in recent_data) / len(recent_data)
-        avg_stress_level = sum(record["stress_level"] for record in recent_data) / len(recent_data)
-    else:
-        avg_hr = avg_spo2 = avg_stress_level = None  # Handle case where no data is available
+def hardcoded_checks(state: State):
+    patient_id = patient_of(state)
+    confirmed = triage_confirmation(state)
+    decision = triage(state["data"], lambda type: cooled_off(patient_id, type), baselines.deviating(patient_id), confirmed)
+    record_decision(state["data"], sustained_status(classify_vitals(state["data"]), confirmed), decision, path="graph")
+    return {"decision": decision, "evidence": triage_evidence(state, decision)}
 
 
-    data.update({
-        "avg_hr": avg_hr,
-        "avg_spo2": avg_spo2,
-        "avg_stress_level": avg_stress_level
-    })
-    
+def window_averages(patient_id):
+    """Average vitals over the patient's last 5 minutes, from the in-memory vitals window"""
+    stats = vitals_windows.stats_last(patient_id, 5 * 60)
 
-    class SmsMessage(BaseModel):
-        message: str = Field(description='Short SMS alert message for the patient')
+    return {
+        "avg_hr": stats["mean"]["heart_rate"],
+        "avg_spo2": stats["mean"]["spo2"],
+        "avg_stress_level": stats["mean"]["stress_level"]
+    }
 
 
+def build_sms_chain(model):
     parser = PydanticOutputParser(pydantic_object=SmsMessage)
 
     template = PromptTemplate(
@@ -148,106 +115,232 @@ def pass_to_llm(state: State):
         partial_variables={'format_instruction':parser.get_format_instructions()}
     )
 
-    chain = template | model | parser
-    final_result = chain.invoke(data)
+    return template | model | parser
 
-    return {"sms_message": final_result.message}
 
+def fallback_sms(data):
+    """Template SMS for when the model misses its deadline"""
+    findings = vitals_findings(data) or ["a change in your vitals"]
+    return f"We noticed {' and '.join(findings)}. Please rest for a few minutes, breathe slowly and drink some water."
 
-def sms_alert(state: State):
-    print("📩 Sending SMS alert...")
 
-    validated_data = call_sms_history(type = "emergency_sms", timestamp = datetime.now(timezone.utc))
-    call_sms_history_collection.insert_one(validated_data.model_dump())
+BASELINE_NAMES = {"heart_rate": ("heart rate", " bpm"), "spo2": ("oxygen level", "%"), "stress_level": ("stress level", "")}
+
+
+def baseline_sms(patient_id):
+    """SMS for vitals inside the population thresholds but off the patient's own baseline"""
+    signal = baselines.deviation(patient_id)
+    changes = []
+    for f in baselines.deviating(patient_id):
+        name, unit = BASELINE_NAMES[f]
+        changes.append(f"your {name} has been around {signal['current'][f]:.0f}{unit} against your usual {signal['baseline'][f]:.0f}{unit}")
+    change = " and ".join(changes) or "some of your vitals have been unusual for you"
+    return f"We noticed {change}. Take it easy for a while, and contact your doctor if you feel unwell."
+
 
+def pass_to_llm(state: State):
+    data = state["data"]
+    data.update(window_averages(patient_of(state)))
+
+    chain = llm.bounded("emergency_monitoring", "emergency_sms", build_sms_chain)
+    try:
+        sms_message = sms_cache.invoke(chain, data).message
+    except llm.LLMUnavailable as e:
+        log.warning("⚠️ Using fallback SMS: %s", e, extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state)})
+        sms_message = fallback_sms(data)
+
+    return {"sms_message": sms_message}
 
+
+def notify_sms(state: State):
     sms_message = state.get("sms_message")
-    print(f"SMS: {sms_message}")
+    log.info("SMS: %s", sms_message, extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state)})
     # Twilio Integration for SMS
     return {"alert_sent": True}
 
 
-def emergency_call(state: State):
-    print("🚨 Emergency Call triggered!")
-
-    validated_data = call_sms_history(type = "emergency_call", timestamp = datetime.now(timezone.utc))
-    call_sms_history_collection.insert_one(validated_data.model_dump())
-
+def notify_emergency_contact(state: State):
     emergency_context = state["data"]
 
     # Twilio integration for call
     return {"decision": "called emergency contact"}
 
 
-def family_call(state: State):
-    print("🚨 Family Call triggered!")
-
-    validated_data = call_sms_history(type = "family_call", timestamp = datetime.now(timezone.utc))
-    call_sms_history_collection.insert_one(validated_data.model_dump())
-
+def notify_family(state: State):
     family_context = state["therapist_conclusion"]
 
     # Twilio integration for call
     return {"decision": "called family contact"}
 
 
-def therapist_call(state: State):
-    print("🚨 Therapist Call triggered!")
-
-    validated_data = call_sms_history(type = "therapist_call", timestamp = datetime.now(timezone.utc))
-    call_sms_history_collection.insert_one(validated_data.model_dump())
-
+def notify_therapist(state: State):
     therapist_context = state["data"]
 
     # Twilio integration for call
     return {"decision": "escalate", "therapist_conclusion": "he is sad because his dog died"}
 
 
-# ---- GRAPH ----
-graph = StateGraph(State)
-
-graph.add_node("take_data", take_data)
-graph.add_node("hardcoded_checks", hardcoded_checks)
-graph.add_node("pass_to_llm", pass_to_llm)
-graph.add_node("sms_alert", sms_alert)
-graph.add_node("emergency_call", emergency_call)
-graph.add_node("therapist_call", therapist_call)
-graph.add_node("family_call", family_call)
-
-graph.set_entry_point("take_data")
-
-# ---- EDGES ----
-graph.add_edge("take_data", "hardcoded_checks")
-
-# Branching from hardcoded checks
-graph.add_conditional_edges(
-    "hardcoded_checks",
-    lambda s: s["decision"],
-    {
-        "normal": END,
-        "small_alert": "pass_to_llm",
-        "high_alert": "emergency_call",
-        "high_stress": "therapist_call"
-    },
-)
+def sms_alert(state: State):
+    log.info("📩 Sending SMS alert...", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "emergency_sms", "evidence": state.get("evidence")})
+    cooldowns.record(patient_of(state), "emergency_sms")
+    alerts_sent.inc(type="emergency_sms")
+    return notify_sms(state)
+
 
-graph.add_edge("pass_to_llm", "sms_alert")
-graph.add_edge("sms_alert", END)
+def emergency_call(state: State):
+    log.info("🚨 Emergency Call triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "emergency_call", "evidence": state.get("evidence")})
+    cooldowns.record(patient_of(state), "emergency_call")
+    alerts_sent.inc(type="emergency_call")
+    return notify_emergency_contact(state)
 
 
-graph.add_edge("emergency_call", END)
-graph.add_conditional_edges(
-    "therapist_call",
-    lambda s: s["decision"],
-    {
-        "normal": END,
-        "escalate": "family_call",
-    },
-)
-graph.add_edge("family_call", END)
+def family_call(state: State):
+    log.info("🚨 Family Call triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "family_call"})
+    cooldowns.record(patient_of(state), "family_call")
+    alerts_sent.inc(type="family_call")
+    return notify_family(state)
+
+
+def therapist_call(state: State):
+    log.info("🚨 Therapist Call triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "therapist_call"})
+    cooldowns.record(patient_of(state), "therapist_call")
+    alerts_sent.inc(type="therapist_call")
+    return notify_therapist(state)
+
+
+def baseline_alert(state: State):
+    log.info("📈 Baseline deviation SMS triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "baseline_sms"})
+    cooldowns.record(patient_of(state), "baseline_sms")
+    alerts_sent.inc(type="baseline_sms")
+    sms_message = baseline_sms(patient_of(state))
+    return {"sms_message": sms_message, **notify_sms({**state, "sms_message": sms_message})}
+
+
+# ---- ASYNC NODES ----
+async def ahardcoded_checks(state: State):
+    if not cooldowns.loaded:
+        await cooldowns.aload()
+    patient_id = patient_of(state)
+    confirmed = triage_confirmation(state)
+    decision = triage(state["data"], cooldowns.for_patient(patient_id), baselines.deviating(patient_id), confirmed)
+    record_decision(state["data"], sustained_status(classify_vitals(state["data"]), confirmed), decision, path="graph")
+    return {"decision": decision, "evidence": triage_evidence(state, decision)}
+
+
+async def apass_to_llm(state: State):
+    data = state["data"]
+    data.update(window_averages(patient_of(state)))
+
+    chain = llm.bounded("emergency_monitoring", "emergency_sms", build_sms_chain)
+    try:
+        sms_message = (await sms_cache.ainvoke(chain, data)).message
+    except llm.LLMUnavailable as e:
+        log.warning("⚠️ Using fallback SMS: %s", e, extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state)})
+        sms_message = fallback_sms(data)
 
-# ---- COMPILE ----
-emergency_workflow = graph.compile()
+    return {"sms_message": sms_message}
 
 
+async def asms_alert(state: State):
+    log.info("📩 Sending SMS alert...", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "emergency_sms", "evidence": state.get("evidence")})
+    await cooldowns.arecord(patient_of(state), "emergency_sms")
+    alerts_sent.inc(type="emergency_sms")
+    return notify_sms(state)
 
+
+async def aemergency_call(state: State):
+    log.info("🚨 Emergency Call triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "emergency_call", "evidence": state.get("evidence")})
+    await cooldowns.arecord(patient_of(state), "emergency_call")
+    alerts_sent.inc(type="emergency_call")
+    return notify_emergency_contact(state)
+
+
+async def afamily_call(state: State):
+    log.info("🚨 Family Call triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "family_call"})
+    await cooldowns.arecord(patient_of(state), "family_call")
+    alerts_sent.inc(type="family_call")
+    return notify_family(state)
+
+
+async def atherapist_call(state: State):
+    log.info("🚨 Therapist Call triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "therapist_call"})
+    await cooldowns.arecord(patient_of(state), "therapist_call")
+    alerts_sent.inc(type="therapist_call")
+    return notify_therapist(state)
+
+
+async def abaseline_alert(state: State):
+    log.info("📈 Baseline deviation SMS triggered!", extra={"workflow": "emergency_monitoring", "patient_id": patient_of(state), "alert": "baseline_sms"})
+    await cooldowns.arecord(patient_of(state), "baseline_sms")
+    alerts_sent.inc(type="baseline_sms")
+    sms_message = baseline_sms(patient_of(state))
+    return {"sms_message": sms_message, **notify_sms({**state, "sms_message": sms_message})}
+
+
+# ---- GRAPH ----
+def build_graph(nodes):
+    graph = StateGraph(State)
+
+    for name, node in nodes.items():
+        graph.add_node(name, timed_node("emergency_monitoring", name, node))
+
+    graph.set_entry_point("take_data")
+
+    # ---- EDGES ----
+    graph.add_edge("take_data", "hardcoded_checks")
+
+    # Branching from hardcoded checks
+    graph.add_conditional_edges(
+        "hardcoded_checks",
+        lambda s: s["decision"],
+        {
+            "normal": END,
+            "small_alert": "pass_to_llm",
+            "high_alert": "emergency_call",
+            "high_stress": "therapist_call",
+            "baseline_deviation": "baseline_alert",
+        },
+    )
+
+    graph.add_edge("pass_to_llm", "sms_alert")
+    graph.add_edge("sms_alert", END)
+
+
+    graph.add_edge("emergency_call", END)
+    graph.add_edge("baseline_alert", END)
+    graph.add_conditional_edges(
+        "therapist_call",
+        lambda s: s["decision"],
+        {
+            "normal": END,
+            "escalate": "family_call",
+        },
+    )
+    graph.add_edge("family_call", END)
+
+    # ---- COMPILE ----
+    return graph.compile()
+
+
+emergency_workflow = build_graph({
+    "take_data": take_data,
+    "hardcoded_checks": hardcoded_checks,
+    "pass_to_llm": pass_to_llm,
+    "sms_alert": sms_alert,
+    "emergency_call": emergency_call,
+    "therapist_call": therapist_call,
+    "family_call": family_call,
+    "baseline_alert": baseline_alert,
+})
+
+# Same graph with async nodes, run with ainvoke by the asyncio runtime
+async_emergency_workflow = build_graph({
+    "take_data": take_data,
+    "hardcoded_checks": ahardcoded_checks,
+    "pass_to_llm": apass_to_llm,
+    "sms_alert": asms_alert,
+    "emergency_call": aemergency_call,
+    "therapist_call": atherapist_call,
+    "family_call": afamily_call,
+    "baseline_alert": abaseline_alert,
+})
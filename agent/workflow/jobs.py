@@ -0,0 +1,113 @@
+# Scheduled workloads: the 3-hourly and daily wellness sweeps, the 3-month
+# trend analysis and the nightly cold archive. Workflow modules are imported
+# when a job first runs. The asyncio runtime passes its loop to register_jobs
+# and the sweeps run there with the async workflows; the scheduler's threads
+# only hold the lease and wait for them.
+import asyncio
+import os
+from datetime import timedelta
+from config import settings
+from config.db import daily_data_collection, scheduler_runs_collection
+from utils.patients import active_patients, aactive_patients
+from utils.scheduler import Scheduler, parse_trigger, fan_out, afan_out
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+scheduler = Scheduler(scheduler_runs_collection, workers=settings.SCHEDULER_WORKERS)
+
+
+def _report(name, outcome):
+    sent = sum(status == "sent" for status in outcome.values())
+    log.info("🩺 %s: messaged %d of %d patients", name, sent, len(outcome), extra={"job": name})
+
+
+def run_periodic(scheduled):
+    from workflow.periodic_wellness_check import run_batch
+    _report("Periodic wellness check", run_batch())
+
+
+def run_daily(scheduled):
+    from workflow.daily_wellness_check import run_batch
+    _report("Daily wellness check", run_batch())
+
+
+def run_diagnose(scheduled):
+    """Trend analysis for every patient with daily data in the last 3 months, fanned out over a pool"""
+    from workflow.diagnose import trend_analysis_workflow
+
+    patient_ids = active_patients(daily_data_collection, since=scheduled - timedelta(days=90))
+    errors = fan_out(
+        lambda patient_id: trend_analysis_workflow.invoke({"patient_id": patient_id}),
+        patient_ids,
+        workers=settings.SCHEDULER_FANOUT_WORKERS,
+    )
+    _report_trends(patient_ids, errors)
+
+
+def _report_trends(patient_ids, errors):
+    failed = [patient_id for patient_id, error in errors.items() if error is not None]
+    log.info("📈 Trend analysis: %d of %d patients analysed", len(patient_ids) - len(failed), len(patient_ids), extra={"job": "trend_analysis"})
+    if failed:
+        raise RuntimeError(f"trend analysis failed for {', '.join(failed)}")
+
+
+# ---- ASYNC JOBS ----
+async def arun_periodic(scheduled):
+    from workflow.periodic_wellness_check import arun_batch
+    _report("Periodic wellness check", await arun_batch())
+
+
+async def arun_daily(scheduled):
+    from workflow.daily_wellness_check import arun_batch
+    _report("Daily wellness check", await arun_batch())
+
+
+async def arun_diagnose(scheduled):
+    """run_diagnose on the event loop, SCHEDULER_FANOUT_WORKERS patients at a time"""
+    from config import async_db
+    from workflow.diagnose import async_trend_analysis_workflow
+
+    patient_ids = await aactive_patients(async_db.daily_data_collection, since=scheduled - timedelta(days=90))
+    errors = await afan_out(
+        lambda patient_id: async_trend_analysis_workflow.ainvoke({"patient_id": patient_id}),
+        patient_ids,
+        limit=settings.SCHEDULER_FANOUT_WORKERS,
+    )
+    _report_trends(patient_ids, errors)
+
+
+def on_loop(arun, loop):
+    """A scheduler job that runs ``arun`` on ``loop`` and blocks its worker thread until it finishes"""
+    def run(scheduled):
+        return asyncio.run_coroutine_threadsafe(arun(scheduled), loop).result()
+    return run
+
+
+def run_archive(scheduled):
+    from utils.archive import archive_closed_days
+    archive_closed_days(scheduled)
+
+
+JOBS = (
+    # name, trigger spec, run, async run (None: always on a thread), lease (max runtime) in seconds
+    ("periodic_wellness_check", settings.SCHEDULE_PERIODIC, run_periodic, arun_periodic, 3 * 60 * 60),
+    ("daily_wellness_check", settings.SCHEDULE_DAILY, run_daily, arun_daily, 3 * 60 * 60),
+    ("trend_analysis", settings.SCHEDULE_DIAGNOSE, run_diagnose, arun_diagnose, 6 * 60 * 60),
+    ("archive", settings.SCHEDULE_ARCHIVE, run_archive, None, 6 * 60 * 60),
+)
+
+
+def register_jobs(loop=None):
+    """Schedule every job that is not "off"; with ``loop``, the async variants run on it"""
+    for name, spec, run, arun, max_runtime in JOBS:
+        if spec.strip().lower() == "off":
+            continue
+        # Archiving deletes from MongoDB; the files must land where every agent reads them
+        if name == "archive" and not os.path.isabs(settings.ARCHIVE_DIR):
+            log.error("❌ Not scheduling archive: ARCHIVE_DIR must be an absolute path on shared storage, got %r", settings.ARCHIVE_DIR, extra={"job": name})
+            continue
+        if loop is not None and arun is not None:
+            run = on_loop(arun, loop)
+        scheduler.add(name, parse_trigger(spec), run, jitter=settings.SCHEDULER_JITTER_SECONDS, max_runtime=max_runtime)
+        log.info("🗓️ Scheduled %s: %s", name, spec, extra={"job": name})
@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from dotenv import load_dotenv
+from config import settings
+from utils.metrics import counter, histogram
+
+load_dotenv()
+
+# Shared chat model and prompt->model->parser chains. The model client (and the
+# langchain/genai import graph behind it) is created on first use, and each
+# chain is built once, so the agent can connect before any of it is loaded.
+MODEL_NAME = "gemini-2.0-flash"
+MODEL_PROVIDER = "google_genai"
+
+_model = None
+_chains = {}
+_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                from langchain.chat_models import init_chat_model
+                _model = init_chat_model(model=MODEL_NAME, model_provider=MODEL_PROVIDER)
+    return _model
+
+
+def set_model(model):
+    """Swap the chat model (e.g. a stub for benchmarks); chains are rebuilt against it"""
+    global _model
+    with _lock:
+        _model = model
+        _chains.clear()
+
+
+def chain(name, build):
+    """The chain registered under ``name``, built with ``build(model)`` on first use"""
+    built = _chains.get(name)
+    if built is None:
+        model = get_model()
+        with _lock:
+            built = _chains.get(name)
+            if built is None:
+                built = _chains[name] = build(model)
+    return built
+
+
+# ---- BOUNDED EXECUTION ----
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+call_seconds = histogram("agent_llm_call_seconds", "LLM call latency by workflow and outcome (ok/timeout/error/saturated)", buckets=LLM_BUCKETS)
+unavailable = counter("agent_llm_unavailable_total", "LLM calls that missed their deadline or failed, i.e. fallbacks, by reason")
+
+
+class LLMUnavailable(Exception):
+    """The model did not answer within the deadline, or failed; SMS nodes fall back to a template"""
+
+
+_global_slots = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
+_workflow_slots = {w: threading.BoundedSemaphore(n) for w, n in settings.LLM_CONCURRENCY.items()}
+_async_global_slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+_async_workflow_slots = {w: asyncio.Semaphore(n) for w, n in settings.LLM_CONCURRENCY.items()}
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+    return _executor
+
+
+def _finish(workflow, started, outcome):
+    call_seconds.observe(time.monotonic() - started, workflow=workflow, outcome=outcome)
+    if outcome != "ok":
+        unavailable.inc(workflow=workflow, reason=outcome)
+        return LLMUnavailable(f"{workflow}: {outcome} after {time.monotonic() - started:.2f}s")
+
+
+def _acquire(workflow, expires):
+    """Per-workflow slot first, so a saturated workflow does not hold global slots while it waits"""
+    slots = _workflow_slots[workflow]
+    if not slots.acquire(timeout=max(0, expires - time.monotonic())):
+        return False
+    if not _global_slots.acquire(timeout=max(0, expires - time.monotonic())):
+        slots.release()
+        return False
+    return True
+
+
+def _release(workflow):
+    _global_slots.release()
+    _workflow_slots[workflow].release()
+
+
+def call(workflow, chain, inputs, deadline=None):
+    """chain.invoke(inputs) under the global and per-workflow limits, within ``deadline`` seconds.
+
+    A call that misses the deadline keeps its slots until the model actually
+    returns, so abandoned calls still count against the rate limit.
+    """
+    deadline = settings.LLM_DEADLINE_SECONDS[workflow] if deadline is None else deadline
+    started = time.monotonic()
+    expires = started + deadline
+
+    if not _acquire(workflow, expires):
+        raise _finish(workflow, started, "saturated")
+    try:
+        future = _get_executor().submit(chain.invoke, inputs)
+    except BaseException:
+        _release(workflow)
+        raise
+    future.add_done_callback(lambda _: _release(workflow))
+
+    try:
+        result = future.result(timeout=max(0, expires - time.monotonic()))
+    except FuturesTimeout:
+        raise _finish(workflow, started, "timeout")
+    except Exception as e:
+        raise _finish(workflow, started, "error") from e
+
+    _finish(workflow, started, "ok")
+    return result
+
+
+async def acall(workflow, chain, inputs, deadline=None):
+    """chain.ainvoke(inputs) under the same limits; a missed deadline cancels the call"""
+    deadline = settings.LLM_DEADLINE_SECONDS[workflow] if deadline is None else deadline
+    started = time.monotonic()
+    stage = ["saturated"]
+
+    async def run():
+        async with _async_workflow_slots[workflow], _async_global_slots:
+            stage[0] = "timeout"
+            return await chain.ainvoke(inputs)
+
+    try:
+        result = await asyncio.wait_for(run(), timeout=deadline)
+    except asyncio.TimeoutError:
+        raise _finish(workflow, started, stage[0])
+    except Exception as e:
+        raise _finish(workflow, started, "error") from e
+
+    _finish(workflow, started, "ok")
+    return result
+
+
+class Bounded:
+    """A chain whose invoke/ainvoke go through call/acall for ``workflow``"""
+
+    def __init__(self, workflow, chain):
+        self.workflow = workflow
+        self.chain = chain
+
+    def invoke(self, inputs):
+        return call(self.workflow, self.chain, inputs)
+
+    async def ainvoke(self, inputs):
+        return await acall(self.workflow, self.chain, inputs)
+
+    def _runnable(self):
+        from langchain_core.runnables import RunnableLambda
+        return RunnableLambda(self.invoke, afunc=self.ainvoke)
+
+    def batch(self, inputs):
+        """Runnable.batch over ``inputs``, each item bounded like call().
+
+        max_concurrency is the workflow's slot count; failed items come back
+        as LLMUnavailable in their position instead of failing the batch.
+        """
+        config = {"max_concurrency": settings.LLM_CONCURRENCY[self.workflow]}
+        return self._runnable().batch(inputs, config=config, return_exceptions=True)
+
+    async def abatch(self, inputs):
+        config = {"max_concurrency": settings.LLM_CONCURRENCY[self.workflow]}
+        return await self._runnable().abatch(inputs, config=config, return_exceptions=True)
+
+
+def bounded(workflow, name, build):
+    """The registered chain ``name``, bounded by ``workflow``'s limits and deadline"""
+    return Bounded(workflow, chain(name, build))
@@ -1,76 +1,82 @@
+import asyncio
 from langgraph.graph import StateGraph, END
 from typing import TypedDict
-from langchain.chat_models import init_chat_model
-from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from config.db import realtime_data_collection
-from pymongo import DESCENDING
+from config.db import realtime_data_collection, realtime_rollups_collection
+from config import async_db
+from workflow import llm
+from utils.vitals_window import vitals_windows
+from utils.patients import patient_of, active_patients, aactive_patients
+from utils.rollups import rollup_query, summarize_rollups
+from utils.llm_cache import ResponseCache
+from utils.telemetry import timed_node
+from utils.log import get_logger
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 
-load_dotenv()
+log = get_logger(__name__)
 
-model = init_chat_model(model="gemini-2.0-flash", model_provider="google_genai")
+sms_cache = ResponseCache(
+    "periodic_sms",
+    quanta={"avg_hr": 5, "avg_spo2": 1, "avg_stress": 10, "steps_walked": 500, "calories_burned": 50},
+)
 
 
 
 
 # ---- STATE ----
 class State(TypedDict):
+    patient_id: str
     data: dict
     status: str
     sms_message: str
 
 
+# ---- LLM OUTPUT ----
+class SmsMessage(BaseModel):
+    message: str = Field(description='Short SMS message for the patient')
+
+
 # ---- NODES ----
-def aggregate_data(state: State):
+def summarize_stats(stats):
+    """Prompt inputs from window or rollup stats (count, mean and counter deltas)"""
+    if not stats or stats["count"] == 0:
+        return None
+
+    return {
+        "avg_hr": stats["mean"]["heart_rate"],
+        "avg_spo2": stats["mean"]["spo2"],
+        "avg_stress": stats["mean"]["stress_level"],
+        "steps_walked": stats["delta"]["steps"],
+        "calories_burned": stats["delta"]["calories_burned"]
+    }
 
-    # Calculate 5 minutes ago
-    three_hours_ago = datetime.now(timezone.utc) - timedelta(hours=3)
 
-    # Query records from last 5 minutes
-    past_3h_data = list(
-        realtime_data_collection.find(
-            {"timestamp": {"$gte": three_hours_ago}}
-        ).sort("timestamp", DESCENDING)
-    )
+def window_covers(stats):
+    """Whether the in-memory window answers for the whole 3 hours. It is empty when nothing
+    is ingesting in this process, and short when readings arrive faster than the ring holds."""
+    return stats["count"] > 0 and stats["complete"]
 
-    if(len(past_3h_data) == 0):
-        return END
-
-    if past_3h_data:
-        avg_hr = sum(record["heart_rate"] for record in past_3h_data) / len(past_3h_data)
-        avg_spo2 = sum(record["spo2"] for record in past_3h_data) / len(past_3h_data)
-        avg_stress = sum(record["stress_level"] for record in past_3h_data) / len(past_3h_data)
-
-        latest_entry = past_3h_data[0]  
-        oldest_entry = past_3h_data[-1]  
-
-        steps_walked = latest_entry["steps"] - oldest_entry["steps"]
-        calories_burned = latest_entry["calories_burned"] - oldest_entry["calories_burned"]
-        
-    else:
-        avg_hr = avg_spo2 = avg_stress = steps_walked = calories_burned = None  # Handle case where no data is available
-
-    
-    data = {
-        "avg_hr": avg_hr,
-        "avg_spo2": avg_spo2,
-        "avg_stress": avg_stress,
-        "steps_walked": steps_walked,
-        "calories_burned": calories_burned
-    }
 
-    return {"status": "data_collected", "data": data}
+def aggregate_data(state: State):
+    patient_id = patient_of(state)
+    stats = vitals_windows.stats_last(patient_id, 3 * 60 * 60)
 
+    # Otherwise fall back to the minute rollups, or what the window has if there are none yet
+    if not window_covers(stats):
+        three_hours_ago = datetime.now() - timedelta(hours=3)
+        rows = list(realtime_rollups_collection.find(rollup_query(patient_id, "minute", three_hours_ago)))
+        stats = summarize_rollups(rows) or stats
 
-def pass_to_llm(state: State):
-    data = state["data"]
+    data = summarize_stats(stats)
+    if data is None:
+        return {"status": "no_data"}
+
+    return {"status": "data_collected", "data": data}
 
-    class SmsMessage(BaseModel):
-        message: str = Field(description='Short SMS message for the patient')
 
+def build_sms_chain(model):
     parser = PydanticOutputParser(pydantic_object=SmsMessage)
 
     template = PromptTemplate(
@@ -101,39 +107,151 @@ def pass_to_llm(state: State):
         partial_variables={'format_instruction':parser.get_format_instructions()}
     )
 
-    chain = template | model | parser
-    final_result = chain.invoke(data)
+    return template | model | parser
 
-    return {**state, "sms_message": final_result.message}
+
+def fallback_sms(data):
+    """Template SMS for when the model misses its deadline"""
+    return (
+        f"Wellness check: avg heart rate {data['avg_hr']:.0f} bpm, SpO2 {data['avg_spo2']:.0f}%, "
+        f"{data['steps_walked']} steps in the last 3 hours. Stay hydrated and keep moving!"
+    )
+
+
+def pass_to_llm(state: State):
+    data = state["data"]
+
+    chain = llm.bounded("periodic_wellness_check", "periodic_sms", build_sms_chain)
+    try:
+        sms_message = sms_cache.invoke(chain, data).message
+    except llm.LLMUnavailable as e:
+        log.warning("⚠️ Using fallback SMS: %s", e, extra={"workflow": "periodic_wellness_check", "patient_id": patient_of(state)})
+        sms_message = fallback_sms(data)
+
+    return {**state, "sms_message": sms_message}
 
 
 def sms_alert(state: State):
-    print("📩 Sending SMS alert...")
-    
     sms_message = state.get("sms_message")
-
-    print(f"sms_message: {sms_message}")
+    log.info("📩 Sending SMS alert: %s", sms_message, extra={"workflow": "periodic_wellness_check", "patient_id": patient_of(state)})
     # Twilio Integration for SMS
     return {**state, "alert_sent": True}
 
 
 
+# ---- ASYNC NODES ----
+async def aaggregate_data(state: State):
+    patient_id = patient_of(state)
+    stats = vitals_windows.stats_last(patient_id, 3 * 60 * 60)
+
+    if not window_covers(stats):
+        three_hours_ago = datetime.now() - timedelta(hours=3)
+        rows = await async_db.realtime_rollups_collection.find(rollup_query(patient_id, "minute", three_hours_ago)).to_list()
+        stats = summarize_rollups(rows) or stats
+
+    data = summarize_stats(stats)
+    if data is None:
+        return {"status": "no_data"}
+
+    return {"status": "data_collected", "data": data}
+
+
+async def apass_to_llm(state: State):
+    data = state["data"]
+
+    chain = llm.bounded("periodic_wellness_check", "periodic_sms", build_sms_chain)
+    try:
+        sms_message = (await sms_cache.ainvoke(chain, data)).message
+    except llm.LLMUnavailable as e:
+        log.warning("⚠️ Using fallback SMS: %s", e, extra={"workflow": "periodic_wellness_check", "patient_id": patient_of(state)})
+        sms_message = fallback_sms(data)
+
+    return {**state, "sms_message": sms_message}
+
+
+# ---- CONDITIONAL LOGIC ----
+def has_data(state: State):
+    """Message the patient only when aggregate_data found something to report"""
+    return "pass_to_llm" if state["status"] == "data_collected" else END
+
+
 # ---- GRAPH ----
-graph = StateGraph(State)
+def build_graph(nodes):
+    graph = StateGraph(State)
+
+    for name, node in nodes.items():
+        graph.add_node(name, timed_node("periodic_wellness_check", name, node))
+
+    graph.set_entry_point("aggregate_data")
+
+    # ---- EDGES ----
+    graph.add_conditional_edges("aggregate_data", has_data, {"pass_to_llm": "pass_to_llm", END: END})
+    graph.add_edge("pass_to_llm", "sms_alert")
+    graph.add_edge("sms_alert", END)
+
+
+    # ---- COMPILE ----
+    return graph.compile()
+
+
+periodic_workflow = build_graph({
+    "aggregate_data": aggregate_data,
+    "pass_to_llm": pass_to_llm,
+    "sms_alert": sms_alert,
+})
+
+async_periodic_workflow = build_graph({
+    "aggregate_data": aaggregate_data,
+    "pass_to_llm": apass_to_llm,
+    "sms_alert": sms_alert,
+})
+
+
+# ---- BATCH ----
+# The 3-hourly sweep runs every patient at once: inputs are collected per
+# patient, the cache misses go through one bounded chain.batch, and each
+# result (or fallback) goes to that patient's SMS step.
+def sms_from(state, result):
+    if isinstance(result, Exception):
+        log.warning("⚠️ Using fallback SMS: %s", result, extra={"workflow": "periodic_wellness_check", "patient_id": patient_of(state)})
+        return fallback_sms(state["data"])
+    return result.message
+
+
+def run_batch(patient_ids=None):
+    """Periodic check for many patients; defaults to everyone with readings in the last 3 hours.
+    Returns {patient_id: "sent" | "no_data"}."""
+    if patient_ids is None:
+        patient_ids = active_patients(realtime_data_collection, since=datetime.now() - timedelta(hours=3))
+
+    outcome = {patient_id: "no_data" for patient_id in patient_ids}
+    states = []
+    for patient_id in patient_ids:
+        update = aggregate_data({"patient_id": patient_id})
+        if update["status"] == "data_collected":
+            states.append({"patient_id": patient_id, **update})
 
-graph.add_node("aggregate_data", aggregate_data)
-graph.add_node("pass_to_llm", pass_to_llm)
-graph.add_node("sms_alert", sms_alert)
+    chain = llm.bounded("periodic_wellness_check", "periodic_sms", build_sms_chain)
+    results = sms_cache.batch(chain.batch, [state["data"] for state in states])
 
-graph.set_entry_point("aggregate_data")
+    for state, result in zip(states, results):
+        sms_alert({**state, "sms_message": sms_from(state, result)})
+        outcome[state["patient_id"]] = "sent"
+    return outcome
 
-# ---- EDGES ----
-graph.add_edge("aggregate_data", "pass_to_llm")
-graph.add_edge("pass_to_llm", "sms_alert")
-graph.add_edge("sms_alert", END)
 
+async def arun_batch(patient_ids=None):
+    if patient_ids is None:
+        patient_ids = await aactive_patients(async_db.realtime_data_collection, since=datetime.now() - timedelta(hours=3))
 
-# ---- COMPILE ----
-periodic_workflow = graph.compile()
+    outcome = {patient_id: "no_data" for patient_id in patient_ids}
+    updates = await asyncio.gather(*(aaggregate_data({"patient_id": patient_id}) for patient_id in patient_ids))
+    states = [{"patient_id": patient_id, **update} for patient_id, update in zip(patient_ids, updates) if update["status"] == "data_collected"]
 
+    chain = llm.bounded("periodic_wellness_check", "periodic_sms", build_sms_chain)
+    results = await sms_cache.abatch(chain.abatch, [state["data"] for state in states])
 
+    for state, result in zip(states, results):
+        sms_alert({**state, "sms_message": sms_from(state, result)})
+        outcome[state["patient_id"]] = "sent"
+    return outcome
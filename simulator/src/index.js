@@ -21,6 +21,11 @@ app.use(express.json());
 
 let overrideData = null;
 
+// Identifies the simulated wearer to the agent. Unset, payloads carry no patient_id and the
+// agent files them under its DEFAULT_PATIENT_ID, alongside the history recorded before patient ids.
+const PATIENT_ID = process.env.PATIENT_ID;
+const patient = PATIENT_ID ? { patient_id: PATIENT_ID } : {};
+
 // --- Incremental counters ---
 let stepCount = 0;
 let calorieCount = 0;
@@ -39,6 +44,7 @@ function generateRealtimeData() {
     calorieCount += random(1, 5); // calories burned
 
     return {
+        ...patient,
         heart_rate: random(60, 100),
         spo2: random(95, 100),
         stress_level: random(1, 5),
@@ -51,6 +57,7 @@ function generateRealtimeData() {
 // ---- DAILY DATA ----
 function generateDailyData() {
     return {
+        ...patient,
         sleep: {
             duration: random(300, 500), // minutes slept
             quality: ["good", "average", "poor"][random(0, 2)],
@@ -95,6 +102,7 @@ app.post("/override", (req, res) => {
     const { heart_rate, spo2, stress_level } = req.body;
 
     overrideData = {
+        ...patient,
         heart_rate: heart_rate ?? random(60, 100),
         spo2: spo2 ?? random(95, 100),
         stress_level: stress_level ?? random(1, 5),